@@ -4,39 +4,133 @@ from typing import Literal
 from langgraph.graph import StateGraph,MessagesState, START, END
 from openai import OpenAI
 from typing_extensions import TypedDict
-from results_openai import get_llm_response
-from chromaDB import collection1, collection2
+from results_openai import aget_llm_response, get_llm_response
+from context_packer import CONTEXT_PACKING, pack_context, packing_metrics
+from fused_generation import FUSED_GENERATION, RESPONSE_FORMAT, AnswerStreamer, fused_prompt, parse_reply
+from embeddings import get_embedding_service
+from metadata_store import get_metadata_store
+from retrievers import ROUTE_COLLECTIONS, get_retrievers
+from query_filters import DeviceFilterExtractor
+from routing import LocalRouter, allm_route, llm_route
+import relevance_gate
+import telemetry
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
 import os
-from langchain_community.utilities import GoogleSerperAPIWrapper
+import threading
+import time
+from search_cache import CachedSearch
+
+# Created on first use so importing the graph needs neither the Serper key nor the store.
+_search = None
+_search_lock = threading.Lock()
+_local_router = None
+_local_router_lock = threading.Lock()
+_device_filters = None
+_device_filters_lock = threading.Lock()
+
+
+def get_search():
+    global _search
+    with _search_lock:
+        if _search is None:
+            _search = CachedSearch()
+        return _search
+
+
+def get_local_router():
+    global _local_router
+    with _local_router_lock:
+        if _local_router is None:
+            retrievers = get_retrievers()
+            _local_router = LocalRouter(retrievers["Retrieve_QnA"], retrievers["Retrieve_Device"])
+        return _local_router
+
+
+def get_device_filters():
+    """Filter extractor for device questions, knowing the stored manufacturers."""
+    global _device_filters
+    with _device_filters_lock:
+        if _device_filters is None:
+            _device_filters = DeviceFilterExtractor(get_retrievers()["Retrieve_Device"].distinct("Manufacturer"))
+        return _device_filters
+
+
+def query_embedding(state):
+    """The request's query embedding: computed once, then reused from the state."""
+    if state.get("query_embedding") is None:
+        state["query_embedding"] = get_embedding_service().embed(state["query"])
+    return state["query_embedding"]
+
+
+def set_context(state, documents):
+    """Store the documents and the context packed from them within the token budget."""
+    state["documents"] = documents
+    if not CONTEXT_PACKING:
+        state["context"] = "\n".join(documents)
+        return state
+    packed = pack_context(state["query"], documents)
+    packing_metrics.record(packed)
+    state["context"] = packed["context"]
+    state["context_tokens"] = {
+        "original": packed["original_tokens"],
+        "packed": packed["packed_tokens"],
+        "saved": packed["saved_tokens"],
+    }
+    print(f"---CONTEXT PACKED: {packed['original_tokens']} -> {packed['packed_tokens']} tokens---")
+    return state
+
+
+ROUTE_SOURCES = {"Retrieve_QnA": "Medical Q&A Collection", "Retrieve_Device": "Medical Device Manual"}
+
+
+def set_retrieved(state, route, results, where=None):
+    """Store a retriever's results for ``route`` in the state."""
+    set_context(state, results["documents"])
+    state["document_ids"] = results["ids"]
+    state["distances"] = results["distances"]
+    telemetry.record_retrieval(route, results["distances"])
+    if route == "Retrieve_Device":
+        state["filters"] = where
+    state["source"] = ROUTE_SOURCES[route]
+    return state
+
+
+def document_details(route, document_ids, fields=None) -> list:
+    """Display fields of documents retrieved on ``route``, read by id from the metadata store."""
+    store = get_metadata_store(ROUTE_COLLECTIONS[route]) if route in ROUTE_COLLECTIONS else None
+    if store is None:
+        return [{} for _ in document_ids]
+    return store.get(document_ids, fields)
 
-search = GoogleSerperAPIWrapper()
 
 # === Define workflow node functions ===
 def retrieve_context_q_n_a(state):
-    """Retrieve top documents from ChromaDB Collection 1 (Medical Q&A Data) based on query."""
+    """Retrieve top documents from the Medical Q&A collection based on query."""
     print("---RETRIEVING CONTEXT---")
-    query = state["query"] # last user message
-
-    results = collection1.query(query_texts=[query], n_results=3)
-    context = "\n".join(results["documents"][0])
-    state["context"] = context
-    state["source"] = "Medical Q&A Collection"
-    print(context)
+    results = get_retrievers()["Retrieve_QnA"].query(
+        query_embedding(state), n_results=3, query_text=state["query"])
+    set_retrieved(state, "Retrieve_QnA", results)
+    print(state["context"])
     # Save context in the state for later nodes
     return state
 
 # === Define workflow node functions ===
 def retrieve_context_medical_device(state):
-    """Retrieve top documents from ChromaDB Collection 2 (Medical Device Manuals Data) based on query."""
+    """Retrieve top documents from the Medical Device Manuals collection based on query."""
     print("---RETRIEVING CONTEXT---")
-    query = state["query"] # last user message
-
-    results = collection2.query(query_texts=[query], n_results=3)
-    context = "\n".join(results["documents"][0])
-    state["context"] = context
-    state["source"] = "Medical Device Manual"
-    print(context)
+    retriever = get_retrievers()["Retrieve_Device"]
+    # Class, population, manufacturer... named in the question narrow the search.
+    where = get_device_filters().extract(state["query"])
+    results = retriever.query(query_embedding(state), n_results=3, query_text=state["query"], where=where)
+    if where is not None and not results["documents"]:
+        print(f"---NO DOCUMENTS MATCH {where}, SEARCHING WITHOUT FILTERS---")
+        where = None
+        results = retriever.query(query_embedding(state), n_results=3, query_text=state["query"])
+    set_retrieved(state, "Retrieve_Device", results, where)
+    print(state["context"])
     # Save context in the state for later nodes
     return state
 
@@ -44,8 +138,10 @@ def web_search(state):
     """Perform web search using Google Serper API."""
     print("---PERFORMING WEB SEARCH---")
     query = state["query"]
-    search_results = search.run(query=query)
-    state["context"] = search_results
+    search_results = get_search().run(query=query)
+    set_context(state, [search_results])
+    state["document_ids"] = []
+    state["distances"] = []  # no retrieval scores for web results
     state["source"] = "Web Search"
     print(search_results)
     return state
@@ -56,27 +152,21 @@ def router(state: GraphState) -> Literal[
     """Agentic router: decides which retrieval method to use."""
     query = state["query"]
 
-    # A lightweight decision LLM — you can replace this with GPT-4o-mini, etc.
-    decision_prompt = f"""
-    You are a routing agent. Based on the user query, decide where to look for information.
-
-    Options:
-    - Retrieve_QnA: if it's about general medical knowledge, symptoms, or treatment.
-    - Retrieve_Device: if it's about medical devices, manuals, or instructions.
-    - Web_Search: if it's about recent news, brand names, or external data.
-
-    Query: "{query}"
-
-    Respond ONLY with one of: Retrieve_QnA, Retrieve_Device, Web_Search
-    """
-
-    router_decision = get_llm_response(decision_prompt).strip()
-    print(f"---ROUTER DECISION: {router_decision}---")
-
-    print(router_decision)
-
+    # The local classifier handles easy queries; the LLM only breaks close calls.
+    local_router = get_local_router()
+    router_decision, confidence = local_router.classify(query, query_embedding(state))
+    if local_router.is_confident(confidence):
+        route_method = "local"
+    else:
+        router_decision = llm_route(query)
+        route_method = "llm"
+    return _routed_state(state, router_decision, route_method, confidence)
+
+def _routed_state(state, router_decision, route_method, confidence):
+    print(f"---ROUTER DECISION: {router_decision} ({route_method}, confidence {confidence:.3f})---")
     updated_state = dict(state)
     updated_state["route"] = router_decision
+    updated_state["route_method"] = route_method
     updated_state["source"] = router_decision
     return updated_state
 
@@ -90,11 +180,168 @@ def route_decision(state: GraphState) -> str:
     return route_choice
 
 
+# === Speculative execution: retrieve while the router decides ===
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+SPECULATIVE_WEB_SEARCH = os.getenv("SPECULATIVE_WEB_SEARCH", "false").lower() == "true"
+
+_speculation_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SPECULATION_WORKERS", "8")),
+    thread_name_prefix="speculative-retrieval",
+)
+
+
+class SpeculationMetrics:
+    """Running totals of latency saved and work wasted by speculative runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.latency_saved_seconds = 0.0
+        self.wasted_branches = 0
+        self.cancelled_branches = 0
+        self.wasted_seconds = 0.0
+
+    def record_request(self, latency_saved_seconds):
+        with self._lock:
+            self.requests += 1
+            self.latency_saved_seconds += latency_saved_seconds
+
+    def record_discarded(self, future):
+        """Done-callback for branches whose result is not used."""
+        with self._lock:
+            if future.cancelled():
+                self.cancelled_branches += 1
+                return
+            self.wasted_branches += 1
+            if future.exception() is None:
+                self.wasted_seconds += future.result()[1]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "latency_saved_seconds": self.latency_saved_seconds,
+                "avg_latency_saved_seconds": (
+                    self.latency_saved_seconds / self.requests if self.requests else 0.0
+                ),
+                "wasted_branches": self.wasted_branches,
+                "cancelled_branches": self.cancelled_branches,
+                "wasted_seconds": self.wasted_seconds,
+            }
+
+
+speculation_metrics = SpeculationMetrics()
+
+
+def _timed(node, state):
+    started = time.perf_counter()
+    result = node(state)
+    return result, time.perf_counter() - started
+
+
+def _discard_unused(handles, route_choice):
+    """Cancel branches that are still queued; results of running ones are dropped."""
+    for route, handle in handles.items():
+        if route != route_choice:
+            handle.cancel()
+            handle.add_done_callback(speculation_metrics.record_discarded)
+
+
+def _merge_speculation(updated_state, route_choice, branch_routes, router_seconds,
+                       retrieved=None, waited_seconds=0.0):
+    """Copy the prefetched context into the routed state and record the savings."""
+    discarded = sorted(route for route in branch_routes if route != route_choice)
+    if retrieved is None:
+        # The chosen branch was not speculated; the graph runs it as usual.
+        updated_state["speculation"] = {
+            "router_seconds": router_seconds,
+            "retrieval_seconds": 0.0,
+            "latency_saved_seconds": 0.0,
+            "discarded_branches": discarded,
+        }
+        speculation_metrics.record_request(0.0)
+        return updated_state
+
+    retrieved_state, retrieval_seconds = retrieved
+    latency_saved_seconds = max(retrieval_seconds - waited_seconds, 0.0)
+    speculation_metrics.record_request(latency_saved_seconds)
+
+    for key in ("context", "documents", "document_ids", "distances", "source"):
+        updated_state[key] = retrieved_state[key]
+    for key in ("filters", "context_tokens"):
+        if key in retrieved_state:
+            updated_state[key] = retrieved_state[key]
+    updated_state["prefetched"] = True
+    updated_state["speculation"] = {
+        "router_seconds": router_seconds,
+        "retrieval_seconds": retrieval_seconds,
+        "latency_saved_seconds": latency_saved_seconds,
+        "discarded_branches": discarded,
+    }
+    print(f"---SPECULATION SAVED {latency_saved_seconds * 1000:.1f} ms---")
+    return updated_state
+
+
+def speculative_router(state):
+    """Run the router while every retrieval branch is already in flight."""
+    print("---SPECULATIVE ROUTER---")
+    branches = {
+        "Retrieve_QnA": retrieve_context_q_n_a,
+        "Retrieve_Device": retrieve_context_medical_device,
+    }
+    if state.get("speculative_web_search", SPECULATIVE_WEB_SEARCH):
+        branches["Web_Search"] = web_search
+    query_embedding(state)  # once, before the branches copy the state
+    # Each branch runs in a copy of this context, so its spans land in the request's trace.
+    futures = {
+        route: _speculation_pool.submit(contextvars.copy_context().run, _timed, node, dict(state))
+        for route, node in branches.items()
+    }
+
+    router_started = time.perf_counter()
+    updated_state = router(state)
+    router_seconds = time.perf_counter() - router_started
+    route_choice = route_decision(updated_state)
+    _discard_unused(futures, route_choice)
+
+    chosen = futures.get(route_choice)
+    if chosen is None:
+        return _merge_speculation(updated_state, route_choice, futures, router_seconds)
+
+    wait_started = time.perf_counter()
+    retrieved = chosen.result()
+    waited_seconds = time.perf_counter() - wait_started
+    return _merge_speculation(
+        updated_state, route_choice, futures, router_seconds, retrieved, waited_seconds
+    )
+
+
+def entry_decision(state: GraphState) -> str:
+    """Pick the sequential or speculative entry node for this request.
+
+    States routed (and retrieved) in bulk by ``batch.py`` skip those steps.
+    """
+    if state.get("prefetched"):
+        return "Relevance_Checker"
+    if state.get("route") is not None:
+        return route_decision(state)
+    if state.get("speculative", SPECULATIVE_RETRIEVAL):
+        return "Speculative_Router"
+    return "Router"
+
+
+def speculative_route_decision(state: GraphState) -> str:
+    if state.get("prefetched"):
+        return "Relevance_Checker"
+    return route_decision(state)
+
+
 def build_prompt(state):
     """Construct the RAG-style prompt."""
     print("---AUGMENT (BUILDING GENERATIVE PROMPT)---")
     query = state["query"]
     context = state["context"]
+    telemetry.record_iterations(state.get("iteration_count", 0))
 
     prompt = f"""
             Answer the following question using the context below.
@@ -111,22 +358,102 @@ def build_prompt(state):
 
 
 
-def call_llm(state):
-    """Call your existing LLM function."""
+def call_llm(state, config=None):
+    """Call your existing LLM function.
+
+    If the run config carries an ``on_token`` callback under ``configurable``,
+    the answer is streamed to it token by token.
+    """
     print("---GENERATE (CALLING LLM)---")
     prompt = state["prompt"]
-    answer = get_llm_response(prompt)
+    answer = get_llm_response(prompt, on_token=_on_token(state, config))
     state["response"] = answer
     return state
 
 
-def check_context_relevance(state):
-    """Determine whether to retrieved context is relevant or not."""
+def check_context_relevance(state, config=None):
+    """Determine whether to retrieved context is relevant or not.
+
+    In fused mode the LLM also answers in the same call, streaming the answer
+    to ``on_token`` like :func:`call_llm`, and Augment/Generate are skipped.
+    """
     print("---CONTEXT RELEVANCE CHECKER---")
-    query = state["query"]
-    context = state["context"]
+    if _apply_relevance_gate(state):
+        return _count_iteration(state)
+    if state.get("fused", FUSED_GENERATION):
+        prompt = fused_prompt(state["query"], state["context"])
+        streamer = _fused_streamer(state, config)
+        reply = get_llm_response(
+            prompt, on_token=streamer, kind="generate", response_format=RESPONSE_FORMAT
+        )
+        if _apply_fused_reply(state, prompt, reply, streamer):
+            return _count_iteration(state)
+    relevance_prompt = _relevance_prompt(state["query"], state["context"])
+    relevance_decision_value = get_llm_response(relevance_prompt, kind="relevance").strip()
+    print(f"---RELEVANCE DECISION: {relevance_decision_value}---")
+    state["is_relevant"] = relevance_decision_value
+    return _count_iteration(state)
+
+def _count_iteration(state):
+    """Count relevance checks; the third one accepts the context as it is."""
+    state["iteration_count"] = state.get("iteration_count", 0) + 1
+    ## Limiting to max 3 iterations
+    if state["iteration_count"] >= 3 and state["is_relevant"] != "Yes":
+        print("---MAX ITERATIONS REACHED, FORCING 'Yes'---")
+        state["is_relevant"] = "Yes"
+    if state.get("response"):
+        # Answered by the fused call: Augment, which records this otherwise, is skipped.
+        telemetry.record_iterations(state["iteration_count"])
+    return state
 
-    relevance_prompt = f"""
+def _on_token(state, config):
+    """The run's ``on_token`` callback, if any.
+
+    ``None`` once a discarded fused reply has streamed part of its answer:
+    streaming another answer after it would duplicate the text, so the rest
+    of the run only delivers its answer as the final response.
+    """
+    if state.get("answer_streamed"):
+        return None
+    return (config or {}).get("configurable", {}).get("on_token")
+
+def _fused_streamer(state, config):
+    """Stream the answer field of the fused JSON reply to the run's ``on_token``, if any."""
+    on_token = _on_token(state, config)
+    return AnswerStreamer(on_token) if on_token is not None else None
+
+def _apply_fused_reply(state, prompt, reply, streamer=None) -> bool:
+    """Store the verdict and answer of a fused reply; False if the reply is unusable."""
+    parsed = parse_reply(reply)
+    if parsed is None:
+        print("---FUSED REPLY IS NOT VALID JSON, CHECKING RELEVANCE SEPARATELY---")
+        if streamer is not None and streamer.streamed:
+            state["answer_streamed"] = True
+        return False
+    verdict, answer = parsed
+    print(f"---RELEVANCE DECISION: {verdict} (fused)---")
+    state["is_relevant"] = verdict
+    state["relevance_method"] = "fused"
+    if verdict == "Yes" and answer:
+        state["prompt"] = prompt
+        state["response"] = answer
+    return True
+
+def _apply_relevance_gate(state) -> bool:
+    """Decide relevance from retrieval scores; False leaves it to the LLM."""
+    gate = relevance_gate.judge(
+        state["query"], state.get("documents", []), state.get("distances", [])
+    )
+    state["rerank_scores"] = gate["rerank_scores"]
+    state["relevance_method"] = gate["method"]
+    if gate["decision"] is None:
+        return False
+    print(f"---RELEVANCE DECISION: {gate['decision']} ({gate['method']})---")
+    state["is_relevant"] = gate["decision"]
+    return True
+
+def _relevance_prompt(query, context):
+    return f"""
             Check the below context if the context is relevent to the user query or.
             ####
             Context:
@@ -141,20 +468,106 @@ def check_context_relevance(state):
             Please answer with only 'Yes' or 'No'.
 
             """
-    relevance_decision_value = get_llm_response(relevance_prompt).strip()
+
+# === Async node functions (used by agentic_rag_async) ===
+# Retrieval and the local classifier are blocking, so they run in worker threads;
+# LLM and Serper calls are awaited directly.
+async def aretrieve_context_q_n_a(state):
+    return await asyncio.to_thread(retrieve_context_q_n_a, state)
+
+async def aretrieve_context_medical_device(state):
+    return await asyncio.to_thread(retrieve_context_medical_device, state)
+
+async def aweb_search(state):
+    """Async web search using Google Serper API."""
+    print("---PERFORMING WEB SEARCH---")
+    search_results = await get_search().arun(query=state["query"])
+    set_context(state, [search_results])
+    state["document_ids"] = []
+    state["distances"] = []  # no retrieval scores for web results
+    state["source"] = "Web Search"
+    return state
+
+async def arouter(state):
+    """Async agentic router."""
+    query = state["query"]
+    local_router = await asyncio.to_thread(get_local_router)
+    embedding = await asyncio.to_thread(query_embedding, state)
+    router_decision, confidence = await asyncio.to_thread(local_router.classify, query, embedding)
+    if local_router.is_confident(confidence):
+        route_method = "local"
+    else:
+        router_decision = await allm_route(query)
+        route_method = "llm"
+    return _routed_state(state, router_decision, route_method, confidence)
+
+async def _atimed(node, state):
+    started = time.perf_counter()
+    result = await node(state)
+    return result, time.perf_counter() - started
+
+async def aspeculative_router(state):
+    """Async speculative router; unused branches are cancelled as tasks."""
+    print("---SPECULATIVE ROUTER---")
+    branches = {
+        "Retrieve_QnA": aretrieve_context_q_n_a,
+        "Retrieve_Device": aretrieve_context_medical_device,
+    }
+    if state.get("speculative_web_search", SPECULATIVE_WEB_SEARCH):
+        branches["Web_Search"] = aweb_search
+    await asyncio.to_thread(query_embedding, state)
+    tasks = {
+        route: asyncio.create_task(_atimed(node, dict(state)))
+        for route, node in branches.items()
+    }
+
+    router_started = time.perf_counter()
+    updated_state = await arouter(state)
+    router_seconds = time.perf_counter() - router_started
+    route_choice = route_decision(updated_state)
+    _discard_unused(tasks, route_choice)
+
+    chosen = tasks.get(route_choice)
+    if chosen is None:
+        return _merge_speculation(updated_state, route_choice, tasks, router_seconds)
+
+    wait_started = time.perf_counter()
+    retrieved = await chosen
+    waited_seconds = time.perf_counter() - wait_started
+    return _merge_speculation(
+        updated_state, route_choice, tasks, router_seconds, retrieved, waited_seconds
+    )
+
+async def acheck_context_relevance(state, config=None):
+    """Async context relevance checker; fused like :func:`check_context_relevance`."""
+    print("---CONTEXT RELEVANCE CHECKER---")
+    if await asyncio.to_thread(_apply_relevance_gate, state):
+        return _count_iteration(state)
+    if state.get("fused", FUSED_GENERATION):
+        prompt = fused_prompt(state["query"], state["context"])
+        streamer = _fused_streamer(state, config)
+        reply = await aget_llm_response(
+            prompt, on_token=streamer, kind="generate", response_format=RESPONSE_FORMAT
+        )
+        if _apply_fused_reply(state, prompt, reply, streamer):
+            return _count_iteration(state)
+    relevance_prompt = _relevance_prompt(state["query"], state["context"])
+    relevance_decision_value = (await aget_llm_response(relevance_prompt, kind="relevance")).strip()
     print(f"---RELEVANCE DECISION: {relevance_decision_value}---")
     state["is_relevant"] = relevance_decision_value
+    return _count_iteration(state)
+
+async def acall_llm(state, config=None):
+    """Async generate node; streams to ``on_token`` like :func:`call_llm`."""
+    print("---GENERATE (CALLING LLM)---")
+    state["response"] = await aget_llm_response(state["prompt"], on_token=_on_token(state, config))
     return state
 
 # Define the check_context_relevance function for the conditional edge
+# (iteration_count is kept by the checker node: state changes made here are not saved)
 def relevance_decision(state: GraphState) -> str:
-    iteration_count = state.get("iteration_count", 0)
-    iteration_count += 1
-    state["iteration_count"] = iteration_count
-    ## Limiting to max 3 iterations
-    if iteration_count >= 3:
-        print("---MAX ITERATIONS REACHED, FORCING 'Yes'---")
-        state["is_relevant"] = "Yes"
+    if state.get("response"):
+        return "Answered"  # the fused call already answered
     return state["is_relevant"]
 
 
@@ -166,54 +579,117 @@ def relevance_decision(state: GraphState) -> str:
 
 class GraphState(TypedDict):
     query: str
+    query_embedding: List[float]  # Embedded once, reused by the router and every retrieval
     context: str
     prompt: str
     response: str
     source: str  # Which retriever/tool was used
     route: str  # Router decision (Retrieve_QnA, Retrieve_Device, Web_Search)
+    route_method: str  # "local" classifier or "llm" fallback
+    documents: List[str]  # Retrieved documents behind the context
+    document_ids: List[str]  # Their parent ids, for display fields from the metadata store
+    distances: List[float]  # Squared L2 distances of the retrieved documents
+    filters: dict  # Metadata `where` predicate applied to the device search
+    context_tokens: dict  # Context tokens before/after packing and tokens saved
+    rerank_scores: List[float]  # Cross-encoder scores, when the reranker ran
+    relevance_method: str  # "distance", "reranker", "llm" or "fused"
     is_relevant: str
     iteration_count: int
+    speculative: bool  # Start retrievals while the router decides
+    speculative_web_search: bool  # Also speculate on the web search branch
+    prefetched: bool  # Context was filled by a speculative branch
+    speculation: dict  # Latency saved and branches discarded by speculation
+    fused: bool  # One LLM call checks relevance and answers
+    answer_streamed: bool  # A discarded fused reply already streamed part of its answer
 
     
-workflow = StateGraph(GraphState)
-
-# Add nodes
-workflow.add_node("Router", router)
-workflow.add_node("Retrieve_QnA", retrieve_context_q_n_a)
-workflow.add_node("Retrieve_Device", retrieve_context_medical_device)
-workflow.add_node("Web_Search", web_search)
-workflow.add_node("Relevance_Checker", check_context_relevance)
-workflow.add_node("Augment", build_prompt)
-workflow.add_node("Generate", call_llm)
-
-# Define edges
-workflow.add_edge(START, "Router")
-workflow.add_conditional_edges(
-    "Router",
-    route_decision,  # this function decides the path dynamically
-    {
-        "Retrieve_QnA": "Retrieve_QnA",
-        "Retrieve_Device": "Retrieve_Device",
-        "Web_Search": "Web_Search",
-    }
-)
-workflow.add_edge("Retrieve_QnA", "Relevance_Checker")
-workflow.add_edge("Retrieve_Device", "Relevance_Checker")
-workflow.add_edge("Web_Search", "Relevance_Checker")
-workflow.add_conditional_edges(
-    "Relevance_Checker",
-    relevance_decision,  # this function decides the path dynamically
-    {
-        "Yes": "Augment",
-        "No": "Web_Search",
-    }
-)
-workflow.add_edge("Augment", "Generate")
-workflow.add_edge("Generate", END)
+def build_workflow(nodes, graph_name: str = "agentic_rag") -> StateGraph:
+    """Wire the agentic RAG topology around the given node functions.
+
+    Every node is timed under ``graph_name`` for ``/metrics``.
+    """
+    workflow = StateGraph(GraphState)
+
+    # Add nodes
+    for name, node in nodes.items():
+        workflow.add_node(name, telemetry.traced(graph_name, name, node))
+
+    # Define edges
+    workflow.add_conditional_edges(
+        START,
+        entry_decision,  # per-request switch between sequential and speculative routing
+        {
+            "Router": "Router",
+            "Speculative_Router": "Speculative_Router",
+            "Retrieve_QnA": "Retrieve_QnA",
+            "Retrieve_Device": "Retrieve_Device",
+            "Web_Search": "Web_Search",
+            "Relevance_Checker": "Relevance_Checker",
+        }
+    )
+    workflow.add_conditional_edges(
+        "Router",
+        route_decision,  # this function decides the path dynamically
+        {
+            "Retrieve_QnA": "Retrieve_QnA",
+            "Retrieve_Device": "Retrieve_Device",
+            "Web_Search": "Web_Search",
+        }
+    )
+    workflow.add_conditional_edges(
+        "Speculative_Router",
+        speculative_route_decision,  # prefetched context skips the retrieval nodes
+        {
+            "Relevance_Checker": "Relevance_Checker",
+            "Retrieve_QnA": "Retrieve_QnA",
+            "Retrieve_Device": "Retrieve_Device",
+            "Web_Search": "Web_Search",
+        }
+    )
+    workflow.add_edge("Retrieve_QnA", "Relevance_Checker")
+    workflow.add_edge("Retrieve_Device", "Relevance_Checker")
+    workflow.add_edge("Web_Search", "Relevance_Checker")
+    workflow.add_conditional_edges(
+        "Relevance_Checker",
+        relevance_decision,  # this function decides the path dynamically
+        {
+            "Yes": "Augment",
+            "No": "Web_Search",
+            "Answered": END,
+        }
+    )
+    workflow.add_edge("Augment", "Generate")
+    workflow.add_edge("Generate", END)
+    return workflow
+
+
+workflow = build_workflow({
+    "Router": router,
+    "Speculative_Router": speculative_router,
+    "Retrieve_QnA": retrieve_context_q_n_a,
+    "Retrieve_Device": retrieve_context_medical_device,
+    "Web_Search": web_search,
+    "Relevance_Checker": check_context_relevance,
+    "Augment": build_prompt,
+    "Generate": call_llm,
+})
+
+# Same topology with async nodes, driven through agentic_rag_async.astream()
+async_workflow = build_workflow({
+    "Router": arouter,
+    "Speculative_Router": aspeculative_router,
+    "Retrieve_QnA": aretrieve_context_q_n_a,
+    "Retrieve_Device": aretrieve_context_medical_device,
+    "Web_Search": aweb_search,
+    "Relevance_Checker": acheck_context_relevance,
+    "Augment": build_prompt,
+    "Generate": acall_llm,
+}, graph_name="agentic_rag_async")
 
 
 # Compile the dynamic RAG agent
 agentic_rag = workflow.compile()
+agentic_rag_async = async_workflow.compile()
 
 
 # ===================================
@@ -222,64 +698,65 @@ agentic_rag = workflow.compile()
 
 
 # === Run it ===
-graph_path = os.path.join(os.getcwd(), "agentic_rag_graph.png")
-graph_bytes = agentic_rag.get_graph().draw_mermaid_png()
+if __name__ == "__main__":
+    graph_path = os.path.join(os.getcwd(), "agentic_rag_graph.png")
+    graph_bytes = agentic_rag.get_graph().draw_mermaid_png()
 
-with open(graph_path, "wb") as graph_file:
-    graph_file.write(graph_bytes)
+    with open(graph_path, "wb") as graph_file:
+        graph_file.write(graph_bytes)
 
-print(f"Workflow graph saved to {graph_path}")
+    print(f"Workflow graph saved to {graph_path}")
 
-try:
-    from IPython.display import Image, display
+    try:
+        from IPython.display import Image, display
 
-    display(Image(graph_path))
-except ImportError:
-    pass
+        display(Image(graph_path))
+    except ImportError:
+        pass
 
 
-input_state = {"query": "What are the treatments for Kawasaki disease ?"}
+    input_state = {"query": "What are the treatments for Kawasaki disease ?"}
 
-from pprint import pprint
-final_response = None
-for step in agentic_rag.stream(input_state):
-    for key, value in step.items():
-        pprint(f"Finished running: {key}:")
-        if "response" in value:
-            final_response = value["response"]
-            pprint(final_response)
+    from pprint import pprint
+    final_response = None
+    for step in agentic_rag.stream(input_state):
+        for key, value in step.items():
+            pprint(f"Finished running: {key}:")
+            if "response" in value:
+                final_response = value["response"]
+                pprint(final_response)
 
-if final_response:
-    response_path = os.path.join(os.getcwd(), "agentic_rag_response.txt")
-    with open(response_path, "w", encoding="utf-8") as response_file:
-        response_file.write(final_response)
-    print(f"Response saved to {response_path}")
-else:
-    print("No response generated to save.")
+    if final_response:
+        response_path = os.path.join(os.getcwd(), "agentic_rag_response.txt")
+        with open(response_path, "w", encoding="utf-8") as response_file:
+            response_file.write(final_response)
+        print(f"Response saved to {response_path}")
+    else:
+        print("No response generated to save.")
 
 
 
 
-# input_state = {"query": "What are the usage of Dialysis Machine Device?"}
+    # input_state = {"query": "What are the usage of Dialysis Machine Device?"}
 
-# from pprint import pprint
-# for step in agentic_rag.stream(input_state):
-#     for key, value in step.items():
-#         pprint(f"Finished running: {key}:")
-# pprint(value["response"])
+    # from pprint import pprint
+    # for step in agentic_rag.stream(input_state):
+    #     for key, value in step.items():
+    #         pprint(f"Finished running: {key}:")
+    # pprint(value["response"])
 
-# input_state = {"query": "What's the export duty on medical tablets on India by USA in 2025?"}
+    # input_state = {"query": "What's the export duty on medical tablets on India by USA in 2025?"}
 
-# from pprint import pprint
-# for step in agentic_rag.stream(input_state):
-#     for key, value in step.items():
-#         pprint(f"Finished running: {key}:")
-# pprint(value["response"])
+    # from pprint import pprint
+    # for step in agentic_rag.stream(input_state):
+    #     for key, value in step.items():
+    #         pprint(f"Finished running: {key}:")
+    # pprint(value["response"])
 
-# input_state = {"query": "What are medicines/treatment for COVID?"}
+    # input_state = {"query": "What are medicines/treatment for COVID?"}
 
-# from pprint import pprint
-# for step in agentic_rag.stream(input_state):
-#     for key, value in step.items():
-#         pprint(f"Finished running: {key}:")
-# pprint(value["response"])
\ No newline at end of file
+    # from pprint import pprint
+    # for step in agentic_rag.stream(input_state):
+    #     for key, value in step.items():
+    #         pprint(f"Finished running: {key}:")
+    # pprint(value["response"])
@@ -1,58 +1,177 @@
-from flask import Flask, render_template, request, jsonify
-from agentic_RAG import agentic_rag
+from flask import Blueprint, Flask, Response, render_template, request, jsonify, stream_with_context
+from startup import WARMUP_ON_START, startup_report, warmup
+import json
+import math
 import os
+import threading
+import time
 
-app = Flask(__name__)
+with startup_report.phase("import:graph"):
+    from agentic_RAG import agentic_rag, document_details, get_search, speculation_metrics
+from batch import BATCH_MAX_QUERIES, iter_batch
+from context_packer import packing_metrics
+from llm_scheduler import LLMOverloaded, get_llm_scheduler
+from semantic_cache import get_answer_cache, normalize_query
+from singleflight import SingleFlight
+import telemetry
 
-@app.route('/')
+# Identical queries that arrive while one is being answered share its graph run.
+QUERY_COALESCING = os.getenv("QUERY_COALESCING", "true").lower() == "true"
+query_flight = SingleFlight()
+
+routes = Blueprint('rag', __name__)
+
+def build_input_state(data, user_query):
+    """Build the graph input state from the request body."""
+    input_state = {"query": user_query}
+    if 'speculative' in data:
+        input_state["speculative"] = bool(data['speculative'])
+    if 'speculative_web_search' in data:
+        input_state["speculative_web_search"] = bool(data['speculative_web_search'])
+    if 'fused' in data:
+        input_state["fused"] = bool(data['fused'])
+    return input_state
+
+def flight_key(data, input_state):
+    """Key of the graph run a request can share: the normalized query and graph settings.
+
+    Requests asking for a trace, or every request when ``QUERY_COALESCING``
+    is off, get a key of their own and so a run of their own.
+    """
+    if not QUERY_COALESCING or data.get('trace'):
+        return object()
+    settings = tuple(sorted((key, value) for key, value in input_state.items() if key != 'query'))
+    return (normalize_query(input_state['query']), settings)
+
+def retry_after_seconds(error):
+    """Whole seconds a client should wait before retrying after an overload."""
+    return math.ceil(error.retry_after)
+
+def error_event(error):
+    """Payload of the ``error`` stream event; overloads carry the 429 status and Retry-After."""
+    payload = {'error': str(error)}
+    if isinstance(error, LLMOverloaded):
+        payload.update(status=429, retry_after=retry_after_seconds(error))
+    return payload
+
+def new_result():
+    """Empty result accumulated over the streamed graph steps."""
+    return {'workflow_steps': [], 'response': None, 'source': None,
+            'route': None, 'is_relevant': None, 'speculation': None, 'context_tokens': None,
+            'document_ids': None, 'cached': False}
+
+def record_step(result, key, value):
+    """Fold one finished node into ``result`` and return its progress event."""
+    result['workflow_steps'].append(key)
+    if "response" in value:
+        result['response'] = value["response"]
+    node_event = {'node': key}
+    for field in ('route', 'source', 'is_relevant', 'speculation', 'context_tokens', 'document_ids'):
+        if field in value:
+            result[field] = value[field]
+            node_event[field] = value[field]
+    return node_event
+
+def with_documents(result, data):
+    """Add the retrieved documents' display fields when the request sets ``include_documents``."""
+    if not data.get('include_documents'):
+        return result
+    return dict(result, documents=document_details(result['route'], result['document_ids'] or []))
+
+def cached_result(cached):
+    """Result for a semantic cache hit, shaped like a graph run's result."""
+    return dict(new_result(), **cached, workflow_steps=['Semantic_Cache'], cached=True, coalesced=False)
+
+def cached_events(cached):
+    """Progress, token and result events for a semantic cache hit."""
+    return [
+        ('node', {'node': 'Semantic_Cache', 'route': cached['route'],
+                  'source': cached['source'], 'is_relevant': cached['is_relevant']}),
+        ('token', {'token': cached['response']}),
+        ('done', cached_result(cached)),
+    ]
+
+def with_timings(payload, started, first_byte, first_token):
+    """Attach time to first byte / first token to the final event."""
+    payload = dict(payload, success=True, timings={
+        'ttfb_ms': first_byte * 1000,
+        'ttft_ms': first_token * 1000 if first_token is not None else None,
+        'total_ms': (time.perf_counter() - started) * 1000,
+    })
+    print(f"---STREAM TIMINGS: {payload['timings']}---")
+    return payload
+
+def sse_event(event, payload):
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@routes.route('/')
 def index():
     """Render the main page."""
     return render_template('index.html')
 
-@app.route('/query', methods=['POST'])
+def answer_query(input_state, use_cache):
+    """Run the agentic RAG workflow, store the answer in the cache and return the result."""
+    get_llm_scheduler().admit()
+    result = new_result()
+    for step in agentic_rag.stream(input_state):
+        for key, value in step.items():
+            record_step(result, key, value)
+
+    if use_cache and result['response']:
+        get_answer_cache().store(
+            input_state['query'],
+            response=result['response'],
+            source=result['source'],
+            route=result['route'],
+            is_relevant=result['is_relevant'],
+            document_ids=result['document_ids']
+        )
+    return result
+
+@routes.route('/query', methods=['POST'])
 def query():
     """Handle the query and return the agentic RAG response."""
     try:
-        data = request.get_json()
-        user_query = data.get('query', '')
-        
-        if not user_query:
-            return jsonify({'error': 'Query is required'}), 400
-        
-        # Prepare input state
-        input_state = {"query": user_query}
-        
-        # Track the workflow execution
-        workflow_steps = []
-        final_response = None
-        source = None
-        route = None
-        is_relevant = None
-        
-        # Stream through the agentic RAG workflow
-        for step in agentic_rag.stream(input_state):
-            for key, value in step.items():
-                workflow_steps.append(key)
-                
-                # Capture important metadata
-                if "response" in value:
-                    final_response = value["response"]
-                if "source" in value:
-                    source = value["source"]
-                if "route" in value:
-                    route = value["route"]
-                if "is_relevant" in value:
-                    is_relevant = value["is_relevant"]
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not data.get('query'):
+            return jsonify({'success': False, 'error': 'Query is required'}), 400
+        user_query = data['query']
+
+        # Near-duplicate questions are answered from the semantic cache
+        use_cache = data.get('use_cache', True)
+        if use_cache:
+            cached = get_answer_cache().lookup(user_query)
+            if cached:
+                return jsonify(with_documents(dict(cached_result(cached), success=True), data))
         
-        # Return the result
+        input_state = build_input_state(data, user_query)
+        leader = False
+
+        def answer():
+            nonlocal leader
+            leader = True
+            with telemetry.trace_request() as trace:
+                result = answer_query(input_state, use_cache)
+            return result, trace
+
+        # Concurrent identical requests wait for the first one's run and share its result
+        result, trace = query_flight.do(flight_key(data, input_state), answer)
+        telemetry.record_query_flight(leader)
+        result = with_documents(dict(result, success=True, coalesced=not leader), data)
+        if data.get('trace'):
+            # Per-node and per-LLM-call timings of this request
+            result['trace'] = trace.as_dict()
+        return jsonify(result)
+
+    except LLMOverloaded as e:
+        # Too many LLM calls waiting: tell the client when to come back instead of queueing it
+        print(f"---LLM OVERLOADED: {e}---")
         return jsonify({
-            'success': True,
-            'response': final_response,
-            'source': source,
-            'route': route,
-            'is_relevant': is_relevant,
-            'workflow_steps': workflow_steps
-        })
+            'success': False,
+            'error': str(e),
+            'retry_after': retry_after_seconds(e)
+        }), 429, {'Retry-After': str(retry_after_seconds(e))}
     
     except Exception as e:
         print(f"Error processing query: {str(e)}")
@@ -61,6 +180,169 @@ def query():
             'error': str(e)
         }), 500
 
+@routes.route('/query/stream', methods=['POST'])
+def query_stream():
+    """Stream workflow progress and the answer tokens as server-sent events.
+
+    Events: ``start`` right away, ``node`` as each graph node finishes,
+    ``token`` for every answer delta from Generate, then ``done`` with the
+    final metadata and the time to first byte / first token, or ``error``.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get('query'):
+        return jsonify({'success': False, 'error': 'Query is required'}), 400
+    user_query = data['query']
+
+    started = time.perf_counter()
+    use_cache = data.get('use_cache', True)
+    input_state = build_input_state(data, user_query)
+
+    def run_graph(publish):
+        result = new_result()
+        try:
+            cached = get_answer_cache().lookup(user_query) if use_cache else None
+            if cached:
+                for item in cached_events(cached):
+                    publish(item)
+                return
+
+            get_llm_scheduler().admit()
+            config = {"configurable": {"on_token": lambda token: publish(('token', {'token': token}))}}
+            for step in agentic_rag.stream(input_state, config=config):
+                for key, value in step.items():
+                    publish(('node', record_step(result, key, value)))
+
+            if use_cache and result['response']:
+                get_answer_cache().store(
+                    user_query,
+                    response=result['response'],
+                    source=result['source'],
+                    route=result['route'],
+                    is_relevant=result['is_relevant'],
+                    document_ids=result['document_ids']
+                )
+            publish(('done', result))
+        except Exception as e:
+            print(f"Error processing query: {str(e)}")
+            publish(('error', error_event(e)))
+        finally:
+            publish(None)
+
+    def start(publish):
+        threading.Thread(target=run_graph, args=(publish,), daemon=True).start()
+
+    # Concurrent identical requests subscribe to the run already in flight
+    # and receive all of its events, including those sent before they joined.
+    broadcast, events, leader = query_flight.stream(flight_key(data, input_state), start)
+    telemetry.record_query_flight(leader)
+
+    def generate():
+        first_token = None
+        try:
+            yield sse_event('start', {'query': user_query})
+            first_byte = time.perf_counter() - started
+            while True:
+                item = events.get()
+                if item is None:
+                    break
+                event, payload = item
+                if event == 'token' and first_token is None:
+                    first_token = time.perf_counter() - started
+                if event == 'done':
+                    payload = with_timings(with_documents(dict(payload, coalesced=not leader), data),
+                                           started, first_byte, first_token)
+                yield sse_event(event, payload)
+        finally:
+            broadcast.unsubscribe(events)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@routes.route('/query/batch', methods=['POST'])
+def query_batch():
+    """Answer a list of queries, streaming one JSON line per query as it finishes."""
+    data = request.get_json() or {}
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+        return jsonify({'error': 'queries must be a non-empty list of non-empty strings'}), 400
+    if len(queries) > BATCH_MAX_QUERIES:
+        return jsonify({'error': f'At most {BATCH_MAX_QUERIES} queries per batch'}), 400
+    use_cache = data.get('use_cache', True)
+    try:
+        get_llm_scheduler().admit()
+    except LLMOverloaded as e:
+        return jsonify({'error': str(e), 'retry_after': retry_after_seconds(e)}), 429, \
+            {'Retry-After': str(retry_after_seconds(e))}
+
+    def generate():
+        for result in iter_batch(queries, use_cache=use_cache):
+            yield json.dumps(result) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@routes.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Return hit/miss counters of the semantic answer cache."""
+    return jsonify(get_answer_cache().stats())
+
+@routes.route('/speculation/stats', methods=['GET'])
+def speculation_stats():
+    """Return latency saved and work wasted by speculative retrieval."""
+    return jsonify(speculation_metrics.snapshot())
+
+@routes.route('/context/stats', methods=['GET'])
+def context_stats():
+    """Return prompt tokens saved by context packing."""
+    return jsonify(packing_metrics.snapshot())
+
+@routes.route('/search/stats', methods=['GET'])
+def search_stats():
+    """Return hit/stale/miss counters of the web search result cache."""
+    return jsonify(get_search().stats())
+
+@routes.route('/coalesce/stats', methods=['GET'])
+def coalesce_stats():
+    """Return how many graph runs were started and how many requests joined one in flight."""
+    return jsonify(query_flight.stats())
+
+@routes.route('/llm/stats', methods=['GET'])
+def llm_stats():
+    """Return the LLM scheduler's queue, concurrency window and rejection counts."""
+    return jsonify(get_llm_scheduler().stats())
+
+@routes.route('/metrics', methods=['GET'])
+def metrics():
+    """Return node, LLM and search latency histograms and counters for Prometheus."""
+    return Response(telemetry.render(), mimetype='text/plain; version=0.0.4')
+
+@routes.route('/startup', methods=['GET'])
+def startup_stats():
+    """Return how long each startup phase took."""
+    return jsonify(startup_report.as_dict())
+
+def create_app(warm=WARMUP_ON_START):
+    """Build the Flask app.
+
+    Collections, models and clients are opened on first use, unless ``warm``
+    (``APP_WARMUP=true``) runs the warmup step here.
+    """
+    with startup_report.phase("create_app"):
+        app = Flask(__name__)
+        app.register_blueprint(routes)
+    if warm:
+        warmup()
+    startup_report.print()
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5009)
 
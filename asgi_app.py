@@ -0,0 +1,197 @@
+"""ASGI entry point serving /query from the async agentic RAG graph.
+
+Run with:  uvicorn asgi_app:app --host 0.0.0.0 --port 5009
+
+The query endpoints await ``agentic_rag_async.astream()`` on the event loop,
+so one worker process keeps many requests in flight while they wait on the
+LLM or Serper. Every other route (UI, static files, stats) is served by the
+Flask app from ``app.py``.
+"""
+
+import asyncio
+import os
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from agentic_RAG import agentic_rag_async
+from app import (
+    app as flask_app,
+    build_input_state,
+    cached_events,
+    cached_result,
+    error_event,
+    flight_key,
+    new_result,
+    query_flight,
+    record_step,
+    retry_after_seconds,
+    sse_event,
+    with_documents,
+    with_timings,
+)
+from llm_scheduler import LLMOverloaded, get_llm_scheduler
+from semantic_cache import get_answer_cache
+import telemetry
+
+# Graph runs allowed in flight per worker; further requests wait for a slot.
+QUERY_CONCURRENCY = int(os.getenv("QUERY_CONCURRENCY", "64"))
+_query_slots = asyncio.Semaphore(QUERY_CONCURRENCY)
+
+
+async def request_json(request):
+    """The request's JSON object, or None for a missing or malformed body."""
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def run_graph(input_state, on_event=None):
+    """Run the async graph under the concurrency limit and collect the result."""
+    get_llm_scheduler().admit()
+    result = new_result()
+    config = None
+    if on_event is not None:
+        config = {"configurable": {"on_token": lambda token: on_event('token', {'token': token})}}
+    async with _query_slots:
+        async for step in agentic_rag_async.astream(input_state, config=config):
+            for key, value in step.items():
+                node_event = record_step(result, key, value)
+                if on_event is not None:
+                    on_event('node', node_event)
+    return result
+
+
+async def store_result(user_query, result):
+    if result['response']:
+        await asyncio.to_thread(
+            get_answer_cache().store,
+            user_query,
+            response=result['response'],
+            source=result['source'],
+            route=result['route'],
+            is_relevant=result['is_relevant'],
+            document_ids=result['document_ids'],
+        )
+
+
+async def query(request):
+    """Async counterpart of app.query."""
+    try:
+        data = await request_json(request)
+        if not data or not data.get('query'):
+            return JSONResponse({'success': False, 'error': 'Query is required'}, status_code=400)
+        user_query = data['query']
+
+        use_cache = data.get('use_cache', True)
+        if use_cache:
+            cached = await asyncio.to_thread(get_answer_cache().lookup, user_query)
+            if cached:
+                return JSONResponse(with_documents(dict(cached_result(cached), success=True), data))
+
+        input_state = build_input_state(data, user_query)
+        leader = False
+
+        async def answer():
+            nonlocal leader
+            leader = True
+            with telemetry.trace_request() as trace:
+                result = await run_graph(input_state)
+            if use_cache:
+                await store_result(user_query, result)
+            return result, trace
+
+        result, trace = await query_flight.ado(flight_key(data, input_state), answer)
+        telemetry.record_query_flight(leader)
+        result = with_documents(dict(result, coalesced=not leader), data)
+        if data.get('trace'):
+            result['trace'] = trace.as_dict()
+        return JSONResponse(dict(result, success=True))
+
+    except LLMOverloaded as e:
+        print(f"---LLM OVERLOADED: {e}---")
+        return JSONResponse(
+            {'success': False, 'error': str(e), 'retry_after': retry_after_seconds(e)},
+            status_code=429,
+            headers={'Retry-After': str(retry_after_seconds(e))},
+        )
+    except Exception as e:
+        print(f"Error processing query: {str(e)}")
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def query_stream(request):
+    """Async counterpart of app.query_stream (same server-sent events)."""
+    data = await request_json(request)
+    if not data or not data.get('query'):
+        return JSONResponse({'success': False, 'error': 'Query is required'}, status_code=400)
+    user_query = data['query']
+
+    started = time.perf_counter()
+    use_cache = data.get('use_cache', True)
+    input_state = build_input_state(data, user_query)
+
+    async def produce(publish):
+        try:
+            cached = await asyncio.to_thread(get_answer_cache().lookup, user_query) if use_cache else None
+            if cached:
+                for item in cached_events(cached):
+                    publish(item)
+                return
+            result = await run_graph(input_state, lambda event, payload: publish((event, payload)))
+            if use_cache:
+                await store_result(user_query, result)
+            publish(('done', result))
+        except asyncio.CancelledError:
+            publish(('error', {'error': 'Cancelled'}))
+            raise
+        except Exception as e:
+            print(f"Error processing query: {str(e)}")
+            publish(('error', error_event(e)))
+        finally:
+            publish(None)
+
+    def start(publish):
+        return asyncio.create_task(produce(publish))
+
+    broadcast, events, leader = query_flight.stream(flight_key(data, input_state), start, asyncio.Queue)
+    telemetry.record_query_flight(leader)
+
+    async def generate():
+        first_token = None
+        try:
+            yield sse_event('start', {'query': user_query})
+            first_byte = time.perf_counter() - started
+            while True:
+                item = await events.get()
+                if item is None:
+                    break
+                event, payload = item
+                if event == 'token' and first_token is None:
+                    first_token = time.perf_counter() - started
+                if event == 'done':
+                    payload = with_timings(with_documents(dict(payload, coalesced=not leader), data),
+                                           started, first_byte, first_token)
+                yield sse_event(event, payload)
+        finally:
+            # Last client went away: stop the graph run instead of finishing it for nobody.
+            if broadcast.unsubscribe(events) == 0 and not broadcast.closed:
+                broadcast.producer.cancel()
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+app = Starlette(routes=[
+    Route('/query', query, methods=['POST']),
+    Route('/query/stream', query_stream, methods=['POST']),
+    Mount('/', app=WsgiToAsgi(flask_app)),
+])
@@ -0,0 +1,213 @@
+"""Answer many queries at once, for evaluation runs and cache pre-warming.
+
+    python batch.py questions.txt -o answers.jsonl   # one question per line
+
+Queries are processed in groups of ``BATCH_GROUP_SIZE``. Each group is
+embedded in one model call and routed in one vectorized pass; the LLM is
+only asked about close calls. Retrieval is one batched vector search per
+route (per distinct metadata filter on the device route). Every item then
+continues through the graph from its relevance check, with at most
+``BATCH_CONCURRENCY`` items (and so LLM calls) in flight, and its result is
+yielded as soon as it is done. A failure is reported in the result of the
+items it affects (``"success": false`` with an ``"error"``); the rest of the
+batch goes on.
+"""
+
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from agentic_RAG import agentic_rag, get_device_filters, get_local_router, set_retrieved
+from embeddings import get_embedding_service
+from retrievers import get_retrievers
+from routing import llm_route
+from semantic_cache import get_answer_cache, normalize_query
+
+load_dotenv()
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_GROUP_SIZE = int(os.getenv("BATCH_GROUP_SIZE", "256"))
+# Largest batch accepted by POST /query/batch.
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "10000"))
+
+
+def _result(index, query, state=None, *, error=None, cached=False):
+    state = state or {}
+    result = {
+        "index": index,
+        "query": query,
+        "success": error is None,
+        "response": state.get("response"),
+        "source": state.get("source"),
+        "route": state.get("route"),
+        "route_method": state.get("route_method"),
+        "is_relevant": state.get("is_relevant"),
+        "context_tokens": state.get("context_tokens"),
+        "cached": cached,
+    }
+    if error is not None:
+        result["error"] = str(error)
+    return result
+
+
+def _lookup_cached(items):
+    """Split ``items`` into results answered by the semantic cache and the rest."""
+    cache = get_answer_cache()
+    # Embed all cache keys in one model call; the lookups then hit the embedding cache.
+    get_embedding_service().embed_many([normalize_query(query) for _, query in items])
+    ready, remaining = [], []
+    for index, query in items:
+        cached = cache.lookup(query)
+        if cached:
+            ready.append(_result(index, query, cached, cached=True))
+        else:
+            remaining.append((index, query))
+    return ready, remaining
+
+
+def _prepare(items, route_pool, use_cache):
+    """Route and retrieve ``(index, query)`` items in bulk.
+
+    Returns the results already final (cache hits, routing errors) and the
+    ``(index, query, state)`` items still to run through the graph. The LLM
+    is asked about close calls on ``route_pool``.
+    """
+    ready = []
+    if use_cache:
+        ready, items = _lookup_cached(items)
+    if not items:
+        return ready, []
+
+    queries = [query for _, query in items]
+    embeddings = get_embedding_service().embed_many(queries)
+    local_router = get_local_router()
+    decisions = local_router.classify_many(embeddings)
+    llm_routes = {
+        position: route_pool.submit(llm_route, queries[position])
+        for position, (_, confidence) in enumerate(decisions)
+        if not local_router.is_confident(confidence)
+    }
+
+    states = {}
+    for position, (route, _) in enumerate(decisions):
+        route_method = "local"
+        if position in llm_routes:
+            route_method = "llm"
+            try:
+                route = llm_routes[position].result()
+            except Exception as e:
+                ready.append(_result(items[position][0], queries[position], error=e))
+                continue
+        states[position] = {
+            "query": queries[position],
+            "query_embedding": embeddings[position],
+            "route": route,
+            "route_method": route_method,
+            "source": route,
+        }
+
+    retrievers = get_retrievers()
+    for route in ("Retrieve_QnA", "Retrieve_Device"):
+        members = [position for position, state in states.items() if state["route"] == route]
+        if not members:
+            continue
+        wheres = ([get_device_filters().extract(queries[position]) for position in members]
+                  if route == "Retrieve_Device" else [None] * len(members))
+        all_results = retrievers[route].query_many(
+            [embeddings[position] for position in members], 3,
+            query_texts=[queries[position] for position in members], wheres=wheres,
+        )
+        for position, results, where in zip(members, all_results, wheres):
+            if where is not None and not results["documents"]:
+                where = None
+                results = retrievers[route].query(embeddings[position], 3, query_text=queries[position])
+            set_retrieved(states[position], route, results, where)
+            states[position]["prefetched"] = True
+
+    return ready, [(items[position][0], queries[position], state) for position, state in states.items()]
+
+
+def _finish(index, query, state, use_cache):
+    """Run one prepared item through the rest of the graph."""
+    try:
+        final_state = agentic_rag.invoke(state)
+    except Exception as e:
+        return _result(index, query, state, error=e)
+    if use_cache and final_state.get("response"):
+        try:
+            get_answer_cache().store(
+                query,
+                response=final_state["response"],
+                source=final_state.get("source"),
+                route=final_state.get("route"),
+                is_relevant=final_state.get("is_relevant"),
+                document_ids=final_state.get("document_ids"),
+            )
+        except Exception as e:
+            print(f"---ANSWER CACHE STORE FAILED: {e}---")
+    return _result(index, query, final_state)
+
+
+def iter_batch(queries, *, concurrency: int = BATCH_CONCURRENCY, group_size: int = BATCH_GROUP_SIZE,
+               use_cache: bool = True):
+    """Yield one result per query, in completion order; ``index`` is its position in ``queries``."""
+    queries = list(queries)
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+    # Separate from ``pool`` so routing a group never waits behind the previous group's items.
+    route_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-route")
+    pending = set()
+    try:
+        for start in range(0, len(queries), group_size):
+            items = list(enumerate(queries[start:start + group_size], start))
+            try:
+                ready, prepared = _prepare(items, route_pool, use_cache)
+            except Exception as e:
+                print(f"---BATCH GROUP AT {start} FAILED: {e}---")
+                ready, prepared = [_result(index, query, error=e) for index, query in items], []
+            yield from ready
+            pending.update(pool.submit(_finish, *item, use_cache) for item in prepared)
+            # Keep at most about one group queued ahead of the workers.
+            while len(pending) > group_size:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        route_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def run_batch(queries, **kwargs) -> list:
+    """Results of :func:`iter_batch`, in input order."""
+    return sorted(iter_batch(queries, **kwargs), key=lambda result: result["index"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a file of questions (one per line) as a batch.")
+    parser.add_argument("questions")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--group-size", type=int, default=BATCH_GROUP_SIZE)
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor fill the answer cache")
+    args = parser.parse_args()
+
+    with open(args.questions, encoding="utf-8") as questions_file:
+        questions = [line.strip() for line in questions_file if line.strip()]
+    started = time.perf_counter()
+    failed = 0
+    with open(args.output, "w", encoding="utf-8") as output:
+        for result in iter_batch(questions, concurrency=args.concurrency, group_size=args.group_size,
+                                 use_cache=not args.no_cache):
+            failed += not result["success"]
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    elapsed = time.perf_counter() - started
+    print(f"{len(questions)} questions ({failed} failed) in {elapsed:.1f}s "
+          f"({len(questions) / elapsed:.1f}/s) -> {args.output}")
@@ -0,0 +1,156 @@
+"""Fused relevance-and-answer calls against the separate relevance check and generate calls.
+
+Run with:  python -m benchmarks.fused_bench --rows 500 --requests 100 --llm-relevance
+
+The same queries (the mix of ``benchmarks.graph_bench``) run through
+``agentic_rag`` twice: once with ``fused`` off and once with it on. For
+each mode it reports end-to-end p50/p95/p99, LLM calls and prompt and
+completion tokens per request, and how often the fused call was used. It
+then compares the two runs query by query: how often they reached the same
+relevance verdict and source, and how alike the answers are (exact match
+and word overlap).
+
+Offline, the LLM is the stub, which always gives the same answer, so the
+agreement figures are only meaningful with ``--live``. That mode uses the
+configured OpenAI, Serper and collections, and costs real tokens.
+``--llm-relevance`` sends every relevance check to the LLM instead of
+letting the distance gate decide the clear cases; the fused call only
+replaces those LLM checks.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext, redirect_stdout
+import os
+import re
+import statistics
+import sys
+import time
+
+from benchmarks.graph_bench import build_queries
+from benchmarks.latency import DISTRIBUTIONS
+from benchmarks.offline import (
+    compare_results, index_corpora, load_corpus, offline_environment, percentiles, write_results,
+)
+import telemetry  # reads no settings the offline environment changes
+
+MODES = {"separate": False, "fused": True}
+_WORD = re.compile(r"\w+")
+
+
+def run_mode(graph, queries, fused: bool, concurrency: int):
+    """Final state, seconds and trace of every query (``None`` where the run failed)."""
+    def one(query):
+        started = time.perf_counter()
+        try:
+            with telemetry.trace_request() as trace:
+                state = graph.invoke({"query": query, "fused": fused})
+        except Exception as e:
+            print(f"---BENCH ERROR: {e}---", file=sys.stderr)
+            return None
+        return state, time.perf_counter() - started, trace.as_dict()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, queries))
+
+
+def summarize(mode, runs) -> dict:
+    done = [run for run in runs if run is not None]
+    traces = [trace for _, _, trace in done]
+
+    def per_request(key):
+        return statistics.mean(trace[key] for trace in traces) if traces else None
+
+    return {
+        "name": mode,
+        "requests": len(runs),
+        "errors": len(runs) - len(done),
+        **percentiles([seconds for _, seconds, _ in done]),
+        "llm_calls_per_request": per_request("llm_calls"),
+        "prompt_tokens_per_request": per_request("prompt_tokens"),
+        "completion_tokens_per_request": per_request("completion_tokens"),
+        "fused_share": (sum(state.get("relevance_method") == "fused" for state, _, _ in done) / len(done)
+                        if done else None),
+    }
+
+
+def word_overlap(a: str, b: str) -> float:
+    """Jaccard similarity of the two answers' word sets."""
+    words_a, words_b = set(_WORD.findall((a or "").lower())), set(_WORD.findall((b or "").lower()))
+    if not words_a and not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def agreement(separate_runs, fused_runs) -> dict:
+    pairs = [(s[0], f[0]) for s, f in zip(separate_runs, fused_runs) if s is not None and f is not None]
+    if not pairs:
+        return {"name": "agreement", "pairs": 0}
+    return {
+        "name": "agreement",
+        "pairs": len(pairs),
+        "same_source": statistics.mean(s.get("source") == f.get("source") for s, f in pairs),
+        "same_verdict": statistics.mean(s.get("is_relevant") == f.get("is_relevant") for s, f in pairs),
+        "same_answer": statistics.mean(
+            (s.get("response") or "").strip() == (f.get("response") or "").strip() for s, f in pairs
+        ),
+        "answer_word_overlap": statistics.mean(word_overlap(s.get("response"), f.get("response")) for s, f in pairs),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--live", action="store_true", help="use the configured LLM, Serper and collections")
+    parser.add_argument("--rows", type=int, default=500, help="rows of each dataset to index offline (0 = all)")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--llm-relevance", action="store_true", help="send every relevance check to the LLM")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--relevant", choices=["Yes", "No"], default="Yes", help="offline stub's relevance verdict")
+    parser.add_argument("--workdir", help="scratch directory for the offline stores (default: a new temp dir)")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change reported as a regression")
+    parser.add_argument("--verbose", action="store_true", help="keep the graph's progress output")
+    args = parser.parse_args()
+    quiet = nullcontext() if args.verbose else redirect_stdout(open(os.devnull, "w"))
+
+    if args.llm_relevance:
+        # No distance is close or far enough for the gate to decide on its own.
+        os.environ["RELEVANCE_RELEVANT_MAX_DISTANCE"] = "-1"
+        os.environ["RELEVANCE_IRRELEVANT_MIN_DISTANCE"] = "1e9"
+    if args.live:
+        with quiet:
+            df_qa, df_device = load_corpus("qa", args.requests), load_corpus("device", args.requests)
+    else:
+        from benchmarks.llm_stub import StubHandler
+
+        offline_environment(
+            args.workdir, llm_latency_ms=args.llm_latency_ms, llm_jitter_ms=args.llm_jitter_ms,
+            distribution=args.distribution,
+        )
+        StubHandler.relevant = args.relevant
+        with quiet:
+            df_qa, df_device = index_corpora(args.rows or None)
+    # Project modules read their settings at import, so they come after the environment is set.
+    from agentic_RAG import agentic_rag
+
+    queries = build_queries(df_qa, df_device, args.requests)
+    runs, results = {}, []
+    for mode, fused in MODES.items():
+        with quiet:
+            runs[mode] = run_mode(agentic_rag, queries, fused, args.concurrency)
+        results.append(summarize(mode, runs[mode]))
+        print(results[-1])
+    results.append(agreement(runs["separate"], runs["fused"]))
+    print(results[-1])
+
+    if args.output:
+        write_results(args.output, results)
+    if args.baseline:
+        regressions = compare_results(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
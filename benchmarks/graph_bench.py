@@ -0,0 +1,179 @@
+"""End-to-end latency and throughput of the graphs, run offline.
+
+Run with:  python -m benchmarks.graph_bench --rows 500 --concurrency 1 8 32 --requests 128
+
+The collections hold the first ``--rows`` rows of each dataset, embedded
+with fixed-vector embeddings. The LLM and Serper are local stubs with
+simulated latency (see ``benchmarks.offline``). For every graph and
+concurrency level the run keeps that many queries in flight until
+``--requests`` are done. It reports end-to-end and per-node p50/p95/p99,
+requests per second, LLM calls per request and peak RSS. ``--output``
+saves the results and ``--baseline`` flags regressions against a saved run.
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext, redirect_stdout
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.latency import DISTRIBUTIONS
+from benchmarks.offline import (
+    compare_results, index_corpora, offline_environment, peak_rss_mb, percentiles, write_results,
+)
+import telemetry  # reads no settings the offline environment changes
+
+GRAPHS = ("agentic_rag", "agentic_rag_async", "rag_agent")
+WEB_QUERIES = [
+    "What is the latest news on FDA medical device recalls this week?",
+    "What's the export duty on medical tablets on India by USA in 2025?",
+    "Which hospitals announced new robotic surgery programs today?",
+]
+
+
+def build_queries(df_qa, df_device, count: int) -> list:
+    """A fixed mix of Q&A, device and web questions: 45% / 45% / 10%."""
+    questions = df_qa["Question"].dropna().astype(str).tolist()
+    devices = [
+        f"What is the {row.Device_Name} model {row.Model_Number} by {row.Manufacturer} used for?"
+        for row in df_device.itertuples()
+    ]
+    queries = []
+    for i in range(count):
+        if i % 10 == 9:
+            queries.append(WEB_QUERIES[(i // 10) % len(WEB_QUERIES)])
+        elif i % 2 == 0:
+            queries.append(questions[(i // 2) % len(questions)])
+        else:
+            queries.append(devices[(i // 2) % len(devices)])
+    return queries
+
+
+def _invoke(graph, query):
+    started = time.perf_counter()
+    with telemetry.trace_request() as trace:
+        graph.invoke({"query": query})
+    return time.perf_counter() - started, trace.as_dict()
+
+
+async def _ainvoke(graph, query):
+    started = time.perf_counter()
+    with telemetry.trace_request() as trace:
+        await graph.ainvoke({"query": query})
+    return time.perf_counter() - started, trace.as_dict()
+
+
+def run_sync(graph, queries, concurrency: int):
+    """Run ``queries`` through ``graph`` with ``concurrency`` threads; returns (runs, errors, seconds)."""
+    runs, errors = [], 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(_invoke, graph, query) for query in queries]:
+            try:
+                runs.append(future.result())
+            except Exception as e:
+                errors += 1
+                print(f"---BENCH ERROR: {e}---", file=sys.stderr)
+    return runs, errors, time.perf_counter() - started
+
+
+def run_async(graph, queries, concurrency: int):
+    """Async counterpart of :func:`run_sync`: ``concurrency`` runs in flight on one event loop."""
+    async def main():
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one(query):
+            async with slots:
+                return await _ainvoke(graph, query)
+
+        return await asyncio.gather(*(one(query) for query in queries), return_exceptions=True)
+
+    started = time.perf_counter()
+    outcomes = asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    runs = [outcome for outcome in outcomes if not isinstance(outcome, BaseException)]
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            print(f"---BENCH ERROR: {outcome}---", file=sys.stderr)
+    return runs, len(outcomes) - len(runs), elapsed
+
+
+def summarize(graph_name, concurrency, runs, errors, elapsed) -> dict:
+    node_seconds = {}
+    for _, trace in runs:
+        for span in trace["spans"]:
+            if span["kind"] == "node":
+                node_seconds.setdefault(span["name"], []).append(span["ms"] / 1000)
+    return {
+        "name": f"{graph_name}@{concurrency}",
+        "graph": graph_name,
+        "concurrency": concurrency,
+        "requests": len(runs) + errors,
+        "errors": errors,
+        "requests_per_s": len(runs) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.mean(seconds for seconds, _ in runs) * 1000 if runs else None,
+        **percentiles([seconds for seconds, _ in runs]),
+        "llm_calls_per_request": statistics.mean(trace["llm_calls"] for _, trace in runs) if runs else None,
+        "nodes": {node: dict(percentiles(seconds), runs=len(seconds)) for node, seconds in sorted(node_seconds.items())},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--graphs", nargs="+", choices=GRAPHS, default=list(GRAPHS))
+    parser.add_argument("--rows", type=int, default=500, help="rows of each dataset to index (0 = all)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=128)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--search-latency-ms", type=float, default=300)
+    parser.add_argument("--search-jitter-ms", type=float, default=100)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--workdir", help="scratch directory for the stores (default: a new temp dir)")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change reported as a regression")
+    parser.add_argument("--verbose", action="store_true", help="keep the graph's progress output")
+    args = parser.parse_args()
+    # The nodes print every step; writing that to a terminal would be timed too.
+    quiet = nullcontext() if args.verbose else redirect_stdout(open(os.devnull, "w"))
+
+    workdir = offline_environment(
+        args.workdir,
+        llm_latency_ms=args.llm_latency_ms, llm_jitter_ms=args.llm_jitter_ms,
+        search_latency_ms=args.search_latency_ms, search_jitter_ms=args.search_jitter_ms,
+        distribution=args.distribution,
+    )
+    # Project modules read their settings at import, so they come after offline_environment().
+    from agentic_RAG import agentic_rag, agentic_rag_async
+    from rag import rag_agent
+
+    started = time.perf_counter()
+    with quiet:
+        df_qa, df_device = index_corpora(args.rows or None)
+    print(f"---BENCH SETUP: {len(df_qa)} + {len(df_device)} rows indexed in {workdir} "
+          f"in {time.perf_counter() - started:.1f}s---", file=sys.stderr)
+
+    graphs = {"agentic_rag": agentic_rag, "agentic_rag_async": agentic_rag_async, "rag_agent": rag_agent}
+    queries = build_queries(df_qa, df_device, args.requests)
+    results = []
+    for graph_name in args.graphs:
+        run = run_async if graph_name.endswith("_async") else run_sync
+        for concurrency in args.concurrency:
+            with quiet:
+                outcome = run(graphs[graph_name], queries, concurrency)
+            result = summarize(graph_name, concurrency, *outcome)
+            results.append(result)
+            print(result)
+
+    if args.output:
+        write_results(args.output, results)
+    if args.baseline:
+        regressions = compare_results(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
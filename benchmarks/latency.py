@@ -0,0 +1,26 @@
+"""Simulated service latency for the stubs.
+
+Every distribution has mean ``latency`` seconds; ``jitter`` is its spread:
+the half-width for ``uniform`` and the standard deviation for ``normal``
+and ``lognormal``. ``lognormal`` gives the long right tail real LLM APIs
+show, so p99 sits well above the median.
+"""
+
+import math
+import random
+
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+
+def sample_latency(latency: float, jitter: float = 0.0, distribution: str = "uniform", rng=random) -> float:
+    """One latency in seconds, never negative."""
+    if distribution == "fixed" or jitter <= 0 or latency <= 0:
+        return max(latency, 0.0)
+    if distribution == "uniform":
+        return max(latency + rng.uniform(-1, 1) * jitter, 0.0)
+    if distribution == "normal":
+        return max(rng.gauss(latency, jitter), 0.0)
+    if distribution == "lognormal":
+        sigma = math.sqrt(math.log(1 + (jitter / latency) ** 2))
+        return rng.lognormvariate(math.log(latency) - sigma ** 2 / 2, sigma)
+    raise ValueError(f"Unknown latency distribution {distribution!r}")
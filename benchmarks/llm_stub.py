@@ -0,0 +1,139 @@
+"""OpenAI-compatible chat-completions stub with simulated latency.
+
+Run with:  python -m benchmarks.llm_stub --port 8001 --latency-ms 800
+then point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8001/v1.
+
+Router prompts get a route (``--route``), relevance prompts get "Yes"
+(``--relevant``) and every other prompt gets a fixed answer, so the graph
+always completes. Requests for structured output (the fused relevance and
+answer call) get both as JSON. ``--distribution`` shapes the simulated latency, and
+``--rate-limit`` answers 429 with Retry-After above that many requests per
+second, like the real API's rate limits.
+"""
+
+import argparse
+from collections import deque
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.latency import DISTRIBUTIONS, sample_latency
+
+ANSWER = "Kawasaki disease is treated with intravenous immunoglobulin and aspirin."
+
+
+def canned_reply(prompt: str, route: str = "Retrieve_QnA", relevant: str = "Yes", structured: bool = False) -> str:
+    if structured:
+        return json.dumps({"relevant": relevant, "answer": ANSWER if relevant == "Yes" else ""})
+    if "routing agent" in prompt:
+        return route
+    if "'Yes' or 'No'" in prompt:
+        return relevant
+    return ANSWER
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency_seconds = 0.5
+    jitter_seconds = 0.0
+    distribution = "uniform"
+    route = "Retrieve_QnA"
+    relevant = "Yes"
+    rate_limit = 0  # requests per second; 0 = unlimited
+    _recent = deque()
+    _recent_lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _over_rate_limit(self) -> bool:
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self._recent_lock:
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                return True
+            self._recent.append(now)
+            return False
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self._over_rate_limit():
+            payload = json.dumps({"error": {"message": "Rate limit reached", "type": "requests",
+                                            "code": "rate_limit_exceeded"}}).encode()
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        prompt = body["messages"][-1]["content"]
+        reply = canned_reply(prompt, self.route, self.relevant, structured="response_format" in body)
+        usage = {"prompt_tokens": len(prompt.split()), "completion_tokens": len(reply.split()),
+                 "total_tokens": len(prompt.split()) + len(reply.split())}
+        time.sleep(sample_latency(self.latency_seconds, self.jitter_seconds, self.distribution))
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for word in reply.split(" "):
+                chunk = {
+                    "id": "stub", "object": "chat.completion.chunk", "created": 0,
+                    "model": body["model"],
+                    "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            if (body.get("stream_options") or {}).get("include_usage"):
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "created": 0,
+                         "model": body["model"], "choices": [], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+            return
+
+        payload = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                         "finish_reason": "stop"}],
+            "usage": usage,
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def serve(port: int, latency_ms: float, jitter_ms: float = 0.0, distribution: str = "uniform") -> ThreadingHTTPServer:
+    """Create the stub server; ``port=0`` picks a free port (see ``server.server_address``)."""
+    StubHandler.latency_seconds = latency_ms / 1000
+    StubHandler.jitter_seconds = jitter_ms / 1000
+    StubHandler.distribution = distribution
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--route", choices=["Retrieve_QnA", "Retrieve_Device", "Web_Search"], default="Retrieve_QnA")
+    parser.add_argument("--relevant", choices=["Yes", "No"], default="Yes")
+    parser.add_argument("--rate-limit", type=float, default=0, help="requests/s before answering 429 (0 = off)")
+    args = parser.parse_args()
+    StubHandler.route = args.route
+    StubHandler.relevant = args.relevant
+    StubHandler.rate_limit = args.rate_limit
+
+    server = serve(args.port, args.latency_ms, args.jitter_ms, args.distribution)
+    print(f"LLM stub on http://127.0.0.1:{args.port}/v1 ({args.latency_ms:.0f} ms latency)")
+    server.serve_forever()
@@ -0,0 +1,73 @@
+"""Closed-loop load generator for the /query endpoint.
+
+Run with:  python -m benchmarks.load_test --url http://127.0.0.1:5009/query --concurrency 32 --requests 256
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+QUERIES = [
+    "What are the treatments for Kawasaki disease?",
+    "What are the symptoms of Parkinson's disease?",
+    "How is type 2 diabetes diagnosed?",
+    "What causes high blood pressure?",
+]
+
+
+async def run_load(url: str, concurrency: int, total_requests: int, timeout: float = 300.0) -> dict:
+    """Keep ``concurrency`` requests in flight until ``total_requests`` are done."""
+    latencies = []
+    errors = 0
+    next_request = 0
+
+    async def worker(client):
+        nonlocal errors, next_request
+        while next_request < total_requests:
+            index = next_request
+            next_request += 1
+            body = {"query": QUERIES[index % len(QUERIES)], "use_cache": False}
+            started = time.perf_counter()
+            try:
+                response = await client.post(url, json=body)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(int(p * len(latencies)), len(latencies) - 1)] * 1000 if latencies else None
+
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "requests_per_s": len(latencies) / elapsed,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else None,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5009/query")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=128)
+    args = parser.parse_args()
+
+    for concurrency in args.concurrency:
+        print(asyncio.run(run_load(args.url, concurrency, args.requests)))
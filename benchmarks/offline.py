@@ -0,0 +1,162 @@
+"""Offline environment, corpora and statistics shared by the benchmarks.
+
+:func:`offline_environment` starts the LLM and Serper stubs on free ports
+and points the app's settings at them, at :class:`HashEmbeddingFunction`
+and at a scratch directory for every store. The real graphs then run with
+no network access. Call it before importing any project module, because
+most settings are read at import time.
+
+The corpora come from the dataset snapshots (``datasets.py``). A snapshot
+that does not exist yet is built once, which needs the network for the Q&A
+dataset.
+"""
+
+from functools import lru_cache
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+import resource
+import tempfile
+import threading
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction
+
+from benchmarks import llm_stub, serper_stub
+
+EMBEDDING_DIMENSIONS = 384
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=1 << 16)
+def _bucket(word: str, dimensions: int):
+    value = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+    return value % dimensions, 1.0 if value >> 63 else -1.0
+
+
+class HashEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Deterministic bag-of-words embeddings by signed feature hashing.
+
+    Texts that share words get nearby unit vectors, so retrieval, routing
+    and the relevance gate behave sensibly. The vectors are the same in
+    every process and run, and computing them needs no model download.
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def __call__(self, input: Documents):
+        vectors = np.zeros((len(input), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(input):
+            for word in _WORD.findall(text.lower()):
+                column, sign = _bucket(word, self.dimensions)
+                vectors[row, column] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1.0)
+        return list(vectors)
+
+
+def offline_environment(workdir=None, *, llm_latency_ms: float = 300, llm_jitter_ms: float = 0,
+                        search_latency_ms: float = 300, search_jitter_ms: float = 0,
+                        distribution: str = "lognormal") -> Path:
+    """Start the stubs and point the settings at them and at ``workdir``; returns ``workdir``."""
+    workdir = Path(workdir) if workdir is not None else Path(tempfile.mkdtemp(prefix="rag-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    llm = llm_stub.serve(0, llm_latency_ms, llm_jitter_ms, distribution)
+    search = serper_stub.serve(0, search_latency_ms, search_jitter_ms, distribution)
+    for server in (llm, search):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ.update({
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{llm.server_address[1]}/v1",
+        "SERPER_BASE_URL": f"http://127.0.0.1:{search.server_address[1]}",
+        "SERPER_API_KEY": "offline",
+        "EMBEDDING_FUNCTION": f"{__name__}:{HashEmbeddingFunction.__name__}",
+        "CHROMA_DB_PATH": str(workdir / "chroma_db"),
+        "VECTOR_INDEX_DIR": str(workdir / "vector_index"),
+        "LEXICAL_INDEX_DIR": str(workdir / "lexical_index"),
+        "METADATA_STORE_DIR": str(workdir / "metadata_store"),
+        "SEARCH_CACHE_PATH": str(workdir / "search_cache.sqlite3"),
+        "SEMANTIC_CACHE_PATH": str(workdir / "semantic_cache_db"),
+    })
+    # The stubs have no rate limits; set these to benchmark the LLM scheduler's budgets.
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "0")
+    os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "0")
+    return workdir
+
+
+def load_corpus(name: str, rows=None):
+    """The first ``rows`` rows (all when ``None``) of a fixed shuffle of dataset ``name``.
+
+    Smaller corpora are subsets of larger ones, so sizes compare like for like.
+    """
+    from datasets import read_snapshot
+
+    table = read_snapshot(name)
+    order = np.random.RandomState(0).permutation(table.num_rows)
+    if rows is not None:
+        order = order[:rows]
+    df = table.take(order).to_pandas()
+    # Chroma metadata accepts NaN but not None for missing values.
+    return df.where(df.notna(), np.nan)
+
+
+def index_corpora(rows=None):
+    """Index the first ``rows`` rows of both datasets into the app's collections.
+
+    Also builds the local router and device filters, so the first request
+    does not pay for them. Returns the Q&A and device frames.
+    """
+    from agentic_RAG import get_device_filters, get_local_router
+    from chromaDB import get_collections, sync_collection
+
+    df_qa, df_device = load_corpus("qa", rows), load_corpus("device", rows)
+    for collection, df in zip(get_collections(), (df_qa, df_device)):
+        sync_collection(collection, df)
+    get_local_router()
+    get_device_filters()
+    return df_qa, df_device
+
+
+def percentiles(seconds, points=(50, 95, 99)) -> dict:
+    """``{"p50_ms": ..., ...}`` of a list of durations in seconds (nearest rank)."""
+    values = sorted(seconds)
+    if not values:
+        return {f"p{point}_ms": None for point in points}
+    return {
+        f"p{point}_ms": values[min(int(point / 100 * len(values)), len(values) - 1)] * 1000
+        for point in points
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (Linux reports KiB)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_results(path, results):
+    Path(path).write_text(json.dumps(results, indent=2))
+
+
+def compare_results(results, baseline_path, tolerance: float = 0.2) -> list:
+    """Regressions against a saved run, matching records by ``name``.
+
+    ``*_ms`` values that grew, and ``*_per_s`` values that shrank, by more
+    than ``tolerance`` (relative) are reported.
+    """
+    baseline = {record["name"]: record for record in json.loads(Path(baseline_path).read_text())}
+    regressions = []
+    for record in results:
+        before = baseline.get(record["name"])
+        if before is None:
+            continue
+        for key, value in record.items():
+            old = before.get(key)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            if (key.endswith("_ms") and change > tolerance) or (key.endswith("_per_s") and -change > tolerance):
+                regressions.append(f"{record['name']} {key}: {old:.2f} -> {value:.2f} ({change:+.0%})")
+    return regressions
@@ -0,0 +1,140 @@
+"""Retrieval microbenchmarks on the Q&A and device collections at several corpus sizes.
+
+Run with:  python -m benchmarks.retrieval_bench --sizes 500 2000 8000 full --queries 200
+
+For each dataset and size, the first rows of a fixed shuffle (as in
+``benchmarks.graph_bench``) are indexed into a fresh Chroma collection
+with fixed-vector embeddings. Single queries, made from the questions and
+device names of those rows and embedded beforehand, are then timed
+against each layer the graph can use:
+
+- ``chroma``: :class:`retrievers.ChromaRetriever`
+- ``local``: :class:`retrievers.LocalIndex` (memory-mapped exact search)
+- ``bm25``: :class:`lexical_index.BM25Index`
+- ``stack``: BM25 fusion and parent expansion over Chroma, as served
+
+Each line reports p50/p95/p99 per query, queries per second, the time to
+build that layer's index and peak RSS.
+"""
+
+import argparse
+from contextlib import redirect_stdout
+import os
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+import chromadb
+
+from benchmarks.offline import (
+    HashEmbeddingFunction, compare_results, load_corpus, peak_rss_mb, percentiles, write_results,
+)
+from chromaDB import sync_collection
+from lexical_index import BM25Index
+from retrievers import (
+    HYBRID_LEXICAL_WEIGHTS, ROUTE_COLLECTIONS, ChromaRetriever, HybridRetriever, LocalIndex, ParentRetriever,
+    build_lexical_index, build_local_index,
+)
+
+ROUTES = {"qa": "Retrieve_QnA", "device": "Retrieve_Device"}
+
+
+def sample_queries(name, df, count: int) -> list:
+    """Questions (Q&A) or device descriptions (devices) taken from ``df`` itself."""
+    if name == "qa":
+        texts = df["Question"].dropna().astype(str).tolist()
+    else:
+        texts = [f"{row.Device_Name} {row.Model_Number} {row.Manufacturer}" for row in df.itertuples()]
+    return [texts[i % len(texts)] for i in range(count)]
+
+
+def time_queries(search, queries) -> dict:
+    durations = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        durations.append(time.perf_counter() - started)
+    total = sum(durations)
+    return {**percentiles(durations), "queries_per_s": len(durations) / total if total else 0.0}
+
+
+def bench_size(name, df, texts, workdir: Path) -> list:
+    """Build every index for one corpus and time the queries ``texts`` against each."""
+    size = len(df)
+    embedding_function = HashEmbeddingFunction()
+    queries = list(zip(texts, embedding_function(texts)))
+
+    started = time.perf_counter()
+    client = chromadb.PersistentClient(path=str(workdir / f"{name}-{size}" / "chroma_db"))
+    collection = client.get_or_create_collection(ROUTE_COLLECTIONS[ROUTES[name]], embedding_function=embedding_function)
+    # The bench builds its own indexes below, under ``workdir``.
+    sync_collection(collection, df, workdir / f"{name}-{size}" / "metadata_store", refresh_indexes=False)
+    chroma = ChromaRetriever(collection)
+    build_seconds = {"chroma": time.perf_counter() - started}
+
+    started = time.perf_counter()
+    local = LocalIndex(build_local_index(collection, workdir / f"{name}-{size}" / "vector_index"))
+    build_seconds["local"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    bm25 = BM25Index(build_lexical_index(chroma, collection.name, workdir / f"{name}-{size}" / "lexical_index"))
+    build_seconds["bm25"] = time.perf_counter() - started
+    stack = ParentRetriever(HybridRetriever(chroma, bm25, lexical_weight=HYBRID_LEXICAL_WEIGHTS[ROUTES[name]]))
+    build_seconds["stack"] = None  # no index of its own
+
+    searches = {
+        "chroma": lambda query: chroma.query(query[1], 3),
+        "local": lambda query: local.query(query[1], 3),
+        "bm25": lambda query: bm25.search(query[0], 20),
+        "stack": lambda query: stack.query(query[1], 3, query_text=query[0]),
+    }
+    results = []
+    for layer, search in searches.items():
+        search(queries[0])  # first query opens files and warms caches
+        results.append({
+            "name": f"{name}/{size}/{layer}",
+            "dataset": name,
+            "rows": size,
+            "chunks": collection.count(),
+            "layer": layer,
+            **time_queries(search, queries),
+            "build_ms": build_seconds[layer] * 1000 if build_seconds[layer] is not None else None,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--datasets", nargs="+", choices=list(ROUTES), default=list(ROUTES))
+    parser.add_argument("--sizes", nargs="+", default=["500", "2000", "8000", "full"],
+                        help="rows per corpus; 'full' is the whole dataset")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--workdir", help="scratch directory for the indexes (default: a new temp dir)")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change reported as a regression")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="rag-retrieval-bench-"))
+    results = []
+    for name in args.datasets:
+        full = load_corpus(name)
+        sizes = sorted({len(full) if size == "full" else min(int(size), len(full)) for size in args.sizes})
+        for size in sizes:
+            df = full.iloc[:size]
+            # Index builds print their progress; keep the report readable.
+            with redirect_stdout(open(os.devnull, "w")):
+                size_results = bench_size(name, df, sample_queries(name, df, args.queries), workdir)
+            for result in size_results:
+                results.append(result)
+                print(result)
+
+    if args.output:
+        write_results(args.output, results)
+    if args.baseline:
+        regressions = compare_results(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,90 @@
+"""Serper-compatible search stub with simulated latency.
+
+Run with:  python -m benchmarks.serper_stub --port 8002 --latency-ms 300
+then point the app at it with SERPER_BASE_URL=http://127.0.0.1:8002
+(any SERPER_API_KEY works).
+
+Every query gets two organic results built from the query text. GET /stats
+returns how many searches the stub has served, e.g. to check that the
+search cache coalesced identical requests.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.latency import DISTRIBUTIONS, sample_latency
+
+
+def canned_results(query: str) -> dict:
+    return {
+        "searchParameters": {"q": query, "type": "search"},
+        "organic": [
+            {"title": f"{query} - overview", "link": "https://example.org/1",
+             "snippet": f"Stub search result about {query}.", "position": 1},
+            {"title": f"{query} - latest news", "link": "https://example.org/2",
+             "snippet": f"Recent reporting on {query}.", "position": 2},
+        ],
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency_seconds = 0.3
+    jitter_seconds = 0.0
+    distribution = "uniform"
+    searches = 0
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/stats":
+            self.send_error(404)
+            return
+        self._send_json({"searches": StubHandler.searches})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query).get("q", [""])[0]
+        if self.headers.get("Content-Length"):
+            self.rfile.read(int(self.headers["Content-Length"]))
+        with StubHandler._lock:
+            StubHandler.searches += 1
+        time.sleep(sample_latency(self.latency_seconds, self.jitter_seconds, self.distribution))
+        self._send_json(canned_results(query))
+
+    def _send_json(self, body):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def serve(port: int, latency_ms: float, jitter_ms: float = 0.0, distribution: str = "uniform") -> ThreadingHTTPServer:
+    """Create the stub server; ``port=0`` picks a free port (see ``server.server_address``)."""
+    StubHandler.latency_seconds = latency_ms / 1000
+    StubHandler.jitter_seconds = jitter_ms / 1000
+    StubHandler.distribution = distribution
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="uniform")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency_ms, args.jitter_ms, args.distribution)
+    print(f"Serper stub on http://127.0.0.1:{args.port} ({args.latency_ms:.0f} ms latency)")
+    server.serve_forever()
@@ -1,20 +1,110 @@
 from pathlib import Path
+import hashlib
+import os
+import re
 import shutil
+import threading
 
 import chromadb
 from chromadb.errors import InvalidArgumentError
 
-from datasets import df_qa, df_medical_device
+from datasets import load_samples
+from embeddings import make_embedding_function
+from metadata_store import chroma_metadatas, write_metadata_store
 
 
-DB_PATH = Path(__file__).parent / "chroma_db"
-QA_DOCS = df_qa["combined_text"].astype(str).tolist()
-QA_METAS = df_qa.to_dict(orient="records")
-QA_IDS = df_qa.index.astype(str).tolist()
+DB_PATH = Path(os.getenv("CHROMA_DB_PATH", Path(__file__).parent / "chroma_db"))
+QA_COLLECTION = "medical_q_n_a"
+DEVICE_COLLECTION = "medical_device_manual"
+# Upper bound on ids per Chroma add/delete call during ingestion.
+INGEST_BATCH_SIZE = int(os.getenv("CHROMA_INGEST_BATCH_SIZE", "256"))
+# Collection metadata marker set by ingest.py once the full dataset is indexed.
+FULL_INGEST_MARKER = "ingest.py"
+# Documents are stored as overlapping, sentence-aligned chunks of about this many words.
+CHUNK_SIZE_WORDS = int(os.getenv("CHUNK_SIZE_WORDS", "120"))
+CHUNK_OVERLAP_SENTENCES = int(os.getenv("CHUNK_OVERLAP_SENTENCES", "1"))
+# Part of every chunk id, so changing the chunking replaces the stored chunks.
+CHUNK_LAYOUT = f"{CHUNK_SIZE_WORDS}w{CHUNK_OVERLAP_SENTENCES}s"
+# Re-sync non-empty collections with the current sample at startup, not only seed empty ones.
+SYNC_ON_STARTUP = os.getenv("CHROMA_SYNC_ON_STARTUP", "false").lower() == "true"
 
-DEVICE_DOCS = df_medical_device["combined_text"].astype(str).tolist()
-DEVICE_METAS = df_medical_device.to_dict(orient="records")
-DEVICE_IDS = df_medical_device.index.astype(str).tolist()
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def content_id(text: str) -> str:
+    """Content-addressed document id: identical text always maps to the same id."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def split_sentences(text: str) -> list:
+    return [sentence for sentence in _SENTENCE_END.split(text.strip()) if sentence]
+
+
+def chunk_id(parent_id: str, index: int, layout: str = CHUNK_LAYOUT) -> str:
+    return f"{parent_id}#{layout}-{index}"
+
+
+def sibling_chunk_id(chunk: str, index: int) -> str:
+    """Id of chunk ``index`` of the same parent as ``chunk``."""
+    return f"{chunk.rsplit('-', 1)[0]}-{index}"
+
+
+def chunk_document(parent_id, document, metadata, *, size_words=CHUNK_SIZE_WORDS,
+                   overlap_sentences=CHUNK_OVERLAP_SENTENCES):
+    """Split a document into chunks of whole sentences; returns ``(ids, documents, metadatas)``.
+
+    The first sentence (the question, or the device name) heads every chunk.
+    Consecutive chunks share ``overlap_sentences`` sentences. Each chunk's
+    metadata is the parent's plus ``parent_id``, ``chunk_index``,
+    ``chunk_count`` and ``chunk_start`` (its first sentence after the heading).
+    """
+    sentences = split_sentences(document) or [document]
+    heading, body = sentences[0], sentences[1:]
+    heading_words = len(heading.split())
+
+    windows = []
+    start = 0
+    while start < len(body) or not windows:
+        end, words = start, heading_words
+        while end < len(body) and (end == start or words + len(body[end].split()) <= size_words):
+            words += len(body[end].split())
+            end += 1
+        windows.append((start, end))
+        if end >= len(body):
+            break
+        start = max(end - overlap_sentences, start + 1)
+
+    ids, documents, metadatas = [], [], []
+    for index, (start, end) in enumerate(windows):
+        ids.append(chunk_id(parent_id, index))
+        documents.append(document if len(windows) == 1 else " ".join([heading, *body[start:end]]))
+        metadatas.append(dict(
+            metadata, parent_id=parent_id, chunk_index=index, chunk_count=len(windows), chunk_start=start,
+        ))
+    return ids, documents, metadatas
+
+
+def chunk_rows(documents, metadatas):
+    """Chunks of every row, with content-hash parent ids; returns ``(ids, documents, metadatas)``."""
+    ids, chunk_documents, chunk_metadatas = [], [], []
+    for document, metadata in zip(documents, metadatas):
+        chunks = chunk_document(content_id(document), document, metadata)
+        ids.extend(chunks[0])
+        chunk_documents.extend(chunks[1])
+        chunk_metadatas.extend(chunks[2])
+    return ids, chunk_documents, chunk_metadatas
+
+
+def merge_chunks(documents, metadatas) -> str:
+    """Text covered by chunks of one parent: the heading, then each sentence once, in order."""
+    heading = None
+    body = {}
+    for document, metadata in zip(documents, metadatas):
+        sentences = split_sentences(document)
+        heading = heading or sentences[0]
+        for offset, sentence in enumerate(sentences[1:]):
+            body[metadata["chunk_start"] + offset] = sentence
+    return " ".join([heading, *(body[position] for position in sorted(body))])
 
 
 def _reset_chroma_path() -> None:
@@ -26,66 +116,164 @@ def _init_client() -> chromadb.PersistentClient:
     return chromadb.PersistentClient(path=str(DB_PATH))
 
 
+def _batches(items, size=INGEST_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _fully_ingested(collection) -> bool:
+    return (collection.metadata or {}).get("ingested_by") == FULL_INGEST_MARKER
+
+
 def _populate_collection(collection, *, documents, metadatas, ids):
-    try:
-        current_size = collection.count()
-    except InvalidArgumentError:
-        raise
+    """Sync the collection with the given rows, embedding only what changed.
 
-    if current_size >= len(ids):
+    Ids are derived from content hashes and the chunk layout, so a row whose
+    text (or the chunking) changed shows up as new ids plus stale ones. New ids are upserted and ids no longer present are
+    deleted, both in batches of ``INGEST_BATCH_SIZE``; unchanged rows are
+    never re-embedded. Collections indexed in full by ``ingest.py`` are left
+    as they are rather than shrunk back to the sample.
+    """
+    if _fully_ingested(collection):
         return collection
 
-    if current_size > 0:
-        collection.delete(where={})
+    # Duplicate texts share an id; keep the first row for each.
+    wanted = {}
+    for doc_id, document, metadata in zip(ids, documents, metadatas):
+        wanted.setdefault(doc_id, (document, metadata))
+
+    stored_ids = set(collection.get(include=[])["ids"])
+    new_ids = [doc_id for doc_id in wanted if doc_id not in stored_ids]
+    stale_ids = [doc_id for doc_id in stored_ids if doc_id not in wanted]
+
+    for batch in _batches(stale_ids):
+        collection.delete(ids=batch)
+    for batch in _batches(new_ids):
+        collection.upsert(
+            ids=batch,
+            documents=[wanted[doc_id][0] for doc_id in batch],
+            metadatas=[wanted[doc_id][1] for doc_id in batch],
+        )
 
-    collection.add(documents=documents, metadatas=metadatas, ids=ids)
+    if new_ids or stale_ids:
+        print(f"{collection.name}: +{len(new_ids)} new, -{len(stale_ids)} removed, "
+              f"{len(wanted) - len(new_ids)} unchanged")
     return collection
 
 
-def _build_collections():
+def _sample_rows(df):
+    ids, documents, metadatas = chunk_rows(df["combined_text"].astype(str).tolist(), chroma_metadatas(df))
+    return {"documents": documents, "metadatas": metadatas, "ids": ids}
+
+
+def sync_collection(collection, df, metadata_store_path=None, *, refresh_indexes=True):
+    """Make ``collection`` hold exactly the chunked rows of ``df`` (with ``combined_text``).
+
+    Chroma gets the filter fields only; every column goes to the
+    collection's metadata store (see ``metadata_store``), written under
+    ``metadata_store_path`` when given. With ``refresh_indexes`` the local
+    and BM25 indexes built from the collection are rebuilt if they no longer
+    match it.
+    """
+    if not _fully_ingested(collection):
+        parent_ids = [content_id(text) for text in df["combined_text"].astype(str)]
+        write_metadata_store(collection.name, parent_ids, df, metadata_store_path)
+    _populate_collection(collection, **_sample_rows(df))
+    if refresh_indexes:
+        # Imported here: retrievers is built on this module.
+        from retrievers import refresh_indexes as refresh_derived_indexes
+        refresh_derived_indexes(collection)
+    return collection
+
+
+def sync_sample_collections(collections, *, only_empty=False):
+    """Sync the collections with the startup sample from ``datasets``.
+
+    With ``only_empty`` the sample is read only when a collection has no
+    documents yet, so restarting with an existing store needs no network.
+    """
+    medical_qna, medical_devices = collections
+    if only_empty and medical_qna.count() and medical_devices.count():
+        return collections
+
+    df_qa, df_medical_device = load_samples()
+    if not (only_empty and medical_qna.count()):
+        sync_collection(medical_qna, df_qa)
+    if not (only_empty and medical_devices.count()):
+        sync_collection(medical_devices, df_medical_device)
+    return collections
+
+
+def _open_collections():
     client = _init_client()
-    try:
-        medical_qna = _populate_collection(
-            client.get_or_create_collection(name="medical_q_n_a"),
-            documents=QA_DOCS,
-            metadatas=QA_METAS,
-            ids=QA_IDS,
-        )
+    embedding_function = make_embedding_function()
+    return (
+        client.get_or_create_collection(name=QA_COLLECTION, embedding_function=embedding_function),
+        client.get_or_create_collection(name=DEVICE_COLLECTION, embedding_function=embedding_function),
+    )
 
-        medical_devices = _populate_collection(
-            client.get_or_create_collection(name="medical_device_manual"),
-            documents=DEVICE_DOCS,
-            metadatas=DEVICE_METAS,
-            ids=DEVICE_IDS,
-        )
-        return medical_qna, medical_devices
+
+def _build_collections():
+    try:
+        return sync_sample_collections(_open_collections(), only_empty=not SYNC_ON_STARTUP)
     except InvalidArgumentError as exc:
         # Any compaction/log-store error means the DB files are corrupt – rebuild once.
         if "Failed to pull logs" not in str(exc):
             raise
         _reset_chroma_path()
-        client = _init_client()
-        medical_qna = _populate_collection(
-            client.get_or_create_collection(name="medical_q_n_a"),
-            documents=QA_DOCS,
-            metadatas=QA_METAS,
-            ids=QA_IDS,
-        )
-        medical_devices = _populate_collection(
-            client.get_or_create_collection(name="medical_device_manual"),
-            documents=DEVICE_DOCS,
-            metadatas=DEVICE_METAS,
-            ids=DEVICE_IDS,
-        )
-        return medical_qna, medical_devices
+        return sync_sample_collections(_open_collections(), only_empty=not SYNC_ON_STARTUP)
+
+
+_collections = None
+_collections_lock = threading.Lock()
+
+
+def get_collections():
+    """Return ``(medical Q&A, medical device)`` collections, opened on first use.
+
+    Empty collections are seeded from the 500-row sample. A changed dataset
+    is not applied to a non-empty store at startup unless
+    ``CHROMA_SYNC_ON_STARTUP`` is set; ``python chromaDB.py`` re-syncs it,
+    rewriting the metadata store and rebuilding stale local and BM25
+    indexes as a complete ``ingest.py`` run does.
+    """
+    global _collections
+    with _collections_lock:
+        if _collections is None:
+            _collections = _build_collections()
+        return _collections
 
 
-collection1, collection2 = _build_collections()
+def get_qa_collection():
+    return get_collections()[0]
+
+
+def get_device_collection():
+    return get_collections()[1]
+
+
+def __getattr__(name):
+    # ``from chromaDB import collection1`` still works, but opens the store only then.
+    if name == "collection1":
+        return get_qa_collection()
+    if name == "collection2":
+        return get_device_collection()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
+    from datasets import DATASETS, refresh_snapshot
+    from embeddings import get_embedding_service
+
+    # An explicit sync asks the sources whether they changed.
+    for name in DATASETS:
+        refresh_snapshot(name, check=True)
+
+    collection1, collection2 = sync_sample_collections(get_collections())
+    embed = get_embedding_service().embed
+
     sample_q = "What are the treatments for Kawasaki disease ?"
-    print(collection1.query(query_texts=[sample_q], n_results=3))
+    print(collection1.query(query_embeddings=[embed(sample_q)], n_results=3))
 
     sample_device_query = "Which devices are suitable for neonatal patients?"
-    print(collection2.query(query_texts=[sample_device_query], n_results=5))
+    print(collection2.query(query_embeddings=[embed(sample_device_query)], n_results=5))
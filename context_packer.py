@@ -0,0 +1,161 @@
+"""Fit retrieved documents into a token budget before they reach the LLM.
+
+``pack_context`` drops near-duplicate sentences and, when the documents
+are still over ``CONTEXT_TOKEN_BUDGET``, keeps each document's first
+sentence (its question or device name) plus the sentences that best match
+the query (IDF-weighted term overlap), in their original order. Tokens are
+counted with tiktoken when it is installed and its encoding is available,
+and estimated from word pieces otherwise.
+"""
+
+import math
+import os
+import re
+import threading
+
+from dotenv import load_dotenv
+
+from lexical_index import tokenize
+
+try:
+    import tiktoken
+except ImportError:  # token counts are estimated without it
+    tiktoken = None
+
+load_dotenv()
+
+CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "true").lower() == "true"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "600"))
+# Sentences whose word sets overlap at least this much (Jaccard) with a kept one are dropped.
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+CONTEXT_TOKENIZER_ENCODING = os.getenv("CONTEXT_TOKENIZER_ENCODING", "o200k_base")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD_PIECE = re.compile(r"\w+|[^\w\s]")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    with _encoding_lock:
+        if _encoding is None and not _encoding_failed and tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(CONTEXT_TOKENIZER_ENCODING)
+            except Exception as e:  # the encoding file is downloaded on first use
+                print(f"---TIKTOKEN UNAVAILABLE ({e.__class__.__name__}), ESTIMATING TOKENS---")
+                _encoding_failed = True
+        return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in ``text`` for the LLM's encoding (estimated without tiktoken)."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(math.ceil(len(piece) / 4) for piece in _WORD_PIECE.findall(text))
+
+
+def _sentences(document):
+    return [sentence.strip() for sentence in _SENTENCE_END.split(document or "") if sentence.strip()]
+
+
+def _near_duplicate(words, kept_word_sets, threshold):
+    for kept in kept_word_sets:
+        union = len(words | kept)
+        if union and len(words & kept) / union >= threshold:
+            return True
+    return False
+
+
+def pack_context(query: str, documents, *, budget: int = CONTEXT_TOKEN_BUDGET,
+                 dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD) -> dict:
+    """Pack ``documents`` into at most ``budget`` tokens of context for ``query``.
+
+    Returns ``context`` (documents separated by newlines, as before) along
+    with ``original_tokens``, ``packed_tokens`` and ``saved_tokens``.
+    """
+    original = "\n".join(documents)
+    original_tokens = count_tokens(original)
+
+    # (document number, sentence, word set, tokens), without near-duplicates.
+    sentences = []
+    leads = []
+    kept_word_sets = []
+    for number, document in enumerate(documents):
+        for index, sentence in enumerate(_sentences(document)):
+            words = set(tokenize(sentence))
+            if words and _near_duplicate(words, kept_word_sets, dedup_threshold):
+                continue
+            kept_word_sets.append(words)
+            if index == 0:
+                leads.append(len(sentences))
+            sentences.append((number, sentence, words, count_tokens(sentence)))
+
+    selected = range(len(sentences))
+    if sum(tokens for *_, tokens in sentences) > budget:
+        # Query terms weighted by how rare they are among these sentences.
+        query_terms = set(tokenize(query))
+        document_frequency = {
+            term: sum(term in words for _, _, words, _ in sentences) for term in query_terms
+        }
+        idf = {term: math.log(1 + len(sentences) / (1 + df)) for term, df in document_frequency.items()}
+
+        def score(position):
+            _, _, words, tokens = sentences[position]
+            return sum(idf[term] for term in query_terms & words) / math.sqrt(tokens)
+
+        chosen, used = set(), 0
+        ranked = sorted((p for p in range(len(sentences)) if p not in leads), key=score, reverse=True)
+        for position in leads + ranked:
+            tokens = sentences[position][3]
+            if used + tokens <= budget:
+                chosen.add(position)
+                used += tokens
+        selected = sorted(chosen)
+
+    parts = {}
+    for position in selected:
+        number, sentence, _, _ = sentences[position]
+        parts.setdefault(number, []).append(sentence)
+    context = "\n".join(" ".join(part) for _, part in sorted(parts.items()))
+    packed_tokens = count_tokens(context)
+    return {
+        "context": context,
+        "original_tokens": original_tokens,
+        "packed_tokens": packed_tokens,
+        "saved_tokens": max(original_tokens - packed_tokens, 0),
+    }
+
+
+class PackingMetrics:
+    """Running totals of prompt tokens saved by context packing."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.original_tokens = 0
+        self.packed_tokens = 0
+
+    def record(self, packed):
+        with self._lock:
+            self.requests += 1
+            self.original_tokens += packed["original_tokens"]
+            self.packed_tokens += packed["packed_tokens"]
+
+    def snapshot(self):
+        with self._lock:
+            saved = self.original_tokens - self.packed_tokens
+            return {
+                "requests": self.requests,
+                "original_tokens": self.original_tokens,
+                "packed_tokens": self.packed_tokens,
+                "saved_tokens": saved,
+                "avg_saved_tokens": saved / self.requests if self.requests else 0.0,
+                "saved_ratio": saved / self.original_tokens if self.original_tokens else 0.0,
+            }
+
+
+packing_metrics = PackingMetrics()
@@ -1,43 +1,154 @@
-import pandas as pd
-import numpy as np
+import hashlib
 import json
-import re
-from typing import List, Dict, Any, Tuple
-from openai import OpenAI
+import os
+from pathlib import Path
+import threading
 import time
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-import seaborn as sns
 
-df = pd.read_csv("hf://datasets/keivalya/MedQuad-MedicalQnADataset/medDataset_processed.csv")
+import fsspec
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from fsspec.implementations.local import LocalFileSystem
+from fsspec.utils import get_protocol
+from pyarrow import feather
+
+QA_SOURCE = os.getenv("QA_SOURCE", "hf://datasets/keivalya/MedQuad-MedicalQnADataset/medDataset_processed.csv")
+DEVICE_SOURCE = os.getenv("DEVICE_SOURCE", str(Path(__file__).parent / "medical_device_manuals_dataset.csv"))
+# Rows sampled from each dataset for the collections built at startup;
+# ingest.py indexes the full datasets.
+SAMPLE_SIZE = 500
+# Local Arrow snapshots of the datasets, combined_text included.
+SNAPSHOT_DIR = Path(os.getenv("DATASET_SNAPSHOT_DIR", Path(__file__).parent / "dataset_snapshots"))
+# How long a remote source's checksum check is trusted before the next one; local files are hashed every time.
+SNAPSHOT_CHECK_INTERVAL_SECONDS = float(os.getenv("DATASET_CHECK_INTERVAL_SECONDS", "86400"))
+
+
+def build_qa_text(df_qa):
+    """combined_text for Medical Q&A rows (works on any chunk of the CSV)."""
+    return (
+        "Question: " + df_qa['Question'].fillna('Unknown').astype(str) + ". " +
+        "Answer: " + df_qa['Answer'].fillna('Unknown').astype(str) + ". " +
+        "Type: " + df_qa['qtype'].fillna('Unknown').astype(str) + ". "
+    )
+
+
+def build_device_text(df_medical_device):
+    """combined_text for device manual rows (works on any chunk of the CSV)."""
+    return (
+        "Device Name: " + df_medical_device['Device_Name'].fillna('Unknown').astype(str) + ". " +
+        "Model: " + df_medical_device['Model_Number'].fillna('Unknown').astype(str) + ". " +
+        "Manufacturer: " + df_medical_device['Manufacturer'].fillna('Unknown').astype(str) + ". " +
+        "Indications: " + df_medical_device['Indications_for_Use'].fillna('Unknown').astype(str) + ". " +
+        "Contraindications: " + df_medical_device['Contraindications'].fillna('None').astype(str)
+    )
+
+
+DATASETS = {
+    "qa": (QA_SOURCE, build_qa_text),
+    "device": (DEVICE_SOURCE, build_device_text),
+}
+
+
+def source_checksum(source: str) -> str:
+    """Checksum of the current version of ``source`` (local path or fsspec URL).
+
+    Local files are hashed; for remote files the store's own file info
+    (blob id / ETag) is used, so nothing is downloaded.
+    """
+    fs, path = fsspec.core.url_to_fs(source)
+    if not isinstance(fs, LocalFileSystem):
+        return str(fs.checksum(path))
+    digest = hashlib.sha256()
+    with open(path, "rb") as source_file:
+        for block in iter(lambda: source_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _check_due(source, stored, check) -> bool:
+    """Whether the source's checksum must be fetched before using the snapshot."""
+    if stored is None or check or get_protocol(source) in ("file", "local"):
+        return True
+    return time.time() - stored.get("checked_at", 0) >= SNAPSHOT_CHECK_INTERVAL_SECONDS
+
+
+def refresh_snapshot(name: str, *, check: bool = False) -> Path:
+    """Return the snapshot of dataset ``name``, rebuilding it if the source changed.
+
+    A remote source is asked for its checksum at most once per
+    ``SNAPSHOT_CHECK_INTERVAL_SECONDS``, or whenever ``check`` is set;
+    in between, the snapshot is used without a network round trip. When
+    the source cannot be reached (e.g. offline) an existing snapshot is used
+    as it is.
+    """
+    source, build_text = DATASETS[name]
+    data_path = SNAPSHOT_DIR / f"{name}.arrow"
+    info_path = SNAPSHOT_DIR / f"{name}.json"
+    stored = json.loads(info_path.read_text()) if info_path.exists() and data_path.exists() else None
+    if stored is not None and stored["source"] != source:
+        stored = None
+    if not _check_due(source, stored, check):
+        return data_path
+
+    try:
+        checksum = source_checksum(source)
+    except Exception as exc:
+        if stored is None:
+            raise
+        print(f"---DATASET {name}: source unreachable ({exc}), using snapshot---")
+        return data_path
+    if stored is not None and stored["checksum"] == checksum:
+        info_path.write_text(json.dumps(dict(stored, checked_at=time.time())))
+        return data_path
+
+    df = pd.read_csv(source)
+    df["combined_text"] = build_text(df)
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = data_path.with_suffix(f".{os.getpid()}.tmp")
+    # Uncompressed Arrow IPC can be memory-mapped without decoding.
+    feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), tmp_path, compression="uncompressed")
+    tmp_path.replace(data_path)
+    info_path.write_text(json.dumps({
+        "source": source, "checksum": checksum, "rows": len(df), "checked_at": time.time(),
+    }))
+    print(f"---DATASET {name}: snapshot rebuilt ({len(df)} rows)---")
+    return data_path
 
-## Data 1: reading the Comprehensive Medical Q&A Dataset
 
-## Data has 16407 rows, hence we will sample 500 rows for experimentation
-df_qa = df.sample(500, random_state=0).reset_index(drop=True)
-print(df_qa.shape)
+def read_snapshot(name: str, columns=None) -> pa.Table:
+    """Memory-mapped, zero-copy view of the snapshot, limited to ``columns`` if given."""
+    return feather.read_table(refresh_snapshot(name), columns=columns, memory_map=True)
 
 
-df_medical_device = pd.read_csv("medical_device_manuals_dataset.csv")
-print(df_medical_device.shape)
-## Data has 2694 rows, hence we will sample 500 rows for experimentation
-df_medical_device = df_medical_device.sample(500, random_state=0).reset_index(drop=True)
-print(df_medical_device.shape)
+def _sample(name):
+    table = read_snapshot(name)
+    # Same rows as DataFrame.sample(SAMPLE_SIZE, random_state=0), but only
+    # these rows are copied out of the memory map.
+    indices = np.random.RandomState(0).choice(table.num_rows, SAMPLE_SIZE, replace=False)
+    df = table.take(indices).to_pandas()
+    # Chroma metadata accepts NaN but not None for missing values.
+    return df.where(df.notna(), np.nan)
 
 
-# Preparing the Dataframe for Vector DB by combining the Text
-df_qa['combined_text'] = (
-    "Question: " + df_qa['Question'].astype(str) + ". " +
-    "Answer: " + df_qa['Answer'].astype(str) + ". " +
-    "Type: " + df_qa['qtype'].astype(str) + ". "
-)
+_samples = None
+_samples_lock = threading.Lock()
 
 
+def load_samples():
+    """Return ``(df_qa, df_medical_device)``, read and sampled on first call.
 
-# Preparing the Dataframe for Vector DB by combining the Text
-df_medical_device['combined_text'] = (
-    "Device Name: " + df_medical_device['Device_Name'].astype(str) + ". " +
-    "Model: " + df_medical_device['Model_Number'].astype(str) + ". " +
-    "Manufacturer: " + df_medical_device['Manufacturer'].astype(str) + ". " +
-    "Indications: " + df_medical_device['Indications_for_Use'].astype(str) + ". " +
-    "Contraindications: " + df_medical_device['Contraindications'].fillna('None').astype(str)
-)
+    Both come from the local snapshots; the Q&A CSV is only downloaded when
+    there is no snapshot yet or the source has changed.
+    """
+    global _samples
+    with _samples_lock:
+        if _samples is None:
+            ## Data 1: Comprehensive Medical Q&A Dataset (16407 rows, 500 sampled)
+            df_qa = _sample("qa")
+            print(df_qa.shape)
+            ## Data 2: Medical Device Manuals (2694 rows, 500 sampled)
+            df_medical_device = _sample("device")
+            print(df_medical_device.shape)
+            _samples = df_qa, df_medical_device
+        return _samples
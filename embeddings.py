@@ -0,0 +1,110 @@
+from collections import OrderedDict
+import importlib
+import os
+import threading
+
+from chromadb.utils import embedding_functions
+from dotenv import load_dotenv
+
+from singleflight import SingleFlight
+
+load_dotenv()
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+# "module:Class" of a Chroma embedding function to use instead of the default
+# model, e.g. benchmarks.offline:HashEmbeddingFunction for offline benchmarks.
+EMBEDDING_FUNCTION = os.getenv("EMBEDDING_FUNCTION", "")
+
+
+def make_embedding_function():
+    """A new instance of the configured embedding function (Chroma's default model if unset)."""
+    if not EMBEDDING_FUNCTION:
+        return embedding_functions.DefaultEmbeddingFunction()
+    module_name, _, class_name = EMBEDDING_FUNCTION.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class EmbeddingService:
+    """Text embeddings from the configured model, behind an LRU cache.
+
+    The model is the one the collections use for their documents, so the
+    vectors can be passed as ``query_embeddings`` to them. Concurrent requests for the same uncached
+    text are embedded once.
+    """
+
+    def __init__(self, embedding_function=None, *, cache_size: int = EMBEDDING_CACHE_SIZE):
+        self._embedding_function = embedding_function
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, text: str) -> list:
+        """Return the embedding of ``text`` as a list of floats."""
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                return vector
+            self.misses += 1
+        return self._flight.do(text, self._compute, text)
+
+    def embed_many(self, texts) -> list:
+        """Embeddings of ``texts``, with every uncached text embedded in one model call."""
+        vectors = {}
+        with self._lock:
+            for text in texts:
+                vector = self._cache.get(text)
+                if vector is not None:
+                    self._cache.move_to_end(text)
+                    self.hits += 1
+                    vectors[text] = vector
+            missing = [text for text in dict.fromkeys(texts) if text not in vectors]
+            self.misses += len(missing)
+        if missing:
+            for text, vector in zip(missing, self._model()(missing)):
+                vectors[text] = self._store(text, [float(value) for value in vector])
+        return [vectors[text] for text in texts]
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses, entries = self.hits, self.misses, len(self._cache)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def _model(self):
+        if self._embedding_function is None:
+            self._embedding_function = make_embedding_function()
+        return self._embedding_function
+
+    def _compute(self, text):
+        return self._store(text, [float(value) for value in self._model()([text])[0]])
+
+    def _store(self, text, vector):
+        with self._lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return vector
+
+
+_embedding_service = None
+_embedding_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Return the shared embedding service, creating it on first use."""
+    global _embedding_service
+    with _embedding_service_lock:
+        if _embedding_service is None:
+            _embedding_service = EmbeddingService()
+        return _embedding_service
@@ -0,0 +1,123 @@
+"""One LLM call that judges the context's relevance and answers from it.
+
+In fused mode the relevance checker no longer asks only "Yes or No". It
+sends one prompt with the context, and the model replies with a JSON object
+(structured output) holding the verdict and, when the context is relevant,
+the answer. The context then reaches the LLM once instead of twice, and the
+separate generate call is gone. A "No" verdict still sends the request to
+web search.
+
+The verdict comes first in the reply, so the answer can be streamed to the
+client while the JSON is still arriving.
+"""
+
+import json
+import os
+import re
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Default for requests that do not set "fused" themselves.
+FUSED_GENERATION = os.getenv("FUSED_GENERATION", "false").lower() == "true"
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "relevance_and_answer",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "relevant": {"type": "string", "enum": ["Yes", "No"]},
+                "answer": {"type": "string"},
+            },
+            "required": ["relevant", "answer"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+_ANSWER_START = re.compile(r'"relevant"\s*:\s*"(Yes|No)".*?"answer"\s*:\s*"', re.S)
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+
+def fused_prompt(query, context):
+    return f"""
+            Check if the context below is relevant to the user query. If it is,
+            answer the query using the context, in at most 50 words.
+            ####
+            Context:
+            {context}
+            ####
+            User Query: {query}
+
+            Reply with a JSON object:
+            - "relevant": "Yes" if the context is relevant, "No" if it is not.
+            - "answer": the answer if the context is relevant, "" if it is not.
+
+            """
+
+
+def parse_reply(text: str):
+    """``(verdict, answer)`` from a fused reply, or ``None`` when it is not valid."""
+    try:
+        reply = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(reply, dict) or reply.get("relevant") not in ("Yes", "No"):
+        return None
+    return reply["relevant"], str(reply.get("answer") or "")
+
+
+class AnswerStreamer:
+    """Pass the ``answer`` string of a fused reply to ``on_token`` as its JSON streams in.
+
+    Used as the ``on_token`` of the LLM call. Nothing is passed on until the
+    verdict has arrived as "Yes". ``streamed`` tells whether anything was.
+    """
+
+    def __init__(self, on_token):
+        self.on_token = on_token
+        self.streamed = False
+        self._text = ""
+        self._position = None
+        self._done = False
+
+    def __call__(self, delta: str):
+        self._text += delta
+        if self._done:
+            return
+        if self._position is None:
+            match = _ANSWER_START.search(self._text)
+            if match is None:
+                return
+            if match.group(1) != "Yes":
+                self._done = True
+                return
+            self._position = match.end()
+
+        text, i, out = self._text, self._position, []
+        while i < len(text):
+            char = text[i]
+            if char == '"':
+                self._done = True
+                break
+            if char == "\\":
+                # Wait for the rest of an escape sequence split across deltas.
+                if i + 1 >= len(text) or (text[i + 1] == "u" and i + 6 > len(text)):
+                    break
+                if text[i + 1] == "u":
+                    out.append(chr(int(text[i + 2:i + 6], 16)))
+                    i += 6
+                else:
+                    out.append(_ESCAPES.get(text[i + 1], text[i + 1]))
+                    i += 2
+                continue
+            out.append(char)
+            i += 1
+        self._position = i
+        if out:
+            self.streamed = True
+            self.on_token("".join(out))
@@ -0,0 +1,238 @@
+"""Index the full datasets into Chroma.
+
+    python ingest.py                      # both datasets, one worker per core
+    python ingest.py --dataset qa --workers 4
+    python ingest.py --restart            # ignore the resume checkpoint
+    python ingest.py --bench-workers 1 2 4 8   # embedding docs/sec per core count
+
+The CSVs are read in chunks and ``combined_text`` is built per chunk. Each
+row is split into overlapping text chunks (see ``chromaDB.chunk_document``).
+Text chunks already stored (same id) are skipped. The rest are embedded in a
+process pool and upserted in bounded batches. After every chunk is written,
+the checkpoint file records progress, so an interrupted run resumes at the
+next chunk.
+
+Chroma's metadata gets only the filter fields. A complete pass also writes
+the dataset's columns to the collection's metadata store (see
+``metadata_store``).
+"""
+
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+from pathlib import Path
+import time
+
+import chromadb
+import numpy as np
+import pandas as pd
+
+from chromaDB import (
+    DB_PATH,
+    DEVICE_COLLECTION,
+    CHUNK_LAYOUT,
+    FULL_INGEST_MARKER,
+    INGEST_BATCH_SIZE,
+    QA_COLLECTION,
+    chunk_rows,
+    content_id,
+)
+from datasets import DEVICE_SOURCE, QA_SOURCE, build_device_text, build_qa_text, read_snapshot
+from embeddings import make_embedding_function
+from metadata_store import MetadataStoreWriter, chroma_metadatas
+from retrievers import refresh_indexes
+
+CHECKPOINT_PATH = Path(os.getenv("INGEST_CHECKPOINT_PATH", Path(__file__).parent / "ingest_checkpoint.json"))
+
+DATASETS = {
+    "qa": {"source": QA_SOURCE, "collection": QA_COLLECTION, "build_text": build_qa_text},
+    "device": {"source": DEVICE_SOURCE, "collection": DEVICE_COLLECTION, "build_text": build_device_text},
+}
+
+_worker_embedding_function = None
+
+
+def _init_worker():
+    """Load the embedding model once per worker process."""
+    global _worker_embedding_function
+    _worker_embedding_function = make_embedding_function()
+    _worker_embedding_function(["warm up"])
+
+
+def _embed(texts):
+    return np.asarray(_worker_embedding_function(texts), dtype=np.float32)
+
+
+def iter_chunks(spec, chunk_size, limit=None):
+    """Yield CSV chunks with ``combined_text`` built, up to ``limit`` rows."""
+    rows = 0
+    for chunk in pd.read_csv(spec["source"], chunksize=chunk_size):
+        if limit is not None:
+            chunk = chunk.iloc[:limit - rows]
+        chunk = chunk.reset_index(drop=True)
+        chunk["combined_text"] = spec["build_text"](chunk)
+        yield chunk
+        rows += len(chunk)
+        if limit is not None and rows >= limit:
+            return
+
+
+def _load_checkpoint():
+    if CHECKPOINT_PATH.exists():
+        return json.loads(CHECKPOINT_PATH.read_text())
+    return {}
+
+
+def _save_checkpoint(checkpoint):
+    CHECKPOINT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = CHECKPOINT_PATH.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(checkpoint, indent=2))
+    tmp_path.replace(CHECKPOINT_PATH)
+
+
+def _chunked_rows(chunk):
+    """Ids, documents and metadatas of the text chunks of a CSV chunk's rows."""
+    rows = {}
+    for doc_id, document, metadata in zip(
+        *chunk_rows(chunk["combined_text"].astype(str).tolist(), chroma_metadatas(chunk))
+    ):
+        rows.setdefault(doc_id, (document, metadata))
+    return rows
+
+
+def _new_rows(rows, collection):
+    """Ids, documents and metadatas of the text chunks not stored yet."""
+    stored = set(collection.get(ids=list(rows), include=[])["ids"])
+    ids = [doc_id for doc_id in rows if doc_id not in stored]
+    return ids, [rows[doc_id][0] for doc_id in ids], [rows[doc_id][1] for doc_id in ids]
+
+
+def ingest(name, *, workers, chunk_size, batch_size=INGEST_BATCH_SIZE, limit=None, restart=False):
+    """Index one dataset; returns the number of text chunks embedded."""
+    spec = DATASETS[name]
+    client = chromadb.PersistentClient(path=str(DB_PATH))
+    collection = client.get_or_create_collection(name=spec["collection"])
+
+    checkpoint = _load_checkpoint()
+    settings = {"chunk_size": chunk_size, "limit": limit, "chunk_layout": CHUNK_LAYOUT}
+    progress = checkpoint.get(name)
+    if restart or progress is None or progress["settings"] != settings:
+        progress = {"settings": settings, "chunks_done": 0}
+    if progress["chunks_done"]:
+        print(f"{name}: resuming after chunk {progress['chunks_done']}")
+
+    seen_ids = set()
+    seen_parents = set()
+    metadata_store = MetadataStoreWriter(spec["collection"])
+    rows_read = 0
+    embedded = 0
+    started = time.perf_counter()
+
+    def write(pending_chunk):
+        nonlocal embedded
+        index, ids, documents, metadatas, future = pending_chunk
+        if future is not None:
+            embeddings = future.result()
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                collection.upsert(
+                    ids=ids[start:end],
+                    embeddings=embeddings[start:end].tolist(),
+                    documents=documents[start:end],
+                    metadatas=metadatas[start:end],
+                )
+            embedded += len(ids)
+        progress["chunks_done"] = index + 1
+        checkpoint[name] = progress
+        _save_checkpoint(checkpoint)
+        elapsed = time.perf_counter() - started
+        print(f"{name}: chunk {index + 1} | {rows_read} rows read | {embedded} embedded | "
+              f"{embedded / elapsed:.1f} docs/s")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = deque()
+        for index, chunk in enumerate(iter_chunks(spec, chunk_size, limit)):
+            rows_read += len(chunk)
+            rows = _chunked_rows(chunk)
+            seen_ids.update(rows)
+            seen_parents.update(metadata["parent_id"] for _, metadata in rows.values())
+            if limit is None:
+                metadata_store.add([content_id(text) for text in chunk["combined_text"].astype(str)], chunk)
+            if index < progress["chunks_done"]:
+                continue
+
+            ids, documents, metadatas = _new_rows(rows, collection)
+            future = pool.submit(_embed, documents) if documents else None
+            pending.append((index, ids, documents, metadatas, future))
+            # Bound the chunks held in memory while workers embed ahead of the writer.
+            while len(pending) >= 2 * workers:
+                write(pending.popleft())
+        while pending:
+            write(pending.popleft())
+
+    if limit is None:
+        # A complete pass knows every current id, so chunks gone from the source (or
+        # from an older chunk layout) can go.
+        stale_ids = [doc_id for doc_id in collection.get(include=[])["ids"] if doc_id not in seen_ids]
+        for start in range(0, len(stale_ids), batch_size):
+            collection.delete(ids=stale_ids[start:start + batch_size])
+        collection.modify(metadata={
+            "ingested_by": FULL_INGEST_MARKER, "rows": len(seen_parents), "chunks": len(seen_ids),
+            "chunk_layout": CHUNK_LAYOUT,
+        })
+        print(f"{name}: removed {len(stale_ids)} stale chunks, {collection.count()} stored")
+        metadata_store.close()
+        # Keep the in-process indexes in step with the collection they mirror.
+        refresh_indexes(collection, build_missing=True)
+
+    checkpoint.pop(name, None)
+    _save_checkpoint(checkpoint)
+    elapsed = time.perf_counter() - started
+    print(f"{name}: embedded {embedded} docs in {elapsed:.1f}s ({embedded / elapsed:.1f} docs/s)")
+    return embedded
+
+
+def bench_workers(worker_counts, docs, chunk_size):
+    """Embedding throughput (docs/sec) of the process pool per worker count."""
+    texts = read_snapshot("qa", columns=["combined_text"]).slice(0, docs).column("combined_text").to_pylist()
+    batches = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+    results = {}
+    for workers in worker_counts:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            # Start every worker (and load its model) before timing.
+            list(pool.map(_embed, [["warm up"]] * workers))
+            started = time.perf_counter()
+            list(pool.map(_embed, batches))
+            elapsed = time.perf_counter() - started
+        results[workers] = len(texts) / elapsed
+        print(f"{workers} workers: {results[workers]:.1f} docs/s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index the full datasets into Chroma.")
+    parser.add_argument("--dataset", choices=["qa", "device", "all"], default="all")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=512, help="CSV rows per chunk / embedding task")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="ids per Chroma upsert")
+    parser.add_argument("--limit", type=int, help="index only the first N rows (no stale-row cleanup or metadata store)")
+    parser.add_argument("--restart", action="store_true", help="ignore the resume checkpoint")
+    parser.add_argument("--bench-workers", type=int, nargs="+", help="measure docs/sec per worker count and exit")
+    parser.add_argument("--bench-docs", type=int, default=2048)
+    args = parser.parse_args()
+
+    if args.bench_workers:
+        bench_workers(args.bench_workers, args.bench_docs, args.chunk_size)
+    else:
+        names = list(DATASETS) if args.dataset == "all" else [args.dataset]
+        for name in names:
+            ingest(
+                name,
+                workers=args.workers,
+                chunk_size=args.chunk_size,
+                batch_size=args.batch_size,
+                limit=args.limit,
+                restart=args.restart,
+            )
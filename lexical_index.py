@@ -0,0 +1,131 @@
+"""BM25 inverted index over ``combined_text``, persisted as memory-mapped arrays.
+
+Postings are stored in CSR form (``offsets``/``docs``) together with each
+posting's precomputed BM25 weight, so a query only gathers the postings of
+its terms and sums them per document with ``np.bincount``.
+"""
+
+import hashlib
+import json
+import math
+import os
+from pathlib import Path
+import re
+import shutil
+from collections import Counter
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LEXICAL_INDEX_DIR = Path(os.getenv("LEXICAL_INDEX_DIR", Path(__file__).parent / "lexical_index"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Keeps identifiers such as "MDR-847127" or "2023-05-C" whole; their parts are indexed too.
+_TOKEN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+def ids_fingerprint(ids) -> str:
+    """Hash of a set of document ids. Ids are content hashes, so it changes with any edit."""
+    digest = hashlib.sha256()
+    for doc_id in sorted(ids):
+        digest.update(doc_id.encode("utf-8") + b"\n")
+    return digest.hexdigest()
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        tokens.append(token)
+        if "-" in token:
+            tokens.extend(token.split("-"))
+    return tokens
+
+
+class BM25Index:
+    """Read-only BM25 index over the files written by :func:`build_bm25_index`."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.info = json.loads((self.path / "index.json").read_text())
+        self.vocabulary = json.loads((self.path / "vocabulary.json").read_text())
+        self.ids = json.loads((self.path / "ids.json").read_text())
+        self._offsets = np.load(self.path / "offsets.npy", mmap_mode="r")
+        self._docs = np.load(self.path / "docs.npy", mmap_mode="r")
+        self._weights = np.load(self.path / "weights.npy", mmap_mode="r")
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    def search(self, query: str, n_results: int = 20, *, ids=None) -> list:
+        """Return ``[(id, score), ...]`` of the best BM25 matches, best first.
+
+        ``ids``, if given, limits the matches to those documents.
+        """
+        term_ids = {self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary}
+        if not term_ids:
+            return []
+        spans = [(self._offsets[t], self._offsets[t + 1]) for t in term_ids]
+        docs = np.concatenate([self._docs[start:end] for start, end in spans])
+        weights = np.concatenate([self._weights[start:end] for start, end in spans])
+        scores = np.bincount(docs, weights=weights, minlength=len(self.ids))
+        if ids is not None:
+            allowed = np.zeros(len(self.ids), dtype=bool)
+            allowed[[self._positions[doc_id] for doc_id in ids if doc_id in self._positions]] = True
+            scores[~allowed] = 0.0
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        n_results = min(n_results, len(matched))
+        best = matched[np.argpartition(-scores[matched], n_results - 1)[:n_results]]
+        best = best[np.argsort(-scores[best])]
+        return [(self.ids[i], float(scores[i])) for i in best]
+
+    def count(self) -> int:
+        return len(self.ids)
+
+
+def build_bm25_index(ids, documents, path: Path, *, k1: float = BM25_K1, b: float = BM25_B) -> Path:
+    """Build and write the BM25 index of ``documents`` (parallel to ``ids``)."""
+    path = Path(path)
+    term_counts = [Counter(tokenize(document or "")) for document in documents]
+    lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float32)
+    avg_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    postings = {}
+    for doc, counts in enumerate(term_counts):
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc, tf))
+
+    vocabulary = {}
+    offsets = [0]
+    docs = []
+    weights = []
+    n_docs = len(ids)
+    for term, term_postings in postings.items():
+        vocabulary[term] = len(vocabulary)
+        idf = math.log(1 + (n_docs - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+        for doc, tf in term_postings:
+            norm = k1 * (1 - b + b * lengths[doc] / avg_length)
+            docs.append(doc)
+            weights.append(idf * tf * (k1 + 1) / (tf + norm))
+        offsets.append(len(docs))
+
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+    np.save(tmp_path / "offsets.npy", np.asarray(offsets, dtype=np.int64))
+    np.save(tmp_path / "docs.npy", np.asarray(docs, dtype=np.int32))
+    np.save(tmp_path / "weights.npy", np.asarray(weights, dtype=np.float32))
+    (tmp_path / "vocabulary.json").write_text(json.dumps(vocabulary))
+    (tmp_path / "ids.json").write_text(json.dumps(list(ids)))
+    (tmp_path / "index.json").write_text(json.dumps({
+        "count": n_docs, "terms": len(vocabulary), "postings": len(docs), "k1": k1, "b": b,
+        "fingerprint": ids_fingerprint(ids),
+    }))
+
+    shutil.rmtree(path, ignore_errors=True)
+    tmp_path.rename(path)
+    print(f"BM25 index with {n_docs} documents and {len(vocabulary)} terms written to {path}")
+    return path
@@ -0,0 +1,265 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+import httpx
+import openai
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, OpenAI
+
+from context_packer import count_tokens
+from llm_scheduler import LLM_COMPLETION_TOKENS_ESTIMATE, LLMScheduler, get_llm_scheduler
+import telemetry
+
+load_dotenv()
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-5-nano")
+# Set to a local OpenAI-compatible server (e.g. http://127.0.0.1:8001/v1) to test without OpenAI.
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", "0.5"))
+LLM_POOL_CONNECTIONS = int(os.getenv("LLM_POOL_CONNECTIONS", "32"))
+
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class LLMClient:
+    """Process-wide chat-completion client with pooled keep-alive connections.
+
+    The sync and async OpenAI clients each own one httpx connection pool, so
+    TCP and TLS sessions are reused across calls. An async pool only works on
+    the event loop that opened its connections, so there is one async client
+    per running loop; clients of loops that have closed are dropped. Every attempt waits for a
+    slot from the :class:`~llm_scheduler.LLMScheduler`, at the priority of
+    its ``kind``, and is bounded by a timeout. Attempts are retried with
+    exponential backoff and jitter on connection errors, rate limits and
+    5xx responses; a rate limit also throttles the scheduler.
+    """
+
+    def __init__(
+        self,
+        *,
+        api_key=None,
+        base_url=OPENAI_BASE_URL,
+        model: str = LLM_MODEL,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff: float = LLM_BACKOFF_SECONDS,
+        scheduler: LLMScheduler = None,
+        pool_connections: int = LLM_POOL_CONNECTIONS,
+    ):
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        limits = httpx.Limits(
+            max_connections=pool_connections,
+            max_keepalive_connections=pool_connections,
+        )
+        # A local stub server does not check the key.
+        api_key = api_key or os.getenv("OPEN_AI_KEY") or ("local" if base_url else None)
+        # Retries are handled here so they share the backoff policy and the concurrency slot.
+        self._client = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            http_client=httpx.Client(limits=limits, timeout=timeout),
+        )
+        self._async_options = {"api_key": api_key, "base_url": base_url, "limits": limits}
+        self._async_clients = {}
+        self._async_clients_lock = threading.Lock()
+        self.scheduler = scheduler if scheduler is not None else get_llm_scheduler()
+
+    def complete(self, prompt: str, *, on_token=None, timeout=None, kind: str = "generate",
+                 response_format=None) -> str:
+        """Return the completion for ``prompt``, streaming deltas to ``on_token`` if given.
+
+        ``kind`` (``generate``, ``router`` or ``relevance``) sets the call's
+        priority in the scheduler, which raises
+        :class:`~llm_scheduler.LLMOverloaded` when it cannot take the call.
+        ``response_format`` is passed to the API, e.g. a JSON schema for
+        structured output.
+        """
+        tokens = self._estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            emitted = []
+            try:
+                with self.scheduler.slot(kind, tokens) as slot:
+                    return self._timed(slot, self._create, prompt, on_token, emitted, timeout, response_format)
+            except RETRYABLE_ERRORS as e:
+                self._throttle(e)
+                # A partially streamed answer cannot be taken back, so it is not retried.
+                if attempt >= self.max_retries or emitted:
+                    raise
+            time.sleep(self._backoff_delay(attempt))
+            attempt += 1
+
+    async def acomplete(self, prompt: str, *, on_token=None, timeout=None, kind: str = "generate",
+                        response_format=None) -> str:
+        """Async variant of :meth:`complete`."""
+        tokens = self._estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            emitted = []
+            try:
+                async with self.scheduler.aslot(kind, tokens) as slot:
+                    return await self._atimed(
+                        slot, self._acreate, prompt, on_token, emitted, timeout, response_format
+                    )
+            except RETRYABLE_ERRORS as e:
+                self._throttle(e)
+                if attempt >= self.max_retries or emitted:
+                    raise
+            await asyncio.sleep(self._backoff_delay(attempt))
+            attempt += 1
+
+    def close(self):
+        self._client.close()
+
+    async def aclose(self):
+        """Close the async client of the running loop."""
+        with self._async_clients_lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    async def _async_client(self) -> AsyncOpenAI:
+        """The async client of the running loop, created on its first call there."""
+        loop = asyncio.get_running_loop()
+        with self._async_clients_lock:
+            client = self._async_clients.get(loop)
+            stale = [] if client is not None else [
+                self._async_clients.pop(other) for other in list(self._async_clients) if other.is_closed()
+            ]
+            if client is None:
+                options = self._async_options
+                client = self._async_clients[loop] = AsyncOpenAI(
+                    api_key=options["api_key"],
+                    base_url=options["base_url"],
+                    max_retries=0,
+                    http_client=httpx.AsyncClient(limits=options["limits"], timeout=self.timeout),
+                )
+        for old in stale:
+            try:
+                await old.close()
+            except Exception:
+                pass  # its connections died with their loop
+        return client
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    @staticmethod
+    def _estimate_tokens(prompt: str) -> int:
+        """Tokens charged to the scheduler's budget before the call reports its usage."""
+        return count_tokens(prompt) + LLM_COMPLETION_TOKENS_ESTIMATE
+
+    def _throttle(self, error):
+        """Slow the scheduler down when the API answered 429, for as long as it asked."""
+        if not isinstance(error, openai.RateLimitError):
+            return
+        retry_after = None
+        try:
+            retry_after = float(error.response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+        self.scheduler.throttle(retry_after)
+
+    @staticmethod
+    def _record(started, outcome, usage=None):
+        telemetry.record_llm_call(
+            time.perf_counter() - started,
+            outcome=outcome,
+            prompt_tokens=usage.prompt_tokens if usage else None,
+            completion_tokens=usage.completion_tokens if usage else None,
+        )
+
+    def _timed(self, slot, create, *args):
+        """Run one call attempt and record its latency and token usage."""
+        started = time.perf_counter()
+        try:
+            content, usage = create(*args)
+        except Exception:
+            self._record(started, "error")
+            raise
+        self._record(started, "ok", usage)
+        slot.used(usage.total_tokens if usage else None)
+        return content
+
+    async def _atimed(self, slot, acreate, *args):
+        started = time.perf_counter()
+        try:
+            content, usage = await acreate(*args)
+        except Exception:
+            self._record(started, "error")
+            raise
+        self._record(started, "ok", usage)
+        slot.used(usage.total_tokens if usage else None)
+        return content
+
+    def _request(self, prompt, on_token, timeout, response_format):
+        request = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": on_token is not None,
+            "timeout": timeout or self.timeout,
+        }
+        if response_format is not None:
+            request["response_format"] = response_format
+        if on_token is not None:
+            # The last streamed chunk then carries the token usage.
+            request["stream_options"] = {"include_usage": True}
+        return request
+
+    def _create(self, prompt, on_token, emitted, timeout, response_format):
+        """Return the completion text and its token usage (``None`` if not reported)."""
+        response = self._client.chat.completions.create(
+            **self._request(prompt, on_token, timeout, response_format)
+        )
+        if on_token is None:
+            return response.choices[0].message.content, response.usage
+        usage = None
+        for chunk in response:
+            usage = chunk.usage or usage
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if token:
+                emitted.append(token)
+                on_token(token)
+        return "".join(emitted), usage
+
+    async def _acreate(self, prompt, on_token, emitted, timeout, response_format):
+        client = await self._async_client()
+        response = await client.chat.completions.create(
+            **self._request(prompt, on_token, timeout, response_format)
+        )
+        if on_token is None:
+            return response.choices[0].message.content, response.usage
+        usage = None
+        async for chunk in response:
+            usage = chunk.usage or usage
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if token:
+                emitted.append(token)
+                on_token(token)
+        return "".join(emitted), usage
+
+
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Return the shared client, creating it on first use."""
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            _llm_client = LLMClient()
+        return _llm_client
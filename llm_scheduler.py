@@ -0,0 +1,336 @@
+"""Admission control and rate limiting shared by every LLM call.
+
+Calls wait in one priority queue for a slot. A slot is granted when the
+requests-per-minute and tokens-per-minute budgets (token buckets) allow it
+and fewer calls than the concurrency window are running. Generate calls
+are served before Router and Relevance_Checker calls, so requests already
+under way finish first when the API is the bottleneck.
+
+The queue is bounded: a call that finds it full, or that waits past its
+deadline, raises :class:`LLMOverloaded` with a suggested ``retry_after``,
+and the endpoints turn that into a 429. A rate-limit response from the API
+halves the concurrency window and holds every call back for its
+Retry-After. The window then grows again by about one slot per window of
+successful calls (additive increase, multiplicative decrease).
+"""
+
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+import telemetry
+
+load_dotenv()
+
+# OpenAI's limits for the account; 0 disables a budget. The defaults are gpt-5-nano's tier 1 limits.
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# Calls allowed to wait for a slot, and for how long, before failing fast.
+LLM_QUEUE_LIMIT = int(os.getenv("LLM_QUEUE_LIMIT", "64"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+# Completion tokens charged to the tokens-per-minute budget up front; corrected from the reported usage.
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "256"))
+
+# Lower runs first. Anything not listed gets the lowest priority.
+PRIORITIES = {"generate": 0, "router": 1, "relevance": 1}
+
+
+class LLMOverloaded(Exception):
+    """The LLM queue is full, or a call waited longer than its deadline."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """``per_minute`` units, refilled continuously; ``per_minute <= 0`` is unlimited.
+
+    The level may go negative when a call used more than it was charged,
+    which delays the next ones until the refill catches up.
+    """
+
+    def __init__(self, per_minute: float, now: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` (at most the capacity) is available."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        deficit = min(amount, self.capacity) - self.level
+        return deficit / self.rate if deficit > 0 else 0.0
+
+    def take(self, amount: float, now: float):
+        if self.rate > 0:
+            self._refill(now)
+            self.level -= amount
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class _Waiter:
+    def __init__(self, priority, seq, kind, tokens, enqueued, deadline, wake):
+        self.priority = priority
+        self.seq = seq
+        self.kind = kind
+        self.tokens = tokens
+        self.enqueued = enqueued
+        self.deadline = deadline
+        self.wake = wake
+        # When the waiter polls next unless woken; it is about to poll once enqueued.
+        self.next_poll = enqueued
+        self.granted = False
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Slot:
+    """A granted call. Mark it successful, with the tokens it really used, with :meth:`used`."""
+
+    def __init__(self, kind: str, tokens: int):
+        self.kind = kind
+        self.tokens = tokens
+        self.succeeded = False
+        self.actual_tokens = None
+
+    def used(self, tokens=None):
+        self.succeeded = True
+        self.actual_tokens = tokens
+
+
+class LLMScheduler:
+    """Priority queue and rate budgets in front of the LLM API (see the module docstring).
+
+    Sync callers (threads) and async callers (tasks on any event loop) share
+    the same queue and budgets.
+    """
+
+    def __init__(
+        self,
+        *,
+        requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        queue_limit: int = LLM_QUEUE_LIMIT,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self._clock = clock
+        now = clock()
+        self._requests = TokenBucket(requests_per_minute, now)
+        self._tokens = TokenBucket(tokens_per_minute, now)
+        self._lock = threading.Lock()
+        self._heap = []
+        self._seq = itertools.count()
+        self._queued = 0
+        self._running = 0
+        self._window = float(max_concurrency)
+        self._paused_until = now
+        self.granted = {}
+        self.rejected = {"queue_full": 0, "deadline": 0}
+        self.throttled = 0
+
+    @contextmanager
+    def slot(self, kind: str, tokens: int):
+        """Wait for a slot for a call of ``kind`` expected to use ``tokens`` tokens."""
+        event = threading.Event()
+        waiter = self._enqueue(kind, tokens, event.set)
+        try:
+            while True:
+                timeout = self._poll(waiter)
+                if timeout is None:
+                    break
+                event.wait(timeout)
+                event.clear()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        slot = Slot(kind, tokens)
+        try:
+            yield slot
+        finally:
+            self._release(slot)
+
+    @asynccontextmanager
+    async def aslot(self, kind: str, tokens: int):
+        """Async variant of :meth:`slot`."""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = self._enqueue(kind, tokens, lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            while True:
+                timeout = self._poll(waiter)
+                if timeout is None:
+                    break
+                try:
+                    await asyncio.wait_for(event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        slot = Slot(kind, tokens)
+        try:
+            yield slot
+        finally:
+            self._release(slot)
+
+    def admit(self):
+        """Fail fast with :class:`LLMOverloaded` if a new request would only queue up to be rejected."""
+        with self._lock:
+            if self._queued >= self.queue_limit:
+                self.rejected["queue_full"] += 1
+                telemetry.record_llm_rejection("queue_full")
+                raise LLMOverloaded("LLM queue is full", self._retry_after(self._clock()))
+
+    def throttle(self, retry_after=None):
+        """The API answered 429: halve the concurrency window and pause for ``retry_after`` seconds."""
+        with self._lock:
+            now = self._clock()
+            self.throttled += 1
+            self._window = max(1.0, self._window / 2)
+            self._paused_until = max(self._paused_until, now + (retry_after or 1.0))
+            window, paused = self._window, self._paused_until - now
+        print(f"---LLM RATE LIMITED: window {window:.1f}, paused {paused:.1f}s---")
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = self._clock()
+            return {
+                "queued": self._queued,
+                "running": self._running,
+                "window": self._window,
+                "paused_seconds": max(0.0, self._paused_until - now),
+                "granted": dict(self.granted),
+                "rejected": dict(self.rejected),
+                "throttled": self.throttled,
+            }
+
+    def _enqueue(self, kind, tokens, wake) -> _Waiter:
+        with self._lock:
+            now = self._clock()
+            if self._queued >= self.queue_limit:
+                self.rejected["queue_full"] += 1
+                telemetry.record_llm_rejection("queue_full")
+                raise LLMOverloaded("LLM queue is full", self._retry_after(now))
+            waiter = _Waiter(
+                PRIORITIES.get(kind, max(PRIORITIES.values()) + 1), next(self._seq),
+                kind, tokens, now, now + self.queue_timeout, wake,
+            )
+            heapq.heappush(self._heap, waiter)
+            self._queued += 1
+            return waiter
+
+    def _poll(self, waiter):
+        """``None`` once ``waiter`` holds a slot, else the longest it should wait before polling again."""
+        with self._lock:
+            now = self._clock()
+            retry_in = self._dispatch(now, poller=waiter)
+            if waiter.granted:
+                telemetry.record_llm_queue_wait(waiter.kind, now - waiter.enqueued)
+                return None
+            if now >= waiter.deadline:
+                waiter.cancelled = True
+                self._queued -= 1
+                self.rejected["deadline"] += 1
+                telemetry.record_llm_rejection("deadline")
+                raise LLMOverloaded(
+                    f"LLM call waited more than {self.queue_timeout:g}s for a slot", self._retry_after(now)
+                )
+            timeout = min(waiter.deadline - now, retry_in if retry_in is not None else waiter.deadline - now)
+            waiter.next_poll = now + timeout
+            return timeout
+
+    def _dispatch(self, now, poller=None):
+        """Grant slots from the head of the queue; returns seconds until the head may be granted.
+
+        A head that has to wait for a budget is woken if it would otherwise
+        sleep past that wait (e.g. it last polled while the window was full),
+        so it polls again and sleeps just as long as needed. ``poller`` gets
+        the wait as the return value instead.
+        """
+        while self._heap:
+            head = self._heap[0]
+            if head.cancelled:
+                heapq.heappop(self._heap)
+                continue
+            if self._running >= int(self._window):
+                return None  # a release wakes the queue
+            wait = max(
+                self._paused_until - now,
+                self._requests.wait_time(1, now),
+                self._tokens.wait_time(head.tokens, now),
+            )
+            if wait > 0:
+                if head is not poller and head.next_poll > now + wait:
+                    head.next_poll = now
+                    head.wake()
+                return wait
+            heapq.heappop(self._heap)
+            self._requests.take(1, now)
+            self._tokens.take(head.tokens, now)
+            self._queued -= 1
+            self._running += 1
+            self.granted[head.kind] = self.granted.get(head.kind, 0) + 1
+            head.granted = True
+            head.wake()
+        return None
+
+    def _abandon(self, waiter):
+        """Give up a wait that was cancelled or failed; a slot granted meanwhile is returned."""
+        with self._lock:
+            if waiter.granted:
+                self._running -= 1
+            elif not waiter.cancelled:
+                waiter.cancelled = True
+                self._queued -= 1
+            self._dispatch(self._clock())
+
+    def _release(self, slot):
+        with self._lock:
+            now = self._clock()
+            self._running -= 1
+            if slot.actual_tokens is not None:
+                # Charge the difference between the estimate and what the call really used.
+                self._tokens.take(slot.actual_tokens - slot.tokens, now)
+            if slot.succeeded:
+                self._window = min(float(self.max_concurrency), self._window + 1 / self._window)
+            self._dispatch(now)
+
+    def _retry_after(self, now) -> float:
+        """Rough time until the queue has drained enough to accept a new request."""
+        rate = self._requests.rate
+        drain = self._queued / rate if rate > 0 else 0.0
+        return max(1.0, self._paused_until - now, drain)
+
+
+_llm_scheduler = None
+_llm_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Return the process-wide scheduler, creating it on first use."""
+    global _llm_scheduler
+    with _llm_scheduler_lock:
+        if _llm_scheduler is None:
+            _llm_scheduler = LLMScheduler()
+        return _llm_scheduler
@@ -0,0 +1,172 @@
+"""Secondary indexes over document metadata for the local retriever.
+
+Each indexed field is stored as NumPy arrays next to the vector index.
+String fields are postings (row positions grouped by value); numeric fields
+are their values sorted, with the matching row positions, so ranges are
+answered with ``searchsorted``. :meth:`MetadataIndex.positions` evaluates a
+Chroma-style ``where`` predicate to the sorted row positions it selects.
+"""
+
+import json
+import math
+import operator
+from pathlib import Path
+
+import numpy as np
+
+# Fields the device questions filter on; fields missing from a collection are skipped.
+INDEXED_METADATA_FIELDS = (
+    "Device_Class",
+    "Patient_Population",
+    "Manufacturer",
+    "Sterilization_Method",
+    "Max_Operating_Temperature_C",
+)
+
+_COMPARISONS = {
+    "$eq": operator.eq, "$ne": operator.ne,
+    "$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le,
+}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def build_metadata_index(metadatas, path: Path, fields=INDEXED_METADATA_FIELDS):
+    """Write the secondary indexes of ``fields`` for ``metadatas`` (one dict per row) under ``path``."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    manifest = {}
+    for number, field in enumerate(fields):
+        rows = [(position, (metadata or {}).get(field)) for position, metadata in enumerate(metadatas)]
+        rows = [(position, value) for position, value in rows if not _missing(value)]
+        if not rows:
+            continue
+        if all(_is_number(value) for _, value in rows):
+            values = np.array([value for _, value in rows], dtype=np.float64)
+            order = np.argsort(values, kind="stable")
+            np.save(path / f"{number}.values.npy", values[order])
+            np.save(path / f"{number}.positions.npy", np.array([p for p, _ in rows], dtype=np.int32)[order])
+            manifest[field] = {"kind": "range", "file": number}
+        else:
+            postings = {}
+            for position, value in rows:
+                postings.setdefault(str(value), []).append(position)
+            offsets, positions = {}, []
+            for value, value_positions in postings.items():
+                offsets[value] = [len(positions), len(positions) + len(value_positions)]
+                positions.extend(value_positions)
+            np.save(path / f"{number}.positions.npy", np.array(positions, dtype=np.int32))
+            manifest[field] = {"kind": "values", "file": number, "values": offsets}
+    (path / "manifest.json").write_text(json.dumps(manifest))
+    return path
+
+
+class MetadataIndex:
+    """Evaluates ``where`` predicates with the indexes written by :func:`build_metadata_index`.
+
+    Conditions on fields without an index fall back to scanning ``metadatas``.
+    Supported operators are ``$eq``, ``$ne``, ``$gt``, ``$gte``, ``$lt``,
+    ``$lte``, ``$in``, ``$nin``, ``$and`` and ``$or``.
+    """
+
+    def __init__(self, path: Path, metadatas):
+        self.path = Path(path)
+        self.metadatas = metadatas
+        manifest_path = self.path / "manifest.json"
+        self.fields = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+        self._arrays = {}
+        for field, spec in self.fields.items():
+            positions = np.load(self.path / f"{spec['file']}.positions.npy", mmap_mode="r")
+            values = (np.load(self.path / f"{spec['file']}.values.npy", mmap_mode="r")
+                      if spec["kind"] == "range" else None)
+            self._arrays[field] = (positions, values)
+
+    def distinct(self, field):
+        """Distinct stored values of ``field``."""
+        spec = self.fields.get(field)
+        if spec is not None and spec["kind"] == "values":
+            return list(spec["values"])
+        return sorted({str(m[field]) for m in self.metadatas if m and not _missing(m.get(field))})
+
+    def positions(self, where) -> np.ndarray:
+        """Sorted row positions matching ``where``."""
+        selected = None
+        for key, condition in where.items():
+            if key == "$and":
+                matched = self._reduce(np.intersect1d, condition)
+            elif key == "$or":
+                matched = self._reduce(np.union1d, condition)
+            else:
+                matched = self._field(key, condition)
+            selected = matched if selected is None else np.intersect1d(selected, matched)
+        return selected if selected is not None else np.arange(len(self.metadatas), dtype=np.int32)
+
+    def _reduce(self, combine, conditions):
+        result = self.positions(conditions[0])
+        for condition in conditions[1:]:
+            result = combine(result, self.positions(condition))
+        return result
+
+    def _field(self, field, condition):
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        selected = None
+        for op, value in condition.items():
+            matched = self._indexed(field, op, value)
+            if matched is None:
+                matched = self._scan(field, op, value)
+            selected = matched if selected is None else np.intersect1d(selected, matched)
+        return selected
+
+    def _indexed(self, field, op, value):
+        """Positions from the field's index, or ``None`` if it cannot answer ``op``."""
+        spec = self.fields.get(field)
+        if spec is None:
+            return None
+        positions, values = self._arrays[field]
+        if spec["kind"] == "values":
+            if op == "$eq":
+                value = [value]
+            elif op != "$in":
+                return None
+            parts = [positions[slice(*spec["values"][str(v)])] for v in value if str(v) in spec["values"]]
+            return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+
+        if op == "$in":
+            parts = [self._indexed(field, "$eq", v) for v in value]
+            return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+        if not _is_number(value):
+            return None
+        bounds = {
+            "$eq": (np.searchsorted(values, value, "left"), np.searchsorted(values, value, "right")),
+            "$gt": (np.searchsorted(values, value, "right"), len(values)),
+            "$gte": (np.searchsorted(values, value, "left"), len(values)),
+            "$lt": (0, np.searchsorted(values, value, "left")),
+            "$lte": (0, np.searchsorted(values, value, "right")),
+        }.get(op)
+        if bounds is None:
+            return None
+        return np.sort(positions[bounds[0]:bounds[1]])
+
+    def _scan(self, field, op, value):
+        def matches(metadata):
+            stored = (metadata or {}).get(field)
+            if op == "$in":
+                return stored in value
+            if op == "$nin":
+                return stored not in value
+            if _missing(stored):
+                return op == "$ne"
+            try:
+                return _COMPARISONS[op](stored, value)
+            except TypeError:
+                return False
+        if op not in _COMPARISONS and op not in ("$in", "$nin"):
+            raise ValueError(f"Unsupported where operator {op!r}")
+        return np.array([i for i, metadata in enumerate(self.metadatas) if matches(metadata)], dtype=np.int32)
@@ -0,0 +1,125 @@
+"""Display fields of the stored documents, kept out of Chroma.
+
+Chroma's metadata holds only the fields ``where`` predicates filter on
+(``FILTER_FIELDS``) and the chunk fields. The other columns of each row
+are written once per collection to an Arrow file under
+``METADATA_STORE_DIR``, keyed by the row's parent id (the content id of
+its ``combined_text``). The file is memory-mapped and its ids are a sorted
+fixed-width NumPy array searched with ``searchsorted``, so a worker holds
+no per-row Python objects and reads fields only for the documents a
+request asks about.
+"""
+
+import os
+from pathlib import Path
+import shutil
+import threading
+
+import numpy as np
+import pyarrow as pa
+from pyarrow import feather
+
+from metadata_index import INDEXED_METADATA_FIELDS
+
+METADATA_STORE_DIR = Path(os.getenv("METADATA_STORE_DIR", Path(__file__).parent / "metadata_store"))
+# Kept in Chroma's metadata for filtering; every column (these included) is in the store.
+FILTER_FIELDS = INDEXED_METADATA_FIELDS
+
+
+def chroma_metadatas(df) -> list:
+    """Per-row Chroma metadata of ``df``: its ``FILTER_FIELDS`` columns only."""
+    fields = [field for field in FILTER_FIELDS if field in df.columns]
+    if not fields:
+        return [{} for _ in range(len(df))]
+    return df[fields].to_dict(orient="records")
+
+
+class MetadataStoreWriter:
+    """Collects the rows of a collection and writes its store with :meth:`close`.
+
+    Rows may arrive in several frames (CSV chunks). Column types are unified
+    across them when the store is written; a parent id seen twice keeps its
+    first row.
+    """
+
+    def __init__(self, collection_name: str, path: Path = None):
+        self.path = Path(path) if path is not None else METADATA_STORE_DIR / collection_name
+        self.collection_name = collection_name
+        self._ids = []
+        self._tables = []
+
+    def add(self, parent_ids, df):
+        """Add the rows of ``df`` (``combined_text`` is left out, Chroma stores it)."""
+        self._ids.extend(parent_ids)
+        table = pa.Table.from_pandas(df.drop(columns=["combined_text"], errors="ignore"), preserve_index=False)
+        # A column that is empty in this chunk takes its type from the others (pandas reads it as float).
+        for i, column in enumerate(table.columns):
+            if len(column) and column.null_count == len(column):
+                table = table.set_column(i, table.field(i).name, pa.nulls(len(column)))
+        self._tables.append(table)
+
+    def close(self) -> Path:
+        ids = np.array(self._ids, dtype="S")
+        table = (pa.concat_tables(self._tables, promote_options="permissive") if self._tables
+                 else pa.table({}))
+        ids, first = np.unique(ids, return_index=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+        np.save(tmp_path / "ids.npy", ids)
+        # Uncompressed, so the file can be memory-mapped.
+        feather.write_feather(table.take(first), tmp_path / "rows.arrow", compression="uncompressed")
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        tmp_path.rename(self.path)
+        with _stores_lock:
+            _stores.pop(self.collection_name, None)
+        print(f"{self.collection_name}: metadata store with {len(ids)} rows written to {self.path}")
+        return self.path
+
+
+class MetadataStore:
+    """Read-only view of a store written by :class:`MetadataStoreWriter`."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._ids = np.load(self.path / "ids.npy", mmap_mode="r")
+        self._table = feather.read_table(self.path / "rows.arrow", memory_map=True)
+
+    @property
+    def fields(self) -> list:
+        return self._table.column_names
+
+    def get(self, ids, fields=None) -> list:
+        """Fields of each of ``ids`` (all fields by default), in order; ``{}`` for unknown ids."""
+        keys = [str(doc_id).encode() for doc_id in ids]
+        positions = np.searchsorted(self._ids, np.array(keys, dtype=self._ids.dtype)) if keys else []
+        # Compared with the full key: ids longer than the stored width are truncated by the cast.
+        hits = [position < len(self._ids) and self._ids[position] == key for key, position in zip(keys, positions)]
+        table = self._table.select([field for field in fields if field in self.fields]) if fields else self._table
+        found = pa.array([int(p) for p, hit in zip(positions, hits) if hit], type=pa.int64())
+        rows = iter(table.take(found).to_pylist())
+        return [next(rows) if hit else {} for hit in hits]
+
+    def count(self) -> int:
+        return len(self._ids)
+
+
+def write_metadata_store(collection_name: str, parent_ids, df, path: Path = None) -> Path:
+    """Write the store of a collection holding the rows of ``df``."""
+    writer = MetadataStoreWriter(collection_name, path)
+    writer.add(parent_ids, df)
+    return writer.close()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_metadata_store(collection_name: str):
+    """The collection's store, opened on first use; ``None`` when none was written."""
+    with _stores_lock:
+        if collection_name not in _stores:
+            path = METADATA_STORE_DIR / collection_name
+            _stores[collection_name] = MetadataStore(path) if (path / "ids.npy").exists() else None
+        return _stores[collection_name]
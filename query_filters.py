@@ -0,0 +1,114 @@
+"""Rule-based extraction of metadata filters from device-manual questions.
+
+``DeviceFilterExtractor.extract`` turns phrases such as "neonatal",
+"Class IIb", "made by Medtronic" or "max operating temperature above 40"
+into a Chroma ``where`` predicate over the device metadata. The rules are
+plain regular expressions, so the step costs microseconds and needs no model.
+"""
+
+import re
+
+# Populations a device labelled with each value may be used on.
+_POPULATION_RULES = [
+    (r"neonat\w*|newborns?", ["Neonatal", "Infant (0-2)", "All"]),
+    (r"infants?|bab(?:y|ies)", ["Infant (0-2)", "Neonatal", "All"]),
+    (r"pediatric|paediatric|child(?:ren)?|kids?|adolescents?",
+     ["Pediatric", "Pediatric (2-18)", "Adult and Pediatric", "All"]),
+    (r"geriatric|elderly|older adults?|seniors?",
+     ["Geriatric", "Adult (>65)", "All"]),
+    (r"adults?", ["Adult", "Adult (18-65)", "Adult (>65)", "Adult and Pediatric", "All"]),
+]
+
+_STERILIZATION_RULES = [
+    (r"ethylene oxide|\beto\b", "Ethylene Oxide (EtO)"),
+    (r"gamma", "Gamma Irradiation"),
+    (r"autoclav\w*", "Autoclave"),
+    (r"steam", "Steam Sterilization"),
+    (r"dry heat", "Dry Heat"),
+    (r"hydrogen peroxide|plasma steriliz\w*", "Hydrogen Peroxide Plasma"),
+    (r"\buv\b|ultraviolet", "UV Sterilization"),
+    (r"single[- ]use", "Single-Use Sterile"),
+    (r"pre-?sterilized", "Pre-Sterilized"),
+    (r"chemical(?:ly)? steriliz\w*", "Chemical Sterilization"),
+]
+
+_DEVICE_CLASS = re.compile(r"\bclass\s+(iii|iib|iia|ii|i|3|2b|2a|2|1)\b", re.IGNORECASE)
+_CLASS_NAMES = {
+    "i": "I", "ii": "II", "iia": "IIa", "iib": "IIb", "iii": "III",
+    "1": "I", "2": "II", "2a": "IIa", "2b": "IIb", "3": "III",
+}
+
+_TEMPERATURE = re.compile(
+    r"temperature\D{0,30}?\b(above|over|greater than|more than|at least|below|under|less than|at most)"
+    r"\s+(-?\d+(?:\.\d+)?)",
+    re.IGNORECASE,
+)
+_TEMPERATURE_OPERATORS = {
+    "above": "$gt", "over": "$gt", "greater than": "$gt", "more than": "$gt", "at least": "$gte",
+    "below": "$lt", "under": "$lt", "less than": "$lt", "at most": "$lte",
+}
+
+# Dropped from manufacturer names to get the short form people write.
+_COMPANY_SUFFIXES = re.compile(
+    r"\s+(?:corporation|healthcare|health care|medical care|medical technology|international|"
+    r"companies|laboratories)$",
+    re.IGNORECASE,
+)
+
+
+def _alias_pattern(name):
+    return re.compile(rf"(?<!\w){re.escape(name)}(?!\w)", re.IGNORECASE)
+
+
+class DeviceFilterExtractor:
+    """Extract a ``where`` predicate for the device collection from a question.
+
+    ``manufacturers`` are the names stored in the collection; each is matched
+    in full and by its short form ("Olympus" for "Olympus Corporation").
+    """
+
+    def __init__(self, manufacturers=()):
+        self._manufacturers = []
+        for name in sorted(set(manufacturers), key=len, reverse=True):
+            aliases = {name}
+            short = _COMPANY_SUFFIXES.sub("", name)
+            if len(short) >= 3:
+                aliases.add(short)
+            self._manufacturers.append((name, [_alias_pattern(alias) for alias in aliases]))
+
+    def extract(self, query: str):
+        """Return a Chroma ``where`` dict, or ``None`` when the question names no filter."""
+        conditions = []
+
+        classes = sorted({"Class " + _CLASS_NAMES[match.lower()] for match in _DEVICE_CLASS.findall(query)})
+        if classes:
+            conditions.append(_one_of("Device_Class", classes))
+
+        populations = []
+        for pattern, values in _POPULATION_RULES:
+            if re.search(rf"\b(?:{pattern})\b", query, re.IGNORECASE):
+                populations.extend(value for value in values if value not in populations)
+        if populations:
+            conditions.append(_one_of("Patient_Population", populations))
+
+        manufacturers = []
+        for name, patterns in self._manufacturers:
+            if any(pattern.search(query) for pattern in patterns):
+                manufacturers.append(name)
+        if manufacturers:
+            conditions.append(_one_of("Manufacturer", manufacturers))
+
+        methods = [method for pattern, method in _STERILIZATION_RULES if re.search(pattern, query, re.IGNORECASE)]
+        if methods:
+            conditions.append(_one_of("Sterilization_Method", methods))
+
+        for operator, value in _TEMPERATURE.findall(query):
+            conditions.append({"Max_Operating_Temperature_C": {_TEMPERATURE_OPERATORS[operator.lower()]: float(value)}})
+
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def _one_of(field, values):
+    return {field: values[0]} if len(values) == 1 else {field: {"$in": values}}
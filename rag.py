@@ -4,17 +4,21 @@ from openai import OpenAI
 from typing_extensions import TypedDict
 from typing import List
 from results_openai import get_llm_response
-from chromaDB import collection1, collection2
+from retrievers import get_retrievers
+from embeddings import get_embedding_service
+from telemetry import traced
 import os
 
 # === Define workflow node functions ===
 def retrieve_context(state):
-    """Retrieve top documents from ChromaDB based on query."""
+    """Retrieve top documents from the Medical Q&A collection based on query."""
     print("---RETRIEVING CONTEXT---")
     query = state["query"] # last user message
 
-    results = collection1.query(query_texts=[query], n_results=3)
-    context = "\n".join(results["documents"][0])
+    # Same retriever as agentic_RAG: configured backend, hybrid fusion and chunk expansion.
+    results = get_retrievers()["Retrieve_QnA"].query(
+        get_embedding_service().embed(query), n_results=3, query_text=query)
+    context = "\n".join(results["documents"])
 
     #state["query"] = query
     state["context"] = context
@@ -64,9 +68,9 @@ class GraphState(TypedDict):
 workflow = StateGraph(GraphState)
 
 # Add nodes
-workflow.add_node("Retriever", retrieve_context)
-workflow.add_node("Augment", build_prompt)
-workflow.add_node("Generate", call_llm)
+workflow.add_node("Retriever", traced("rag", "Retriever", retrieve_context))
+workflow.add_node("Augment", traced("rag", "Augment", build_prompt))
+workflow.add_node("Generate", traced("rag", "Generate", call_llm))
 
 # Define edges
 workflow.add_edge(START, "Retriever")
@@ -78,27 +82,28 @@ workflow.add_edge("Generate", END)
 rag_agent = workflow.compile()
 
 # === Run it ===
-graph_path = os.path.join(os.getcwd(), "rag_graph.png")
-with open(graph_path, "wb") as graph_file:
-    graph_file.write(rag_agent.get_graph().draw_mermaid_png())
-print(f"Workflow graph saved to {graph_path}")
-
-input_state = {"query": "What are the treatments for Kawasaki disease ?"}
-
-from pprint import pprint
-
-final_response = None
-for step in rag_agent.stream(input_state):
-    for key, value in step.items():
-        pprint(f"Finished running: {key}:")
-        if "response" in value:
-            final_response = value["response"]
-            pprint(final_response)
-
-if final_response:
-    response_path = os.path.join(os.getcwd(), "rag_response.txt")
-    with open(response_path, "w", encoding="utf-8") as response_file:
-        response_file.write(final_response)
-    print(f"Response saved to {response_path}")
-else:
-    print("No response generated to save.")
\ No newline at end of file
+if __name__ == "__main__":
+    graph_path = os.path.join(os.getcwd(), "rag_graph.png")
+    with open(graph_path, "wb") as graph_file:
+        graph_file.write(rag_agent.get_graph().draw_mermaid_png())
+    print(f"Workflow graph saved to {graph_path}")
+
+    input_state = {"query": "What are the treatments for Kawasaki disease ?"}
+
+    from pprint import pprint
+
+    final_response = None
+    for step in rag_agent.stream(input_state):
+        for key, value in step.items():
+            pprint(f"Finished running: {key}:")
+            if "response" in value:
+                final_response = value["response"]
+                pprint(final_response)
+
+    if final_response:
+        response_path = os.path.join(os.getcwd(), "rag_response.txt")
+        with open(response_path, "w", encoding="utf-8") as response_file:
+            response_file.write(final_response)
+        print(f"Response saved to {response_path}")
+    else:
+        print("No response generated to save.")
@@ -0,0 +1,77 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:  # the reranker is optional
+    CrossEncoder = None
+
+load_dotenv()
+
+# Chroma distances are squared L2 over unit vectors (d = 2 - 2 * cosine), so
+# 0.8 means cosine similarity 0.6 and 1.3 means cosine similarity 0.35.
+RELEVANT_MAX_DISTANCE = float(os.getenv("RELEVANCE_RELEVANT_MAX_DISTANCE", "0.8"))
+IRRELEVANT_MIN_DISTANCE = float(os.getenv("RELEVANCE_IRRELEVANT_MIN_DISTANCE", "1.3"))
+
+# Optional local cross-encoder, e.g. "cross-encoder/ms-marco-MiniLM-L-6-v2".
+RERANKER_MODEL = os.getenv("RELEVANCE_RERANKER_MODEL", "")
+RERANKER_RELEVANT_SCORE = float(os.getenv("RELEVANCE_RERANKER_RELEVANT_SCORE", "2.0"))
+RERANKER_IRRELEVANT_SCORE = float(os.getenv("RELEVANCE_RERANKER_IRRELEVANT_SCORE", "-2.0"))
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def _get_reranker():
+    global _reranker
+    if not RERANKER_MODEL or CrossEncoder is None:
+        return None
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = CrossEncoder(RERANKER_MODEL, device="cpu")
+        return _reranker
+
+
+def _distance_decision(best_distance: float):
+    if best_distance <= RELEVANT_MAX_DISTANCE:
+        return "Yes"
+    if best_distance >= IRRELEVANT_MIN_DISTANCE:
+        return "No"
+    return None
+
+
+def _rerank_decision(best_score: float):
+    if best_score >= RERANKER_RELEVANT_SCORE:
+        return "Yes"
+    if best_score <= RERANKER_IRRELEVANT_SCORE:
+        return "No"
+    return None
+
+
+def judge(query: str, documents, distances) -> dict:
+    """Decide relevance of retrieved documents from their retrieval scores.
+
+    Returns a dict with ``decision`` ('Yes', 'No', or None when the scores fall
+    in the ambiguous band and the LLM checker should decide), ``method`` and
+    the ``rerank_scores`` computed on the way (empty if the reranker did not run).
+    """
+    if not distances:
+        return {"decision": None, "method": "llm", "rerank_scores": []}
+
+    decision = _distance_decision(min(distances))
+    if decision is not None:
+        return {"decision": decision, "method": "distance", "rerank_scores": []}
+
+    reranker = _get_reranker()
+    if reranker is None or not documents:
+        return {"decision": None, "method": "llm", "rerank_scores": []}
+
+    rerank_scores = [float(score) for score in reranker.predict([(query, doc) for doc in documents])]
+    decision = _rerank_decision(max(rerank_scores))
+    return {
+        "decision": decision,
+        "method": "reranker" if decision is not None else "llm",
+        "rerank_scores": rerank_scores,
+    }
@@ -1,26 +1,35 @@
 from langchain_core.tools import tool
 from dotenv import load_dotenv
 import os
-from openai import OpenAI
+from llm_client import get_llm_client
 
 load_dotenv()
 openai_api_key = os.getenv("OPEN_AI_KEY")
 
 
-def get_llm_response(prompt: str) -> str:
-    """Function to get response from LLM"""
-    client_llm = OpenAI(api_key=openai_api_key)
-    response = client_llm.chat.completions.create(
-        model="gpt-5-nano",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content
+def get_llm_response(prompt: str, on_token=None, kind: str = "generate", response_format=None) -> str:
+    """Function to get response from LLM
 
-## testing the LLM response
-prompt = "Explain the theory of relativity in simple terms in 30 words"
-response = get_llm_response(prompt)
+    When ``on_token`` is given the completion is streamed and ``on_token`` is
+    called with every text delta as it arrives; the full text is still returned.
+    ``kind`` (``generate``, ``router`` or ``relevance``) sets the call's
+    priority in the LLM scheduler. ``response_format`` requests structured
+    output, e.g. a JSON schema.
+    """
+    return get_llm_client().complete(prompt, on_token=on_token, kind=kind, response_format=response_format)
 
-print(response)
+
+async def aget_llm_response(prompt: str, on_token=None, kind: str = "generate", response_format=None) -> str:
+    """Async version of :func:`get_llm_response`."""
+    return await get_llm_client().acomplete(prompt, on_token=on_token, kind=kind, response_format=response_format)
+
+
+if __name__ == "__main__":
+    ## testing the LLM response
+    prompt = "Explain the theory of relativity in simple terms in 30 words"
+    response = get_llm_response(prompt)
+
+    print(response)
 
 
 ### Results from the OpenAI API:
@@ -0,0 +1,667 @@
+"""Vector retrieval behind one interface, backed by Chroma or an in-process index.
+
+``RETRIEVER_BACKEND=chroma`` (default) queries the Chroma collections.
+``RETRIEVER_BACKEND=local`` searches a read-only index on disk: the
+embeddings are a memory-mapped float32/float16 matrix searched exactly with
+NumPy, or by a FAISS HNSW/IVF index when ``VECTOR_INDEX_KIND`` asks for one.
+The ids, documents and metadata are memory-mapped too, as UTF-8 byte arrays
+with row offsets. Worker processes that map the same files share them
+through the page cache.
+
+Documents are stored as text chunks; :class:`ParentRetriever` searches the
+chunks and returns one expanded result per parent document.
+
+With ``HYBRID_RETRIEVAL=true`` (default) either backend is also wrapped in a
+:class:`HybridRetriever`, which fuses the vector ranking with a BM25 ranking
+over the same documents so exact tokens such as model numbers, manufacturer
+names and regulatory IDs are found even when the embedding misses them.
+
+Build (or rebuild) the local vector and lexical indexes from the Chroma
+collections with:
+
+    python retrievers.py --build
+"""
+
+import argparse
+from collections.abc import Sequence
+import json
+import math
+import os
+from pathlib import Path
+import shutil
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+try:
+    import faiss
+except ImportError:  # only needed for VECTOR_INDEX_KIND=hnsw/ivf
+    faiss = None
+
+from chromaDB import DEVICE_COLLECTION, QA_COLLECTION, get_collections, merge_chunks, sibling_chunk_id
+from lexical_index import LEXICAL_INDEX_DIR, BM25Index, build_bm25_index, ids_fingerprint
+from metadata_index import MetadataIndex, build_metadata_index
+
+load_dotenv()
+
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "chroma")
+VECTOR_INDEX_DIR = Path(os.getenv("VECTOR_INDEX_DIR", Path(__file__).parent / "vector_index"))
+# Storage type of the embedding matrix: float32 or float16 (half the memory).
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+# "flat" = exact NumPy search; "hnsw" / "ivf" = approximate FAISS search.
+VECTOR_INDEX_KIND = os.getenv("VECTOR_INDEX_KIND", "flat")
+# Rows of a float16 matrix converted to float32 at a time by an exact search.
+VECTOR_SCORE_BLOCK_ROWS = int(os.getenv("VECTOR_SCORE_BLOCK_ROWS", "16384"))
+
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+# Candidates taken from each ranking before fusion.
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Weight of the BM25 ranking relative to the vector ranking (weight 1.0) per route.
+HYBRID_LEXICAL_WEIGHTS = {
+    "Retrieve_QnA": float(os.getenv("HYBRID_LEXICAL_WEIGHT_QNA", "0.5")),
+    "Retrieve_Device": float(os.getenv("HYBRID_LEXICAL_WEIGHT_DEVICE", "1.0")),
+}
+
+# What a retrieved text chunk is expanded to: "neighbors" (the chunks either
+# side of it), "parent" (the whole document) or "none".
+CHUNK_EXPANSION = os.getenv("CHUNK_EXPANSION", "neighbors")
+# Chunks fetched per requested document, so several parents survive deduplication.
+CHUNK_CANDIDATE_FACTOR = int(os.getenv("CHUNK_CANDIDATE_FACTOR", "4"))
+_CHUNK_FIELDS = ("parent_id", "chunk_index", "chunk_count", "chunk_start")
+
+ROUTE_COLLECTIONS = {"Retrieve_QnA": QA_COLLECTION, "Retrieve_Device": DEVICE_COLLECTION}
+
+
+def _first(results):
+    return _row(results, 0)
+
+
+def _row(results, row):
+    return {key: results[key][row] for key in ("ids", "documents", "metadatas", "distances")}
+
+
+def _where_groups(wheres, count):
+    """``(where, positions)`` for each distinct predicate among ``count`` queries."""
+    groups = {}
+    for position in range(count):
+        where = wheres[position] if wheres else None
+        groups.setdefault(json.dumps(where, sort_keys=True), (where, []))[1].append(position)
+    return list(groups.values())
+
+
+class ChromaRetriever:
+    """Retriever over a Chroma collection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def query(self, query_embedding, n_results: int = 3, *, query_text: str = None, where: dict = None) -> dict:
+        """Return ``ids``, ``documents``, ``metadatas`` and ``distances`` of the nearest documents.
+
+        ``where`` restricts the search to documents whose metadata matches it;
+        Chroma resolves it through its metadata indexes before the vector
+        search. ``query_text`` is only used by :class:`HybridRetriever`.
+        """
+        return _first(self.collection.query(
+            query_embeddings=[np.asarray(query_embedding, dtype=np.float32)],
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        ))
+
+    def query_many(self, query_embeddings, n_results: int = 3, *, query_texts=None, wheres=None) -> list:
+        """:meth:`query` for many queries at once: one Chroma call per distinct ``where``."""
+        results = [None] * len(query_embeddings)
+        for where, positions in _where_groups(wheres, len(query_embeddings)):
+            batch = self.collection.query(
+                query_embeddings=np.asarray([query_embeddings[i] for i in positions], dtype=np.float32),
+                n_results=n_results,
+                where=where,
+                include=["documents", "metadatas", "distances"],
+            )
+            for row, position in enumerate(positions):
+                results[position] = _row(batch, row)
+        return results
+
+    def filter_ids(self, where: dict) -> list:
+        """Ids of the documents matching ``where``."""
+        return self.collection.get(where=where, include=[])["ids"]
+
+    def distinct(self, field: str) -> list:
+        """Distinct values of a metadata field."""
+        metadatas = self.collection.get(include=["metadatas"])["metadatas"]
+        values = {(m or {}).get(field) for m in metadatas}
+        return sorted(str(v) for v in values if v is not None and not (isinstance(v, float) and math.isnan(v)))
+
+    def get(self, ids) -> dict:
+        """Return ``ids``, ``documents``, ``metadatas`` and ``embeddings`` of ``ids``, in that order.
+
+        Ids the collection does not have are left out.
+        """
+        data = self.collection.get(ids=list(ids), include=["documents", "metadatas", "embeddings"])
+        position = {doc_id: i for i, doc_id in enumerate(data["ids"])}
+        ids = [doc_id for doc_id in ids if doc_id in position]
+        order = [position[doc_id] for doc_id in ids]
+        return {
+            "ids": ids,
+            "documents": [data["documents"][i] for i in order],
+            "metadatas": [data["metadatas"][i] for i in order],
+            "embeddings": np.asarray(data["embeddings"], dtype=np.float32)[order],
+        }
+
+    def all_documents(self):
+        """Return ``(ids, documents)`` of the whole collection."""
+        data = self.collection.get(include=["documents"])
+        return data["ids"], data["documents"]
+
+    def all_ids(self) -> list:
+        return self.collection.get(include=[])["ids"]
+
+    def embeddings(self) -> np.ndarray:
+        return np.asarray(self.collection.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+def _write_strings(path: Path, name: str, strings):
+    """Write ``strings`` as one UTF-8 byte array (``{name}.npy``) and row offsets (``{name}.offsets.npy``)."""
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    np.save(path / f"{name}.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(path / f"{name}.offsets.npy", offsets)
+
+
+class StringColumn(Sequence):
+    """Memory-mapped strings written by :func:`_write_strings`, decoded on access."""
+
+    def __init__(self, path: Path, name: str):
+        self._data = np.load(path / f"{name}.npy", mmap_mode="r")
+        self._offsets = np.load(path / f"{name}.offsets.npy", mmap_mode="r")
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return self._decode(self._data[self._offsets[row]:self._offsets[row + 1]].tobytes().decode("utf-8"))
+
+    @staticmethod
+    def _decode(text):
+        return text
+
+
+class JsonColumn(StringColumn):
+    """:class:`StringColumn` of JSON values."""
+
+    _decode = staticmethod(json.loads)
+
+
+class LocalIndex:
+    """Read-only in-process retriever over files written by :func:`build_local_index`.
+
+    Distances are squared L2, the same scale Chroma returns, so the relevance
+    gate and router thresholds apply unchanged. Ids are looked up in a sorted
+    fixed-width copy with ``searchsorted``, so a worker holds no per-row
+    Python objects.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.info = json.loads((self.path / "index.json").read_text())
+        self._vectors = np.load(self.path / "embeddings.npy", mmap_mode="r")
+        self._sq_norms = np.load(self.path / "sq_norms.npy", mmap_mode="r")
+        self.ids = StringColumn(self.path, "ids")
+        self.documents = StringColumn(self.path, "documents")
+        self.metadatas = JsonColumn(self.path, "metadatas")
+        self._sorted_ids = np.load(self.path / "sorted_ids.npy", mmap_mode="r")
+        self._sorted_positions = np.load(self.path / "sorted_positions.npy", mmap_mode="r")
+        self.metadata_index = MetadataIndex(self.path / "metadata_index", self.metadatas)
+        self._faiss = None
+        if self.info["kind"] != "flat":
+            if faiss is None:
+                raise ImportError(f"{self.path} is a FAISS {self.info['kind']} index; install faiss-cpu")
+            self._faiss = faiss.read_index(str(self.path / "faiss.index"))
+
+    def query(self, query_embedding, n_results: int = 3, *, query_text: str = None, where: dict = None) -> dict:
+        """Nearest documents; with ``where``, an exact search over the rows its indexes select."""
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        candidates = self.metadata_index.positions(where) if where else None
+        n_results = min(n_results, len(self.ids) if candidates is None else len(candidates))
+        if n_results == 0:
+            return {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        if candidates is not None:
+            vectors = np.asarray(self._vectors[candidates], dtype=np.float32)
+            distances = self._sq_norms[candidates] - 2.0 * (vectors @ query_vector) + float(query_vector @ query_vector)
+            nearest = np.argpartition(distances, n_results - 1)[:n_results]
+            nearest = nearest[np.argsort(distances[nearest])]
+            return self._results(candidates[nearest], distances[nearest])
+
+        if self._faiss is not None:
+            distances, indices = self._faiss.search(query_vector[None, :], n_results)
+            found = indices[0] >= 0
+            return self._results(indices[0][found], distances[0][found])
+
+        distances = self._sq_norms - 2.0 * self._dot(query_vector[None, :])[0] + float(query_vector @ query_vector)
+        nearest = np.argpartition(distances, n_results - 1)[:n_results]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return self._results(nearest, distances[nearest])
+
+    def query_many(self, query_embeddings, n_results: int = 3, *, query_texts=None, wheres=None) -> list:
+        """:meth:`query` for many queries; unfiltered ones are searched as one matrix product."""
+        results = [None] * len(query_embeddings)
+        for where, positions in _where_groups(wheres, len(query_embeddings)):
+            if where is not None or min(n_results, len(self.ids)) == 0:
+                for position in positions:
+                    results[position] = self.query(query_embeddings[position], n_results, where=where)
+                continue
+
+            queries = np.asarray([query_embeddings[i] for i in positions], dtype=np.float32)
+            k = min(n_results, len(self.ids))
+            if self._faiss is not None:
+                distances, indices = self._faiss.search(queries, k)
+                for row, position in enumerate(positions):
+                    found = indices[row] >= 0
+                    results[position] = self._results(indices[row][found], distances[row][found])
+                continue
+
+            distances = (self._sq_norms[None, :] - 2.0 * self._dot(queries)
+                         + np.einsum("ij,ij->i", queries, queries)[:, None])
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            for row, position in enumerate(positions):
+                row_nearest = nearest[row][np.argsort(distances[row, nearest[row]])]
+                results[position] = self._results(row_nearest, distances[row, row_nearest])
+        return results
+
+    def get(self, ids) -> dict:
+        found = [(doc_id, row) for doc_id, row in zip(ids, self._rows(ids)) if row is not None]
+        indices = [row for _, row in found]
+        return {
+            "ids": [doc_id for doc_id, _ in found],
+            "documents": [self.documents[i] for i in indices],
+            "metadatas": [self.metadatas[i] for i in indices],
+            "embeddings": np.asarray(self._vectors[indices], dtype=np.float32),
+        }
+
+    def all_documents(self):
+        return list(self.ids), list(self.documents)
+
+    def all_ids(self) -> list:
+        return list(self.ids)
+
+    def filter_ids(self, where: dict) -> list:
+        return [self.ids[i] for i in self.metadata_index.positions(where)]
+
+    def distinct(self, field: str) -> list:
+        return self.metadata_index.distinct(field)
+
+    def embeddings(self) -> np.ndarray:
+        return self._vectors
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def _dot(self, queries) -> np.ndarray:
+        """``queries @ vectors.T`` in float32.
+
+        A float32 matrix is multiplied in place. A float16 one is converted
+        ``VECTOR_SCORE_BLOCK_ROWS`` rows at a time, so a search never holds a
+        float32 copy of the whole matrix.
+        """
+        if self._vectors.dtype == np.float32:
+            return queries @ self._vectors.T
+        products = np.empty((len(queries), len(self._vectors)), dtype=np.float32)
+        for start in range(0, len(self._vectors), VECTOR_SCORE_BLOCK_ROWS):
+            block = np.asarray(self._vectors[start:start + VECTOR_SCORE_BLOCK_ROWS], dtype=np.float32)
+            products[:, start:start + len(block)] = queries @ block.T
+        return products
+
+    def _rows(self, ids) -> list:
+        """Row of each of ``ids``, or ``None`` for ids the index does not have."""
+        keys = [str(doc_id).encode() for doc_id in ids]
+        found = np.searchsorted(self._sorted_ids, np.array(keys, dtype=self._sorted_ids.dtype)) if keys else []
+        # Compared with the full key: ids longer than the stored width are truncated by the cast.
+        return [int(self._sorted_positions[i]) if i < len(self._sorted_ids) and self._sorted_ids[i] == key else None
+                for key, i in zip(keys, found)]
+
+    def _results(self, indices, distances):
+        return {
+            "ids": [self.ids[i] for i in indices],
+            "documents": [self.documents[i] for i in indices],
+            "metadatas": [self.metadatas[i] for i in indices],
+            "distances": [max(float(d), 0.0) for d in distances],
+        }
+
+
+def build_local_index(collection, path: Path = None, *, dtype: str = VECTOR_INDEX_DTYPE,
+                      kind: str = VECTOR_INDEX_KIND) -> Path:
+    """Write the collection's embeddings, documents and metadata as a local index."""
+    path = Path(path) if path is not None else VECTOR_INDEX_DIR / collection.name
+    if kind != "flat" and faiss is None:
+        raise ImportError(f"VECTOR_INDEX_KIND={kind} needs faiss-cpu")
+
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    vectors = np.asarray(data["embeddings"], dtype=np.float32).astype(dtype)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    np.save(tmp_path / "embeddings.npy", vectors)
+    stored = vectors.astype(np.float32)
+    np.save(tmp_path / "sq_norms.npy", np.einsum("ij,ij->i", stored, stored))
+    _write_strings(tmp_path, "ids", data["ids"])
+    _write_strings(tmp_path, "documents", data["documents"])
+    _write_strings(tmp_path, "metadatas", [json.dumps(metadata) for metadata in data["metadatas"]])
+    sorted_ids = np.array([doc_id.encode() for doc_id in data["ids"]], dtype="S")
+    order = np.argsort(sorted_ids, kind="stable")
+    np.save(tmp_path / "sorted_ids.npy", sorted_ids[order])
+    np.save(tmp_path / "sorted_positions.npy", order.astype(np.int32))
+    build_metadata_index(data["metadatas"], tmp_path / "metadata_index")
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(stored.shape[1], 32)
+        index.add(stored)
+        faiss.write_index(index, str(tmp_path / "faiss.index"))
+    elif kind == "ivf":
+        nlist = max(1, int(np.sqrt(len(stored))))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(stored.shape[1]), stored.shape[1], nlist)
+        index.train(stored)
+        index.add(stored)
+        index.nprobe = max(1, nlist // 8)
+        faiss.write_index(index, str(tmp_path / "faiss.index"))
+    elif kind != "flat":
+        raise ValueError(f"Unknown VECTOR_INDEX_KIND {kind!r}")
+    (tmp_path / "index.json").write_text(json.dumps({
+        "collection": collection.name, "count": len(stored), "dim": int(stored.shape[1]) if len(stored) else 0,
+        "dtype": dtype, "kind": kind, "fingerprint": ids_fingerprint(data["ids"]),
+    }))
+
+    shutil.rmtree(path, ignore_errors=True)
+    tmp_path.rename(path)
+    print(f"{collection.name}: local {kind} index with {len(stored)} vectors written to {path}")
+    return path
+
+
+class HybridRetriever:
+    """Vector retriever fused with a BM25 index by weighted reciprocal rank fusion.
+
+    A document scores ``1 / (rrf_k + vector_rank) + lexical_weight / (rrf_k + bm25_rank)``
+    over the top ``candidates`` of each ranking. Documents found only by BM25
+    get their vector distance computed from their stored embedding, so
+    ``distances`` stays on the vector scale the relevance gate expects.
+    Without ``query_text`` this is the plain vector retriever.
+    """
+
+    def __init__(self, vector, lexical: BM25Index, *, lexical_weight: float = 1.0,
+                 candidates: int = HYBRID_CANDIDATES, rrf_k: int = RRF_K):
+        self.vector = vector
+        self.lexical = lexical
+        self.lexical_weight = lexical_weight
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def query(self, query_embedding, n_results: int = 3, *, query_text: str = None, where: dict = None) -> dict:
+        if query_text is None or self.lexical_weight <= 0:
+            return self.vector.query(query_embedding, n_results, where=where)
+
+        vector_hits = self.vector.query(query_embedding, max(n_results, self.candidates), where=where)
+        return self._fuse(query_embedding, n_results, query_text, where, vector_hits)
+
+    def query_many(self, query_embeddings, n_results: int = 3, *, query_texts=None, wheres=None) -> list:
+        """:meth:`query` for many queries; the vector side runs as one batched search."""
+        if query_texts is None or self.lexical_weight <= 0:
+            return self.vector.query_many(query_embeddings, n_results, wheres=wheres)
+        all_vector_hits = self.vector.query_many(query_embeddings, max(n_results, self.candidates), wheres=wheres)
+        return [
+            self._fuse(query_embeddings[i], n_results, query_texts[i], wheres[i] if wheres else None, vector_hits)
+            for i, vector_hits in enumerate(all_vector_hits)
+        ]
+
+    def _fuse(self, query_embedding, n_results, query_text, where, vector_hits):
+        allowed = self.vector.filter_ids(where) if where else None
+        lexical_hits = self.lexical.search(query_text, max(n_results, self.candidates), ids=allowed)
+        scores = {}
+        for rank, doc_id in enumerate(vector_hits["ids"], start=1):
+            scores[doc_id] = 1.0 / (self.rrf_k + rank)
+        for rank, (doc_id, _) in enumerate(lexical_hits, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + self.lexical_weight / (self.rrf_k + rank)
+        fused = sorted(scores, key=scores.get, reverse=True)[:n_results]
+
+        found = {doc_id: i for i, doc_id in enumerate(vector_hits["ids"])}
+        missing = [doc_id for doc_id in fused if doc_id not in found]
+        extra = {}
+        if missing:
+            fetched = self.vector.get(missing)
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            distances = ((fetched["embeddings"] - query_vector) ** 2).sum(axis=1)
+            for i, doc_id in enumerate(fetched["ids"]):
+                extra[doc_id] = (fetched["documents"][i], fetched["metadatas"][i], float(distances[i]))
+            # A BM25 hit the vector store no longer has (the index lags a re-sync) is dropped.
+            fused = [doc_id for doc_id in fused if doc_id in found or doc_id in extra]
+
+        results = {"ids": fused, "documents": [], "metadatas": [], "distances": [], "scores": []}
+        for doc_id in fused:
+            if doc_id in found:
+                i = found[doc_id]
+                document, metadata, distance = (vector_hits["documents"][i], vector_hits["metadatas"][i],
+                                                vector_hits["distances"][i])
+            else:
+                document, metadata, distance = extra[doc_id]
+            results["documents"].append(document)
+            results["metadatas"].append(metadata)
+            results["distances"].append(distance)
+            results["scores"].append(scores[doc_id])
+        return results
+
+    def get(self, ids) -> dict:
+        return self.vector.get(ids)
+
+    def all_documents(self):
+        return self.vector.all_documents()
+
+    def all_ids(self) -> list:
+        return self.vector.all_ids()
+
+    def filter_ids(self, where: dict) -> list:
+        return self.vector.filter_ids(where)
+
+    def distinct(self, field: str) -> list:
+        return self.vector.distinct(field)
+
+    def embeddings(self) -> np.ndarray:
+        return self.vector.embeddings()
+
+    def count(self) -> int:
+        return self.vector.count()
+
+
+class ParentRetriever:
+    """Searches text chunks and returns one result per parent document.
+
+    The best chunk of each parent stands for it (its distance, and score
+    when fused). Its text is expanded according to ``expansion``. Results
+    from collections stored before chunking (no ``parent_id``) pass through.
+    """
+
+    def __init__(self, chunks, *, expansion: str = CHUNK_EXPANSION,
+                 candidate_factor: int = CHUNK_CANDIDATE_FACTOR):
+        if expansion not in ("neighbors", "parent", "none"):
+            raise ValueError(f"Unknown CHUNK_EXPANSION {expansion!r}")
+        self.chunks = chunks
+        self.expansion = expansion
+        self.candidate_factor = candidate_factor
+
+    def query(self, query_embedding, n_results: int = 3, *, query_text: str = None, where: dict = None) -> dict:
+        hits = self.chunks.query(query_embedding, n_results * self.candidate_factor,
+                                 query_text=query_text, where=where)
+        return self._parents(hits, n_results)
+
+    def query_many(self, query_embeddings, n_results: int = 3, *, query_texts=None, wheres=None) -> list:
+        all_hits = self.chunks.query_many(query_embeddings, n_results * self.candidate_factor,
+                                          query_texts=query_texts, wheres=wheres)
+        return [self._parents(hits, n_results) for hits in all_hits]
+
+    def _parents(self, hits, n_results):
+        best = {}
+        for position, (doc_id, metadata) in enumerate(zip(hits["ids"], hits["metadatas"])):
+            best.setdefault((metadata or {}).get("parent_id", doc_id), position)
+
+        results = {key: [] for key in hits}
+        for parent_id, position in list(best.items())[:n_results]:
+            for key in hits:
+                results[key].append(hits[key][position])
+            results["ids"][-1] = parent_id
+            metadata = hits["metadatas"][position] or {}
+            results["documents"][-1] = self._expand(hits["ids"][position], hits["documents"][position], metadata)
+            results["metadatas"][-1] = {k: v for k, v in metadata.items() if k not in _CHUNK_FIELDS}
+        return results
+
+    def _expand(self, chunk, document, metadata):
+        count = metadata.get("chunk_count", 1)
+        if self.expansion == "none" or count == 1:
+            return document
+        if self.expansion == "parent":
+            indexes = range(count)
+        else:
+            index = metadata["chunk_index"]
+            indexes = range(max(index - 1, 0), min(index + 2, count))
+        fetched = self.chunks.get([sibling_chunk_id(chunk, i) for i in indexes])
+        return merge_chunks(fetched["documents"], fetched["metadatas"])
+
+    def get(self, ids) -> dict:
+        return self.chunks.get(ids)
+
+    def all_documents(self):
+        return self.chunks.all_documents()
+
+    def all_ids(self) -> list:
+        return self.chunks.all_ids()
+
+    def filter_ids(self, where: dict) -> list:
+        return self.chunks.filter_ids(where)
+
+    def distinct(self, field: str) -> list:
+        return self.chunks.distinct(field)
+
+    def embeddings(self) -> np.ndarray:
+        return self.chunks.embeddings()
+
+    def count(self) -> int:
+        return self.chunks.count()
+
+
+def build_lexical_index(retriever, collection_name: str, path: Path = None) -> Path:
+    """Write the BM25 index of a retriever's documents."""
+    path = Path(path) if path is not None else LEXICAL_INDEX_DIR / collection_name
+    ids, documents = retriever.all_documents()
+    return build_bm25_index(ids, documents, path)
+
+
+def _is_current(path: Path, fingerprint: str) -> bool:
+    """Whether the index at ``path`` was built from the documents with this ids fingerprint."""
+    info_path = Path(path) / "index.json"
+    return info_path.exists() and json.loads(info_path.read_text()).get("fingerprint") == fingerprint
+
+
+def _lexical_index(retriever, collection_name):
+    """The collection's BM25 index, (re)built when missing or built from other documents."""
+    path = LEXICAL_INDEX_DIR / collection_name
+    if not _is_current(path, ids_fingerprint(retriever.all_ids())):
+        build_lexical_index(retriever, collection_name, path)
+    return BM25Index(path)
+
+
+def refresh_indexes(collection, *, build_missing: bool = False):
+    """Rebuild the collection's local and BM25 indexes that no longer match its documents.
+
+    Missing indexes are built too with ``build_missing`` if the settings use
+    them; otherwise :func:`get_retrievers` builds them on first use.
+    Returns whether anything was rebuilt.
+    """
+    global _retrievers
+    fingerprint = ids_fingerprint(collection.get(include=[])["ids"])
+    rebuilt = False
+    for path, used, build in (
+        (VECTOR_INDEX_DIR / collection.name, RETRIEVER_BACKEND == "local",
+         lambda: build_local_index(collection)),
+        (LEXICAL_INDEX_DIR / collection.name, HYBRID_RETRIEVAL,
+         lambda: build_lexical_index(ChromaRetriever(collection), collection.name)),
+    ):
+        exists = (path / "index.json").exists()
+        if (exists or (build_missing and used)) and not _is_current(path, fingerprint):
+            build()
+            rebuilt = True
+    if rebuilt:
+        # Reopened on next use. Not under the lock: this may run while get_retrievers opens the store.
+        _retrievers = None
+    return rebuilt
+
+
+def _build_retrievers(backend):
+    if backend == "chroma":
+        retrievers = {route: ChromaRetriever(collection)
+                      for route, collection in zip(ROUTE_COLLECTIONS, get_collections())}
+    elif backend == "local":
+        retrievers = {}
+        for position, (route, collection_name) in enumerate(ROUTE_COLLECTIONS.items()):
+            path = VECTOR_INDEX_DIR / collection_name
+            # Also rebuilds indexes written before the records were memory-mapped (records.json).
+            if not (path / "index.json").exists() or not (path / "sorted_ids.npy").exists():
+                build_local_index(get_collections()[position], path)
+            retrievers[route] = LocalIndex(path)
+    else:
+        raise ValueError(f"Unknown RETRIEVER_BACKEND {backend!r}")
+
+    if HYBRID_RETRIEVAL:
+        retrievers = {
+            route: HybridRetriever(retriever, _lexical_index(retriever, ROUTE_COLLECTIONS[route]),
+                                   lexical_weight=HYBRID_LEXICAL_WEIGHTS[route])
+            for route, retriever in retrievers.items()
+        }
+    return {route: ParentRetriever(retriever) for route, retriever in retrievers.items()}
+
+
+_retrievers = None
+_retrievers_lock = threading.Lock()
+
+
+def vector_backend(retriever):
+    """The chunk-level vector retriever under ``retriever``'s parent expansion and BM25 fusion."""
+    while isinstance(retriever, (ParentRetriever, HybridRetriever)):
+        retriever = retriever.chunks if isinstance(retriever, ParentRetriever) else retriever.vector
+    return retriever
+
+
+def get_retrievers() -> dict:
+    """Return ``{"Retrieve_QnA": ..., "Retrieve_Device": ...}`` for ``RETRIEVER_BACKEND``.
+
+    With the local backend a missing index is built from the Chroma
+    collections on first use; so is a missing BM25 index when
+    ``HYBRID_RETRIEVAL`` is on.
+    """
+    global _retrievers
+    with _retrievers_lock:
+        if _retrievers is None:
+            _retrievers = _build_retrievers(RETRIEVER_BACKEND)
+        return _retrievers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local indexes from the Chroma collections.")
+    parser.add_argument("--build", action="store_true", help="(re)build the vector and BM25 indexes")
+    parser.add_argument("--kind", choices=["flat", "hnsw", "ivf"], default=VECTOR_INDEX_KIND)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default=VECTOR_INDEX_DTYPE)
+    args = parser.parse_args()
+
+    if args.build:
+        for collection in get_collections():
+            build_local_index(collection, dtype=args.dtype, kind=args.kind)
+            build_lexical_index(ChromaRetriever(collection), collection.name)
+    else:
+        parser.print_help()
@@ -0,0 +1,186 @@
+import argparse
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from embeddings import get_embedding_service
+from results_openai import aget_llm_response, get_llm_response
+from retrievers import vector_backend
+
+load_dotenv()
+
+ROUTES = ("Retrieve_QnA", "Retrieve_Device", "Web_Search")
+# Minimum distance from the decision boundary before the local decision is trusted.
+ROUTER_MARGIN = float(os.getenv("ROUTER_MARGIN", "0.05"))
+# Queries whose best local neighbour is less similar than this go to Web_Search.
+LOCAL_MATCH_THRESHOLD = float(os.getenv("ROUTER_LOCAL_MATCH_THRESHOLD", "0.4"))
+
+
+def _routing_prompt(query: str) -> str:
+    return f"""
+    You are a routing agent. Based on the user query, decide where to look for information.
+
+    Options:
+    - Retrieve_QnA: if it's about general medical knowledge, symptoms, or treatment.
+    - Retrieve_Device: if it's about medical devices, manuals, or instructions.
+    - Web_Search: if it's about recent news, brand names, or external data.
+
+    Query: "{query}"
+
+    Respond ONLY with one of: Retrieve_QnA, Retrieve_Device, Web_Search
+    """
+
+
+def llm_route(query: str) -> str:
+    """Ask the LLM which retrieval method to use."""
+    return get_llm_response(_routing_prompt(query), kind="router").strip()
+
+
+async def allm_route(query: str) -> str:
+    """Async version of :func:`llm_route`."""
+    return (await aget_llm_response(_routing_prompt(query), kind="router")).strip()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class LocalRouter:
+    """Nearest-centroid router over the embeddings already stored for retrieval.
+
+    The query is compared with the centroid of ``medical_q_n_a`` and of
+    ``medical_device_manual``; the closer centroid wins. If even the best
+    nearest neighbour across both collections is less similar than
+    ``local_match_threshold`` there is no good local match and the query goes
+    to ``Web_Search``. The confidence returned with each decision is its
+    distance from the decision boundary, in cosine-similarity units.
+
+    Both only need the stored vectors, so the router uses the plain vector
+    backend of each retriever, without BM25 fusion or chunk expansion.
+    """
+
+    def __init__(
+        self,
+        qna_retriever,
+        device_retriever,
+        *,
+        margin: float = ROUTER_MARGIN,
+        local_match_threshold: float = LOCAL_MATCH_THRESHOLD,
+    ):
+        self.retrievers = {
+            "Retrieve_QnA": vector_backend(qna_retriever),
+            "Retrieve_Device": vector_backend(device_retriever),
+        }
+        self.margin = margin
+        self.local_match_threshold = local_match_threshold
+        self._centroids = None
+        self._lock = threading.Lock()
+
+    def classify(self, query: str, query_embedding=None):
+        """Return ``(route, confidence)`` for ``query``.
+
+        Pass ``query_embedding`` when the request has already embedded the query.
+        """
+        if query_embedding is None:
+            query_embedding = get_embedding_service().embed(query)
+        query_embedding = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        centroids = self._get_centroids()
+
+        centroid_scores = {
+            route: float(centroid @ query_embedding) for route, centroid in centroids.items()
+        }
+        best_match = max(
+            self._nearest_similarity(retriever, query_embedding)
+            for retriever in self.retrievers.values()
+        )
+        return self._decide(centroid_scores, best_match)
+
+    def classify_many(self, query_embeddings) -> list:
+        """:meth:`classify` for many embedded queries, with one batched search per collection."""
+        vectors = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        centroids = self._get_centroids()
+        scores = {route: vectors @ centroid for route, centroid in centroids.items()}
+        best_matches = np.max([
+            [1.0 - hits["distances"][0] / 2.0 for hits in retriever.query_many(list(vectors), n_results=1)]
+            for retriever in self.retrievers.values()
+        ], axis=0)
+        return [
+            self._decide({route: float(route_scores[i]) for route, route_scores in scores.items()},
+                         float(best_matches[i]))
+            for i in range(len(vectors))
+        ]
+
+    def _decide(self, centroid_scores, best_match):
+        if best_match < self.local_match_threshold:
+            return "Web_Search", self.local_match_threshold - best_match
+
+        (best_route, best_score), (_, second_score) = sorted(
+            centroid_scores.items(), key=lambda item: item[1], reverse=True
+        )
+        confidence = min(best_score - second_score, best_match - self.local_match_threshold)
+        return best_route, confidence
+
+    def is_confident(self, confidence: float) -> bool:
+        return confidence >= self.margin
+
+    def _get_centroids(self):
+        with self._lock:
+            if self._centroids is None:
+                self._centroids = {}
+                for route, retriever in self.retrievers.items():
+                    centroid = np.asarray(retriever.embeddings()).mean(axis=0, dtype=np.float32)
+                    self._centroids[route] = _normalize(centroid)
+            return self._centroids
+
+    @staticmethod
+    def _nearest_similarity(retriever, query_embedding: np.ndarray) -> float:
+        results = retriever.query(query_embedding.tolist(), n_results=1)
+        # Retrievers return squared L2 distances over unit vectors,
+        # where cosine similarity = 1 - d / 2.
+        return 1.0 - results["distances"][0] / 2.0
+
+
+def evaluate(local_router: LocalRouter, labelled_queries: pd.DataFrame) -> pd.DataFrame:
+    """Route every labelled query with both routers and report agreement."""
+    rows = []
+    for query, label in zip(labelled_queries["query"], labelled_queries["label"]):
+        local_route, confidence = local_router.classify(query)
+        rows.append({
+            "query": query,
+            "label": label,
+            "local_route": local_route,
+            "confidence": confidence,
+            "confident": local_router.is_confident(confidence),
+            "llm_route": llm_route(query),
+        })
+    results = pd.DataFrame(rows)
+
+    confident = results[results["confident"]]
+    print(f"Queries: {len(results)}")
+    print(f"Local router accuracy: {(results['local_route'] == results['label']).mean():.1%}")
+    print(f"LLM router accuracy: {(results['llm_route'] == results['label']).mean():.1%}")
+    print(f"Agreement (all queries): {(results['local_route'] == results['llm_route']).mean():.1%}")
+    print(f"Confident share (LLM call skipped): {len(confident) / len(results):.1%}")
+    if len(confident):
+        print(f"Agreement (confident only): {(confident['local_route'] == confident['llm_route']).mean():.1%}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the local router with the LLM router.")
+    parser.add_argument("--eval", default="router_eval_queries.csv", help="CSV with 'query' and 'label' columns")
+    parser.add_argument("--output", help="Optional CSV path for the per-query results")
+    args = parser.parse_args()
+
+    from retrievers import get_retrievers
+
+    retrievers = get_retrievers()
+    local_router = LocalRouter(retrievers["Retrieve_QnA"], retrievers["Retrieve_Device"])
+    results = evaluate(local_router, pd.read_csv(args.eval))
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"Per-query results saved to {args.output}")
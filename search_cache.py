@@ -0,0 +1,275 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import aiohttp
+import requests
+from dotenv import load_dotenv
+
+from semantic_cache import normalize_query
+from singleflight import SingleFlight
+import telemetry
+
+load_dotenv()
+
+# Point at a local fake (e.g. benchmarks.serper_stub) to test without Serper.
+SERPER_BASE_URL = os.getenv("SERPER_BASE_URL", "https://google.serper.dev")
+SERPER_TIMEOUT_SECONDS = float(os.getenv("SERPER_TIMEOUT_SECONDS", "10"))
+
+SEARCH_CACHE_PATH = Path(os.getenv("SEARCH_CACHE_PATH", Path(__file__).parent / "search_cache.sqlite3"))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "3600"))
+# How long past its TTL an entry may still be served while it is refreshed.
+SEARCH_CACHE_STALE_SECONDS = float(os.getenv("SEARCH_CACHE_STALE_SECONDS", "86400"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000"))
+
+
+class SerperSearch:
+    """Client for the Serper Google search API, with a request timeout.
+
+    ``run``/``arun`` return the result snippets joined into one string, the
+    same text langchain's ``GoogleSerperAPIWrapper`` produces.
+    """
+
+    def __init__(
+        self,
+        api_key: str = None,
+        *,
+        base_url: str = SERPER_BASE_URL,
+        timeout: float = SERPER_TIMEOUT_SECONDS,
+        k: int = 10,
+        gl: str = "us",
+        hl: str = "en",
+    ):
+        self.api_key = api_key or os.getenv("SERPER_API_KEY")
+        if not self.api_key:
+            raise ValueError("SERPER_API_KEY is not set")
+        self.base_url = base_url
+        self.timeout = timeout
+        self.k = k
+        self.gl = gl
+        self.hl = hl
+
+    def results(self, query: str) -> dict:
+        response = requests.post(
+            f"{self.base_url}/search",
+            headers=self._headers(),
+            params=self._params(query),
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def aresults(self, query: str) -> dict:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                f"{self.base_url}/search",
+                headers=self._headers(),
+                params=self._params(query),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                raise_for_status=True,
+            ) as response:
+                return await response.json()
+
+    def run(self, query: str) -> str:
+        return " ".join(self._snippets(self.results(query)))
+
+    async def arun(self, query: str) -> str:
+        return " ".join(self._snippets(await self.aresults(query)))
+
+    def _headers(self) -> dict:
+        return {"X-API-KEY": self.api_key, "Content-Type": "application/json"}
+
+    def _params(self, query: str) -> dict:
+        return {"q": query, "gl": self.gl, "hl": self.hl, "num": self.k}
+
+    def _snippets(self, results: dict) -> list:
+        snippets = []
+        answer_box = results.get("answerBox")
+        if answer_box:
+            if answer_box.get("answer"):
+                return [answer_box["answer"]]
+            if answer_box.get("snippet"):
+                return [answer_box["snippet"].replace("\n", " ")]
+            if answer_box.get("snippetHighlighted"):
+                return answer_box["snippetHighlighted"]
+
+        knowledge_graph = results.get("knowledgeGraph")
+        if knowledge_graph:
+            title = knowledge_graph.get("title")
+            entity_type = knowledge_graph.get("type")
+            if entity_type:
+                snippets.append(f"{title}: {entity_type}.")
+            if knowledge_graph.get("description"):
+                snippets.append(knowledge_graph["description"])
+            for attribute, value in knowledge_graph.get("attributes", {}).items():
+                snippets.append(f"{title} {attribute}: {value}.")
+
+        for result in results.get("organic", [])[: self.k]:
+            if "snippet" in result:
+                snippets.append(result["snippet"])
+            for attribute, value in result.get("attributes", {}).items():
+                snippets.append(f"{attribute}: {value}.")
+
+        return snippets or ["No good Google Search Result was found"]
+
+
+class SearchCache:
+    """Web search results keyed on the normalized query, persisted in SQLite.
+
+    ``get`` reports an entry as fresh up to ``ttl_seconds`` old and as stale
+    for ``stale_seconds`` after that; older entries are dropped. Once more than
+    ``max_entries`` are stored the least recently used ones are evicted.
+    """
+
+    def __init__(
+        self,
+        path: Path = SEARCH_CACHE_PATH,
+        *,
+        ttl_seconds: float = SEARCH_CACHE_TTL_SECONDS,
+        stale_seconds: float = SEARCH_CACHE_STALE_SECONDS,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_results ("
+            " key TEXT PRIMARY KEY, query TEXT NOT NULL, result TEXT NOT NULL,"
+            " created_at REAL NOT NULL, last_used_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS search_results_last_used ON search_results (last_used_at)"
+        )
+
+    @staticmethod
+    def key(query: str) -> str:
+        return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+
+    def get(self, query: str):
+        """Return ``{"result", "fresh", "age_seconds"}`` or ``None`` on a miss."""
+        key = self.key(query)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM search_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            result, created_at = row
+            age_seconds = now - created_at
+            if age_seconds > self.ttl_seconds + self.stale_seconds:
+                self._conn.execute("DELETE FROM search_results WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE search_results SET last_used_at = ? WHERE key = ?", (now, key))
+        return {"result": result, "fresh": age_seconds <= self.ttl_seconds, "age_seconds": age_seconds}
+
+    def put(self, query: str, result: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_results VALUES (?, ?, ?, ?, ?)",
+                (self.key(query), normalize_query(query), result, now, now),
+            )
+            overflow = self._count() - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM search_results WHERE key IN"
+                    " (SELECT key FROM search_results ORDER BY last_used_at LIMIT ?)",
+                    (overflow,),
+                )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._count()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM search_results").fetchone()[0]
+
+
+class CachedSearch:
+    """Drop-in for the Serper wrapper's ``run``/``arun`` with a result cache.
+
+    Fresh entries are returned directly. Stale entries are returned too while
+    a background refresh replaces them (stale-while-revalidate). Misses are
+    fetched once per normalized query, however many requests ask for it at
+    the same time.
+    """
+
+    def __init__(self, search=None, cache: SearchCache = None):
+        self.search = search if search is not None else SerperSearch()
+        self.cache = cache if cache is not None else SearchCache()
+        self._flight = SingleFlight()
+        self._refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search-refresh")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def run(self, query: str) -> str:
+        entry = self.cache.get(query)
+        if self._serve(entry, query):
+            return entry["result"]
+        return self._flight.do(self.cache.key(query), self._fetch, query)
+
+    async def arun(self, query: str) -> str:
+        entry = await asyncio.to_thread(self.cache.get, query)
+        if self._serve(entry, query):
+            return entry["result"]
+        return await self._flight.ado(self.cache.key(query), self._afetch, query)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, stale_hits, misses = self.hits, self.stale_hits, self.misses
+        lookups = hits + stale_hits + misses
+        return {
+            "hits": hits,
+            "stale_hits": stale_hits,
+            "misses": misses,
+            "hit_rate": (hits + stale_hits) / lookups if lookups else 0.0,
+            "entries": self.cache.count(),
+            "searches": self._flight.stats(),
+        }
+
+    def _serve(self, entry, query) -> bool:
+        """Count the lookup; True when ``entry`` can be returned as is."""
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            elif entry["fresh"]:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+        telemetry.record_search_lookup("miss" if entry is None else "hit" if entry["fresh"] else "stale")
+        if entry is not None and not entry["fresh"]:
+            self._refresh_pool.submit(self._flight.do, self.cache.key(query), self._fetch, query)
+        return entry is not None
+
+    def _fetch(self, query):
+        started = time.perf_counter()
+        try:
+            result = self.search.run(query)
+        except Exception:
+            telemetry.record_search(time.perf_counter() - started, outcome="error")
+            raise
+        telemetry.record_search(time.perf_counter() - started)
+        self.cache.put(query, result)
+        return result
+
+    async def _afetch(self, query):
+        started = time.perf_counter()
+        try:
+            result = await self.search.arun(query)
+        except Exception:
+            telemetry.record_search(time.perf_counter() - started, outcome="error")
+            raise
+        telemetry.record_search(time.perf_counter() - started)
+        await asyncio.to_thread(self.cache.put, query, result)
+        return result
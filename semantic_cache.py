@@ -0,0 +1,169 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import chromadb
+from dotenv import load_dotenv
+
+from embeddings import get_embedding_service
+
+load_dotenv()
+
+CACHE_PATH = Path(os.getenv("SEMANTIC_CACHE_PATH", Path(__file__).parent / "semantic_cache_db"))
+SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+
+def normalize_query(query: str) -> str:
+    """Lower-case, collapse whitespace and drop trailing punctuation."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip(" ?!.")
+
+
+class SemanticCache:
+    """Answer cache keyed on query embeddings, persisted in its own Chroma store.
+
+    A lookup embeds the query and returns the stored answer of the closest past
+    query when their cosine similarity reaches ``threshold`` and the entry is
+    younger than ``ttl_seconds``. Once more than ``max_entries`` answers are
+    stored, the least recently used ones are evicted.
+    """
+
+    def __init__(
+        self,
+        path: Path = None,
+        *,
+        threshold: float = SIMILARITY_THRESHOLD,
+        ttl_seconds: float = TTL_SECONDS,
+        max_entries: int = MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Read at call time, so the module attribute can be pointed elsewhere.
+        self._client = chromadb.PersistentClient(path=str(path if path is not None else CACHE_PATH))
+        self._collection = self._client.get_or_create_collection(
+            name="semantic_answer_cache",
+            metadata={"hnsw:space": "cosine"},
+        )
+
+    def lookup(self, query: str):
+        """Return the cached answer for ``query`` or ``None`` on a miss."""
+        entry = self._find(normalize_query(query))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def store(self, query: str, *, response: str, source=None, route=None, is_relevant=None,
+              document_ids=None):
+        """Cache the answer produced by a full graph run, with the ids of the documents it used."""
+        normalized = normalize_query(query)
+        now = time.time()
+        self._collection.upsert(
+            ids=[hashlib.sha256(normalized.encode("utf-8")).hexdigest()],
+            embeddings=[get_embedding_service().embed(normalized)],
+            documents=[normalized],
+            metadatas=[{
+                "response": response,
+                "source": source or "",
+                "route": route or "",
+                "is_relevant": is_relevant or "",
+                "document_ids": json.dumps(list(document_ids)) if document_ids else "",
+                "created_at": now,
+                "last_used_at": now,
+            }],
+        )
+        self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": self._collection.count(),
+        }
+
+    def _find(self, normalized: str):
+        size = self._collection.count()
+        if size == 0:
+            return None
+
+        results = self._collection.query(
+            query_embeddings=[get_embedding_service().embed(normalized)],
+            n_results=min(3, size),
+            include=["metadatas", "distances"],
+        )
+        now = time.time()
+        expired = []
+        hit = None
+        for entry_id, meta, distance in zip(
+            results["ids"][0], results["metadatas"][0], results["distances"][0]
+        ):
+            if now - meta["created_at"] > self.ttl_seconds:
+                expired.append(entry_id)
+                continue
+            # Cosine space: distance = 1 - cosine similarity.
+            similarity = 1.0 - distance
+            if similarity >= self.threshold:
+                hit = (entry_id, meta, similarity)
+                break
+
+        if expired:
+            self._collection.delete(ids=expired)
+        if hit is None:
+            return None
+
+        entry_id, meta, similarity = hit
+        self._collection.update(ids=[entry_id], metadatas=[{**meta, "last_used_at": now}])
+        return {
+            "response": meta["response"],
+            "source": meta["source"] or None,
+            "route": meta["route"] or None,
+            "is_relevant": meta["is_relevant"] or None,
+            "document_ids": json.loads(meta["document_ids"]) if meta.get("document_ids") else None,
+            "similarity": similarity,
+        }
+
+    def _evict(self):
+        overflow = self._collection.count() - self.max_entries
+        if overflow <= 0:
+            return
+
+        # Expired answers go first, then the least recently used ones.
+        now = time.time()
+        entries = self._collection.get(include=["metadatas"])
+        by_eviction_order = sorted(
+            zip(entries["ids"], entries["metadatas"]),
+            key=lambda item: (
+                now - item[1]["created_at"] <= self.ttl_seconds,
+                item[1]["last_used_at"],
+            ),
+        )
+        self._collection.delete(ids=[entry_id for entry_id, _ in by_eviction_order[:overflow]])
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticCache:
+    """Return the shared answer cache, opening its store on first use."""
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticCache()
+        return _answer_cache
@@ -0,0 +1,150 @@
+import asyncio
+from concurrent.futures import Future
+import queue
+import threading
+
+
+class Broadcast:
+    """Items published by one run, delivered to every subscriber.
+
+    Each subscriber gets its own queue. One that subscribes late first
+    receives everything published so far, so all of them see the whole run.
+    The run publishes ``None`` last.
+    """
+
+    def __init__(self, new_queue=queue.Queue):
+        self._lock = threading.Lock()
+        self._new_queue = new_queue
+        self._items = []
+        self._queues = []
+        self.closed = False
+        self.producer = None
+
+    def publish(self, item):
+        with self._lock:
+            self._items.append(item)
+            self.closed = item is None
+            for events in self._queues:
+                events.put_nowait(item)
+
+    def subscribe(self):
+        events = self._new_queue()
+        with self._lock:
+            for item in self._items:
+                events.put_nowait(item)
+            self._queues.append(events)
+        return events
+
+    def unsubscribe(self, events) -> int:
+        """Stop delivering to ``events``; returns how many subscribers are left."""
+        with self._lock:
+            if events in self._queues:
+                self._queues.remove(events)
+            return len(self._queues)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for and share its result (or exception). Once it
+    finishes the key is free again, so nothing is cached here. Sync
+    (:meth:`do`) and async (:meth:`ado`) callers share the same calls, from
+    any thread or event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` once for all concurrent callers with ``key``."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                self.executions += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            call.set_exception(exc)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def ado(self, key, fn, *args, **kwargs):
+        """Async variant of :meth:`do`; ``fn`` is a coroutine function.
+
+        The shared call runs as a task, so one waiter being cancelled does not
+        cancel it for the others.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                self.executions += 1
+            else:
+                self.shared += 1
+        if leader:
+            task = asyncio.get_running_loop().create_task(fn(*args, **kwargs))
+            task.add_done_callback(lambda done: self._settle(key, call, done))
+        return await asyncio.shield(asyncio.wrap_future(call))
+
+    def stream(self, key, start, new_queue=queue.Queue):
+        """Subscribe to the run in flight for ``key``, starting one if there is none.
+
+        ``start(publish)`` launches the run in a thread or task and returns
+        promptly; whatever it returns is kept as ``broadcast.producer``. The
+        run passes each event to ``publish`` and publishes ``None`` when it is
+        done, which frees the key. Returns ``(broadcast, events, leader)``:
+        ``events`` is this caller's queue (made by ``new_queue``) and
+        ``leader`` says whether this call started the run.
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            leader = broadcast is None
+            if leader:
+                broadcast = self._streams[key] = Broadcast(new_queue)
+                self.executions += 1
+            else:
+                self.shared += 1
+            events = broadcast.subscribe()
+        if leader:
+            def publish(item):
+                if item is None:
+                    with self._lock:
+                        if self._streams.get(key) is broadcast:
+                            del self._streams[key]
+                broadcast.publish(item)
+
+            broadcast.producer = start(publish)
+        return broadcast, events, leader
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"executions": self.executions, "shared": self.shared}
+
+    def _settle(self, key, call, task):
+        """Hand the finished task's outcome to every waiter of ``key`` and free the key."""
+        if task.cancelled():
+            call.set_exception(asyncio.CancelledError())
+        elif task.exception() is not None:
+            call.set_exception(task.exception())
+        else:
+            call.set_result(task.result())
+        with self._lock:
+            del self._calls[key]
@@ -0,0 +1,88 @@
+"""Startup timing report and the optional warmup step.
+
+Importing the app opens nothing: the retrievers, embedding models,
+answer cache and LLM client are all created on first use. ``warmup()`` does
+that work up front instead, one timed phase at a time, so the first request
+does not pay for it. ``GET /startup`` returns the report.
+"""
+
+from contextlib import contextmanager
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WARMUP_ON_START = os.getenv("APP_WARMUP", "false").lower() == "true"
+
+
+class StartupReport:
+    """Wall-clock time and outcome of each startup phase, in the order they ran."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str, *, required: bool = True):
+        """Time the enclosed block; failures of optional phases are recorded, not raised."""
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except Exception as exc:
+            status = f"error: {exc}"
+            if required:
+                raise
+        finally:
+            with self._lock:
+                self.phases.append({
+                    "phase": name,
+                    "seconds": time.perf_counter() - started,
+                    "status": status,
+                })
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "total_seconds": time.perf_counter() - self.started,
+                "phases": list(self.phases),
+            }
+
+    def print(self):
+        for phase in self.as_dict()["phases"]:
+            print(f"---STARTUP {phase['phase']}: {phase['seconds'] * 1000:.1f} ms ({phase['status']})---")
+
+
+startup_report = StartupReport()
+
+
+def warmup(report: StartupReport = startup_report) -> StartupReport:
+    """Open the retrievers and load the models and clients requests depend on.
+
+    Each phase may fail (e.g. no network to download the embedding model);
+    the failure is recorded and the same work is retried on first use.
+    """
+    from agentic_RAG import get_device_filters, get_local_router
+    from embeddings import get_embedding_service
+    from llm_client import get_llm_client
+    from retrievers import get_retrievers
+    from semantic_cache import get_answer_cache
+
+    with report.phase("warmup:retrievers", required=False):
+        get_retrievers()
+    with report.phase("warmup:embedding_model", required=False):
+        get_embedding_service().embed("warmup")
+    with report.phase("warmup:local_router", required=False):
+        # Computes the route centroids.
+        get_local_router().classify("warmup")
+    with report.phase("warmup:device_filters", required=False):
+        get_device_filters()
+    with report.phase("warmup:answer_cache", required=False):
+        get_answer_cache()
+    with report.phase("warmup:llm_client", required=False):
+        get_llm_client()
+    return report
@@ -46,8 +46,12 @@ async function handleSubmit() {
     showLoading();
     submitBtn.disabled = true;
 
+    const startedAt = performance.now();
+    let firstTokenAt = null;
+    const steps = [];
+
     try {
-        const response = await fetch('/query', {
+        const response = await fetch('/query/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -55,17 +59,33 @@ async function handleSubmit() {
             body: JSON.stringify({ query }),
         });
 
-        const data = await response.json();
-
         if (!response.ok) {
+            const data = await response.json();
             throw new Error(data.error || 'An error occurred');
         }
 
-        if (data.success) {
-            displayResponse(data);
-        } else {
-            throw new Error(data.error || 'Failed to get response');
-        }
+        await readEventStream(response, (event, data) => {
+            if (event === 'node') {
+                steps.push(data.node);
+                appendWorkflowStep(data.node);
+                updateMetadata(data);
+            } else if (event === 'token') {
+                if (firstTokenAt === null) {
+                    firstTokenAt = performance.now();
+                    startStreamingResponse();
+                }
+                responseContent.textContent += data.token;
+            } else if (event === 'done') {
+                displayResponse(data);
+                console.info('Timings', {
+                    ...data.timings,
+                    client_ttft_ms: firstTokenAt === null ? null : firstTokenAt - startedAt,
+                    client_total_ms: performance.now() - startedAt,
+                });
+            } else if (event === 'error') {
+                throw new Error(data.error || 'Failed to get response');
+            }
+        });
 
     } catch (error) {
         console.error('Error:', error);
@@ -76,6 +96,56 @@ async function handleSubmit() {
     }
 }
 
+// Read a server-sent event stream from a fetch response
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
+// Show a workflow step while the query is running
+function appendWorkflowStep(step) {
+    const node = document.createElement('div');
+    node.className = 'workflow-step';
+    node.textContent = `Finished: ${step}`;
+    workflowSteps.appendChild(node);
+}
+
+// Update metadata cards as nodes report them
+function updateMetadata(data) {
+    if (data.route) routeValue.textContent = formatRoute(data.route);
+    if (data.source) sourceValue.textContent = data.source;
+    if (data.is_relevant) relevanceValue.textContent = data.is_relevant;
+}
+
+// Reveal the response card once the first token arrives
+function startStreamingResponse() {
+    hideLoading();
+    responseContent.textContent = '';
+    workflowVisualization.innerHTML = '';
+    responseSection.style.display = 'block';
+}
+
 // Display the response
 function displayResponse(data) {
     // Update metadata
@@ -90,10 +160,13 @@ function displayResponse(data) {
     updateWorkflowVisualization(data.workflow_steps);
     
     // Show response section
+    const alreadyVisible = responseSection.style.display === 'block';
     responseSection.style.display = 'block';
     
     // Scroll to response
-    responseSection.scrollIntoView({ behavior: 'smooth', block: 'start' });
+    if (!alreadyVisible) {
+        responseSection.scrollIntoView({ behavior: 'smooth', block: 'start' });
+    }
 }
 
 // Update workflow visualization
@@ -131,6 +204,9 @@ function formatRoute(route) {
 function showLoading() {
     loadingIndicator.style.display = 'block';
     workflowSteps.innerHTML = '<div class="workflow-step">Initializing...</div>';
+    routeValue.textContent = '-';
+    sourceValue.textContent = '-';
+    relevanceValue.textContent = '-';
 }
 
 // Hide loading state
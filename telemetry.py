@@ -0,0 +1,269 @@
+"""Latency, token and cost metrics in Prometheus text format, plus per-request traces.
+
+Graph nodes are wrapped with :func:`traced`; the LLM client and the web
+search record their calls with :func:`record_llm_call` and
+:func:`record_search`. Everything lands in process-wide histograms and
+counters that ``GET /metrics`` renders with :func:`render`. Inside
+:func:`trace_request` the same measurements are also collected for the one
+request, for the optional timing breakdown of ``/query``.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# USD per million tokens, for the cost counter (defaults: gpt-5-nano list prices).
+LLM_PROMPT_COST_PER_MILLION = float(os.getenv("LLM_PROMPT_COST_PER_MILLION", "0.05"))
+LLM_COMPLETION_COST_PER_MILLION = float(os.getenv("LLM_COMPLETION_COST_PER_MILLION", "0.40"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Squared L2 distances between unit vectors lie in [0, 4].
+DISTANCE_BUCKETS = (0.25, 0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 4.0)
+ITERATION_BUCKETS = (1, 2, 3)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter, one series per combination of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per combination of label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+node_seconds = Histogram("rag_node_seconds", "Wall time of graph nodes.", ("graph", "node"))
+node_errors = Counter("rag_node_errors_total", "Graph nodes that raised.", ("graph", "node"))
+llm_seconds = Histogram("rag_llm_seconds", "Wall time of LLM call attempts.", ("outcome",))
+llm_tokens = Counter("rag_llm_tokens_total", "LLM tokens reported by the API.", ("kind",))
+llm_cost = Counter("rag_llm_cost_usd_total", "Estimated LLM spend in USD.")
+search_seconds = Histogram("rag_search_seconds", "Wall time of Serper requests.", ("outcome",))
+search_lookups = Counter("rag_search_lookups_total", "Web search cache lookups.", ("result",))
+retrieval_distance = Histogram(
+    "rag_retrieval_distance", "Squared L2 distance of retrieved documents.", ("route",), DISTANCE_BUCKETS
+)
+relevance_iterations = Histogram(
+    "rag_relevance_iterations", "Relevance checks before a request was answered.", (), ITERATION_BUCKETS
+)
+llm_queue_seconds = Histogram("rag_llm_queue_seconds", "Time LLM calls waited for a scheduler slot.", ("kind",))
+llm_rejections = Counter("rag_llm_rejections_total", "LLM calls refused by the scheduler.", ("reason",))
+query_flights = Counter("rag_query_flights_total", "Query requests that started or joined a graph run.", ("role",))
+
+METRICS = (
+    node_seconds, node_errors, llm_seconds, llm_tokens, llm_cost, llm_queue_seconds, llm_rejections,
+    search_seconds, search_lookups, retrieval_distance, relevance_iterations, query_flights,
+)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """Timed steps of one request, in the order they finished."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, kind: str, name: str, seconds: float, **fields):
+        with self._lock:
+            self.spans.append(dict(kind=kind, name=name, ms=seconds * 1000, **fields))
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        llm = [span for span in spans if span["kind"] == "llm"]
+        return {
+            "total_ms": (time.perf_counter() - self.started) * 1000,
+            "spans": spans,
+            "llm_calls": len(llm),
+            "prompt_tokens": sum(span.get("prompt_tokens") or 0 for span in llm),
+            "completion_tokens": sum(span.get("completion_tokens") or 0 for span in llm),
+            "cost_usd": sum(span.get("cost_usd") or 0.0 for span in llm),
+        }
+
+
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+
+
+@contextmanager
+def trace_request():
+    """Collect the spans of the enclosed graph run into a :class:`Trace`."""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def _add_span(kind, name, seconds, **fields):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(kind, name, seconds, **fields)
+
+
+def _record_node(graph, name, started, failed):
+    seconds = time.perf_counter() - started
+    node_seconds.observe(seconds, graph=graph, node=name)
+    if failed:
+        node_errors.inc(graph=graph, node=name)
+    _add_span("node", name, seconds, **({"error": True} if failed else {}))
+
+
+def traced(graph: str, name: str, node):
+    """Wrap a (sync or async) graph node so its runs are timed and counted."""
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = await node(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                _record_node(graph, name, started, failed)
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = node(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            _record_node(graph, name, started, failed)
+    return wrapper
+
+
+def record_llm_call(seconds: float, *, outcome: str = "ok", prompt_tokens=None, completion_tokens=None):
+    """Record one LLM call attempt; token counts are ``None`` when the API reported none."""
+    llm_seconds.observe(seconds, outcome=outcome)
+    cost = None
+    if prompt_tokens is not None and completion_tokens is not None:
+        llm_tokens.inc(prompt_tokens, kind="prompt")
+        llm_tokens.inc(completion_tokens, kind="completion")
+        cost = (prompt_tokens * LLM_PROMPT_COST_PER_MILLION
+                + completion_tokens * LLM_COMPLETION_COST_PER_MILLION) / 1_000_000
+        llm_cost.inc(cost)
+    _add_span("llm", outcome, seconds, prompt_tokens=prompt_tokens,
+              completion_tokens=completion_tokens, cost_usd=cost)
+
+
+def record_llm_queue_wait(kind: str, seconds: float):
+    """Record how long an LLM call of ``kind`` waited for its scheduler slot."""
+    llm_queue_seconds.observe(seconds, kind=kind)
+    _add_span("llm_queue", kind, seconds)
+
+
+def record_llm_rejection(reason: str):
+    """Count an LLM call refused as ``queue_full`` or ``deadline``."""
+    llm_rejections.inc(reason=reason)
+
+
+def record_search(seconds: float, *, outcome: str = "ok"):
+    """Record one request to the search API."""
+    search_seconds.observe(seconds, outcome=outcome)
+    _add_span("search", outcome, seconds)
+
+
+def record_search_lookup(result: str):
+    """Count a search cache lookup as ``hit``, ``stale`` or ``miss``."""
+    search_lookups.inc(result=result)
+
+
+def record_retrieval(route: str, distances):
+    for distance in distances:
+        retrieval_distance.observe(distance, route=route)
+
+
+def record_iterations(count: int):
+    relevance_iterations.observe(count)
+
+
+def record_query_flight(leader: bool):
+    """Count a query request that started a graph run or shared one already in flight."""
+    query_flights.inc(role="leader" if leader else "follower")
@@ -0,0 +1,49 @@
+import os
+from pathlib import Path
+import tempfile
+import threading
+
+import pytest
+
+# Download-free deterministic embeddings, and every store in a scratch
+# directory. Set before any project module is imported: they read these then.
+_SCRATCH = Path(tempfile.mkdtemp(prefix="rag-tests-"))
+os.environ.update({
+    "EMBEDDING_FUNCTION": "benchmarks.offline:HashEmbeddingFunction",
+    "CHROMA_DB_PATH": str(_SCRATCH / "chroma_db"),
+    "VECTOR_INDEX_DIR": str(_SCRATCH / "vector_index"),
+    "LEXICAL_INDEX_DIR": str(_SCRATCH / "lexical_index"),
+    "METADATA_STORE_DIR": str(_SCRATCH / "metadata_store"),
+    "SEARCH_CACHE_PATH": str(_SCRATCH / "search_cache.sqlite3"),
+    "SEMANTIC_CACHE_PATH": str(_SCRATCH / "semantic_cache_db"),
+    "INGEST_CHECKPOINT_PATH": str(_SCRATCH / "ingest_checkpoint.json"),
+})
+
+from benchmarks import llm_stub, serper_stub
+
+
+def _start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.fixture
+def llm_stub_url():
+    """Base URL of a fresh OpenAI-compatible stub answering after 20 ms."""
+    server = llm_stub.serve(0, 20)
+    yield _start(server) + "/v1"
+    server.shutdown()
+    server.server_close()
+    llm_stub.StubHandler.rate_limit = 0
+    llm_stub.StubHandler._recent.clear()
+
+
+
+@pytest.fixture
+def serper_stub_url():
+    """Base URL of a fresh Serper stub answering after 100 ms."""
+    server = serper_stub.serve(0, 100)
+    serper_stub.StubHandler.searches = 0
+    yield _start(server)
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+import app as flask_app
+import asgi_app
+from semantic_cache import get_answer_cache
+
+BAD_BODIES = [
+    ("not json", "application/json"),
+    ("query=x", "application/x-www-form-urlencoded"),
+    ('["a list"]', "application/json"),
+    ('{"query": ""}', "application/json"),
+]
+
+
+def _flask_post(path, body, content_type="application/json"):
+    response = flask_app.create_app(warm=False).test_client().post(path, data=body, content_type=content_type)
+    return response.status_code, response.mimetype, response.get_json()
+
+
+def _asgi_post(path, body, content_type="application/json"):
+    response = TestClient(asgi_app.app).post(path, content=body, headers={"Content-Type": content_type})
+    return response.status_code, response.headers["Content-Type"].split(";")[0], response.json()
+
+
+@pytest.mark.parametrize("post", [_flask_post, _asgi_post], ids=["flask", "asgi"])
+@pytest.mark.parametrize("path", ["/query", "/query/stream"])
+@pytest.mark.parametrize("body, content_type", BAD_BODIES)
+def test_bad_body_is_a_400_before_any_stream(post, path, body, content_type):
+    status, mimetype, payload = post(path, body, content_type)
+    assert status == 400
+    assert mimetype == "application/json"
+    assert payload == {"success": False, "error": "Query is required"}
+
+
+@pytest.mark.parametrize("post", [_flask_post, _asgi_post], ids=["flask", "asgi"])
+def test_cache_hit_has_the_graph_result_shape(post, monkeypatch):
+    query = f"what is the cached answer for {post.__name__}"
+    get_answer_cache().store(query, response="Cached.", source="Retrieve_QnA", route="Retrieve_QnA",
+                             is_relevant="Yes", document_ids=["qa-1", "qa-2"])
+    monkeypatch.setattr(flask_app, "document_details", lambda route, ids: [{"id": doc_id} for doc_id in ids])
+
+    status, _, payload = post("/query", json.dumps({"query": query, "include_documents": True}))
+
+    assert status == 200
+    assert payload["success"] and payload["cached"] and not payload["coalesced"]
+    assert payload["response"] == "Cached."
+    assert payload["workflow_steps"] == ["Semantic_Cache"]
+    assert payload["document_ids"] == ["qa-1", "qa-2"]
+    assert payload["documents"] == [{"id": "qa-1"}, {"id": "qa-2"}]
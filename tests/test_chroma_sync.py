@@ -0,0 +1,107 @@
+import chromadb
+import pandas as pd
+import pytest
+
+from chromaDB import FULL_INGEST_MARKER, chunk_rows, content_id, sync_collection
+from embeddings import make_embedding_function
+from metadata_store import MetadataStore
+
+
+class RecordingCollection:
+    """A collection that records the ids passed to ``upsert`` and ``delete``."""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.upserted = []
+        self.deleted = []
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def upsert(self, ids, **kwargs):
+        self.upserted.extend(ids)
+        return self._collection.upsert(ids=ids, **kwargs)
+
+    def delete(self, ids):
+        self.deleted.extend(ids)
+        return self._collection.delete(ids=ids)
+
+
+def _frame(texts):
+    return pd.DataFrame({
+        "combined_text": texts,
+        "Manufacturer": [f"Maker {i}" for i in range(len(texts))],
+        "Model_Number": [f"M-{i}" for i in range(len(texts))],
+    })
+
+
+TEXTS = [
+    "Device Name: Infusion pump. Delivers fluids at a set rate.",
+    "Device Name: Pulse oximeter. Measures blood oxygen saturation.",
+    "Device Name: Defibrillator. Restores a normal heart rhythm.",
+]
+
+
+@pytest.fixture
+def collection(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma_db"))
+    return RecordingCollection(client.get_or_create_collection(
+        name="devices", embedding_function=make_embedding_function()))
+
+
+def _sync(collection, df, tmp_path):
+    collection.upserted.clear()
+    collection.deleted.clear()
+    return sync_collection(collection, df, tmp_path / "store", refresh_indexes=False)
+
+
+def test_first_sync_adds_every_chunk(collection, tmp_path):
+    _sync(collection, _frame(TEXTS), tmp_path)
+    expected, _, _ = chunk_rows(TEXTS, [{} for _ in TEXTS])
+    assert sorted(collection.upserted) == sorted(expected)
+    assert collection.count() == len(expected)
+    assert collection.deleted == []
+
+
+def test_unchanged_rerun_is_a_no_op(collection, tmp_path):
+    _sync(collection, _frame(TEXTS), tmp_path)
+    _sync(collection, _frame(TEXTS), tmp_path)
+    assert collection.upserted == [] and collection.deleted == []
+
+
+def test_changed_row_replaces_only_its_chunks(collection, tmp_path):
+    _sync(collection, _frame(TEXTS), tmp_path)
+    changed = TEXTS[:1] + ["Device Name: Pulse oximeter. Measures oxygen saturation and pulse rate."] + TEXTS[2:]
+    _sync(collection, _frame(changed), tmp_path)
+    assert {doc_id.split("#")[0] for doc_id in collection.upserted} == {content_id(changed[1])}
+    assert {doc_id.split("#")[0] for doc_id in collection.deleted} == {content_id(TEXTS[1])}
+    stored = collection.get(include=["documents"])
+    assert sorted(stored["documents"]) == sorted(changed)
+
+
+def test_removed_row_is_deleted(collection, tmp_path):
+    _sync(collection, _frame(TEXTS), tmp_path)
+    _sync(collection, _frame(TEXTS[:2]), tmp_path)
+    assert collection.upserted == []
+    assert {doc_id.split("#")[0] for doc_id in collection.deleted} == {content_id(TEXTS[2])}
+
+
+def test_duplicate_rows_are_stored_once(collection, tmp_path):
+    _sync(collection, _frame(TEXTS + TEXTS[:1]), tmp_path)
+    assert collection.count() == len(TEXTS)
+
+
+def test_chroma_keeps_filter_fields_and_the_store_keeps_the_rest(collection, tmp_path):
+    _sync(collection, _frame(TEXTS), tmp_path)
+    metadata = collection.get(include=["metadatas"])["metadatas"][0]
+    assert "Manufacturer" in metadata and "Model_Number" not in metadata
+    rows = MetadataStore(tmp_path / "store").get([content_id(TEXTS[0]), "unknown"])
+    assert rows[0]["Model_Number"] == "M-0"
+    assert rows[1] == {}
+
+
+def test_fully_ingested_collection_is_left_alone(collection, tmp_path):
+    _sync(collection, _frame(TEXTS), tmp_path)
+    collection.modify(metadata={"ingested_by": FULL_INGEST_MARKER})
+    _sync(collection, _frame(TEXTS[:1]), tmp_path)
+    assert collection.upserted == [] and collection.deleted == []
@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import pytest
+
+import agentic_RAG
+from fused_generation import AnswerStreamer, parse_reply
+
+
+@pytest.mark.parametrize("reply, parsed", [
+    ('{"relevant": "Yes", "answer": "Use IVIG."}', ("Yes", "Use IVIG.")),
+    ('{"relevant": "No", "answer": ""}', ("No", "")),
+    ('{"relevant": "Yes", "answer": "Use IVIG', None),  # cut off
+    ('{"relevant": "Maybe", "answer": "x"}', None),
+    ('["Yes"]', None),
+    (None, None),
+])
+def test_parse_reply(reply, parsed):
+    assert parse_reply(reply) == parsed
+
+
+def _stream(reply, size):
+    tokens = []
+    streamer = AnswerStreamer(tokens.append)
+    for start in range(0, len(reply), size):
+        streamer(reply[start:start + size])
+    return "".join(tokens), streamer
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_streams_the_decoded_answer_however_the_reply_is_split(size):
+    answer = 'Line one\nsaid "hi" \\ café – done'
+    streamed, streamer = _stream(json.dumps({"relevant": "Yes", "answer": answer}), size)
+    assert streamed == answer
+    assert streamer.streamed
+
+
+def test_streams_nothing_for_a_no_verdict():
+    streamed, streamer = _stream(json.dumps({"relevant": "No", "answer": "ignored"}), 3)
+    assert streamed == "" and not streamer.streamed
+
+
+# Streams part of its answer, then fails to parse.
+FUSED_REPLY = '{"relevant": "Yes", "answer": "Partial ans'
+
+
+def _fake_llm(prompt, on_token=None, kind=None, response_format=None):
+    if response_format is not None:
+        reply = FUSED_REPLY
+        for start in range(0, len(reply), 5):
+            if on_token is not None:
+                on_token(reply[start:start + 5])
+        return reply
+    if kind == "relevance":
+        return "Yes"
+    if on_token is not None:
+        on_token("Full ")
+        on_token("answer.")
+    return "Full answer."
+
+
+async def _afake_llm(*args, **kwargs):
+    return _fake_llm(*args, **kwargs)
+
+
+@pytest.fixture
+def fused_run(monkeypatch):
+    monkeypatch.setattr(agentic_RAG, "get_llm_response", _fake_llm)
+    monkeypatch.setattr(agentic_RAG, "aget_llm_response", _afake_llm)
+    monkeypatch.setattr(agentic_RAG.relevance_gate, "judge",
+                        lambda *args, **kwargs: {"decision": None, "method": "llm", "rerank_scores": []})
+    return {
+        "query": "How is Kawasaki disease treated?", "route": "Retrieve_QnA", "source": "Retrieve_QnA",
+        "prefetched": True, "context": "Kawasaki disease is treated with IVIG.",
+        "documents": ["Kawasaki disease is treated with IVIG."], "distances": [0.5], "fused": True,
+    }
+
+
+@pytest.mark.parametrize("graph", ["sync", "async"])
+def test_discarded_fused_reply_is_not_followed_by_a_second_stream(fused_run, graph):
+    tokens = []
+    config = {"configurable": {"on_token": tokens.append}}
+    if graph == "sync":
+        final = agentic_RAG.agentic_rag.invoke(fused_run, config=config)
+    else:
+        final = asyncio.run(agentic_RAG.agentic_rag_async.ainvoke(fused_run, config=config))
+    assert "".join(tokens) == "Partial ans"  # the fallback's Generate does not stream again
+    assert final["response"] == "Full answer."
+    assert final["relevance_method"] != "fused"
+
+
+def test_fallback_before_any_answer_token_still_streams(fused_run, monkeypatch):
+    monkeypatch.setitem(globals(), "FUSED_REPLY", "not json")
+    tokens = []
+    final = agentic_RAG.agentic_rag.invoke(fused_run, config={"configurable": {"on_token": tokens.append}})
+    assert "".join(tokens) == "Full answer."
+    assert final["response"] == "Full answer."
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import openai
+import pytest
+
+from benchmarks import llm_stub
+from llm_client import LLMClient
+from llm_scheduler import LLMScheduler
+
+
+def _client(base_url, **kwargs):
+    kwargs.setdefault("max_retries", 0)
+    return LLMClient(base_url=base_url, backoff=0.01,
+                     scheduler=LLMScheduler(requests_per_minute=0, tokens_per_minute=0), **kwargs)
+
+
+def test_async_calls_work_across_event_loops(llm_stub_url):
+    # Like graph_bench: one asyncio.run per run, with the process-wide client.
+    client = _client(llm_stub_url)
+    for _ in range(3):
+        assert asyncio.run(client.acomplete("Hello")) == llm_stub.ANSWER
+
+
+def test_streams_tokens(llm_stub_url):
+    tokens = []
+    answer = _client(llm_stub_url).complete("Hello", on_token=tokens.append)
+    assert "".join(tokens) == answer
+    assert answer.strip() == llm_stub.ANSWER
+
+
+def test_rate_limit_is_retried_after_retry_after(llm_stub_url):
+    llm_stub.StubHandler.rate_limit = 1
+    client = _client(llm_stub_url, max_retries=2)
+    client.complete("first")
+    started = time.monotonic()
+    assert client.complete("second") == llm_stub.ANSWER
+    assert client.scheduler.throttled == 1
+    assert time.monotonic() - started >= 0.9  # the stub's Retry-After: 1
+
+
+def test_rate_limit_raises_when_retries_run_out(llm_stub_url):
+    llm_stub.StubHandler.rate_limit = 1
+    client = _client(llm_stub_url)
+    client.complete("first")
+    with pytest.raises(openai.RateLimitError):
+        client.complete("second")
+
+
+def test_timeout_is_retried_then_raised(llm_stub_url):
+    llm_stub.StubHandler.latency_seconds = 0.5
+    client = _client(llm_stub_url, timeout=0.1, max_retries=1)
+    started = time.monotonic()
+    with pytest.raises(openai.APITimeoutError):
+        client.complete("slow")
+    assert time.monotonic() - started < 0.45
@@ -0,0 +1,31 @@
+import threading
+import time
+
+from llm_scheduler import LLMScheduler
+
+
+def test_waiter_is_dispatched_after_bucket_wait_not_deadline():
+    # 10 tokens/s, one slot, and a deadline far beyond the bucket wait.
+    scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=600, max_concurrency=1,
+                             queue_limit=8, queue_timeout=5.0)
+    granted = threading.Event()
+    waited = []
+
+    def waiter():
+        started = time.monotonic()
+        with scheduler.slot("generate", 5):
+            waited.append(time.monotonic() - started)
+            granted.set()
+
+    with scheduler.slot("generate", 600):  # holds the only slot and drains the bucket
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.1)  # the waiter polls while the window is full
+        assert not granted.is_set()
+    released = time.monotonic()
+
+    # After the release the waiter needs about 0.4s more of refill (1 of its 5 tokens is back).
+    assert granted.wait(2.0), "waiter slept towards its deadline instead of the bucket wait"
+    thread.join()
+    assert 0.2 < time.monotonic() - released < 1.5
+    assert waited[0] < 2.0
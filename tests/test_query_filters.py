@@ -0,0 +1,58 @@
+import pytest
+
+from metadata_index import MetadataIndex, build_metadata_index
+from query_filters import DeviceFilterExtractor
+
+MANUFACTURERS = ["Olympus Corporation", "Medtronic", "GE Healthcare", "B. Braun"]
+
+
+@pytest.fixture
+def extractor():
+    return DeviceFilterExtractor(MANUFACTURERS)
+
+
+@pytest.mark.parametrize("query, where", [
+    ("Which pulse oximeter models are Class II devices?", {"Device_Class": "Class II"}),
+    ("List class 2b or Class III implants", {"Device_Class": {"$in": ["Class III", "Class IIb"]}}),
+    ("Which devices are suitable for neonatal patients?",
+     {"Patient_Population": {"$in": ["Neonatal", "Infant (0-2)", "All"]}}),
+    ("Which endoscopes are made by Olympus?", {"Manufacturer": "Olympus Corporation"}),
+    ("Show GE Healthcare ultrasound manuals", {"Manufacturer": "GE Healthcare"}),
+    ("Which devices are sterilized with ethylene oxide?", {"Sterilization_Method": "Ethylene Oxide (EtO)"}),
+    ("Devices with a max operating temperature above 40", {"Max_Operating_Temperature_C": {"$gt": 40.0}}),
+    ("Devices with operating temperature at most 25.5 C", {"Max_Operating_Temperature_C": {"$lte": 25.5}}),
+])
+def test_single_filters(extractor, query, where):
+    assert extractor.extract(query) == where
+
+
+def test_several_filters_are_combined(extractor):
+    where = extractor.extract("Class I single-use Medtronic devices for pediatric patients")
+    assert where == {"$and": [
+        {"Device_Class": "Class I"},
+        {"Patient_Population": {"$in": ["Pediatric", "Pediatric (2-18)", "Adult and Pediatric", "All"]}},
+        {"Manufacturer": "Medtronic"},
+        {"Sterilization_Method": "Single-Use Sterile"},
+    ]}
+
+
+@pytest.mark.parametrize("query", [
+    "How is the Surgical Robot sterilized?",
+    "What are the treatments for Kawasaki disease?",
+    "What is the classification of this pump?",  # "class" only as part of a word
+    "Is the Braunwald score used here?",  # a manufacturer name only as part of a word
+])
+def test_questions_without_filters(extractor, query):
+    assert extractor.extract(query) is None
+
+
+def test_extracted_filter_selects_the_matching_rows(extractor, tmp_path):
+    metadatas = [
+        {"Device_Class": "Class II", "Patient_Population": "Neonatal", "Max_Operating_Temperature_C": 45.0},
+        {"Device_Class": "Class II", "Patient_Population": "Adult", "Max_Operating_Temperature_C": 45.0},
+        {"Device_Class": "Class III", "Patient_Population": "All", "Max_Operating_Temperature_C": 45.0},
+        {"Device_Class": "Class II", "Patient_Population": "All", "Max_Operating_Temperature_C": 30.0},
+    ]
+    build_metadata_index(metadatas, tmp_path)
+    where = extractor.extract("Class II devices for newborns with a temperature above 40")
+    assert MetadataIndex(tmp_path, metadatas).positions(where).tolist() == [0]
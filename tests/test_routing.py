@@ -0,0 +1,57 @@
+import numpy as np
+
+from lexical_index import BM25Index, build_bm25_index
+from retrievers import HybridRetriever, ParentRetriever, vector_backend
+from routing import LocalRouter
+
+
+class VectorRetriever:
+    """Exact search over a few unit vectors; counts its calls."""
+
+    def __init__(self, vectors):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.ids = [f"doc{i}#120w1s-0" for i in range(len(self.vectors))]
+        self.calls = []
+
+    def query(self, query_embedding, n_results=3, *, query_text=None, where=None):
+        self.calls.append(("query", n_results, query_text))
+        distances = ((self.vectors - np.asarray(query_embedding)) ** 2).sum(axis=1)
+        nearest = np.argsort(distances)[:n_results]
+        return {"ids": [self.ids[i] for i in nearest], "documents": [""] * len(nearest),
+                "metadatas": [{}] * len(nearest), "distances": [float(distances[i]) for i in nearest]}
+
+    def query_many(self, query_embeddings, n_results=3, *, query_texts=None, wheres=None):
+        return [self.query(embedding, n_results) for embedding in query_embeddings]
+
+    def get(self, ids):
+        self.calls.append(("get", len(ids), None))
+        raise AssertionError("the router reads distances only")
+
+    def embeddings(self):
+        return self.vectors
+
+
+def _stack(vector, tmp_path, name):
+    build_bm25_index(vector.ids, ["pump"] * len(vector.ids), tmp_path / name)
+    return ParentRetriever(HybridRetriever(vector, BM25Index(tmp_path / name)), expansion="neighbors")
+
+
+def test_vector_backend_unwraps_fusion_and_expansion(tmp_path):
+    vector = VectorRetriever(np.eye(3))
+    assert vector_backend(_stack(vector, tmp_path, "qa")) is vector
+    assert vector_backend(vector) is vector
+
+
+def test_router_searches_only_the_vector_backend(tmp_path):
+    qna = VectorRetriever([[1, 0, 0], [0.8, 0.6, 0]])
+    device = VectorRetriever([[0, 1, 0], [0, 0.6, 0.8]])
+    router = LocalRouter(_stack(qna, tmp_path, "qa"), _stack(device, tmp_path, "device"),
+                         margin=0.05, local_match_threshold=0.4)
+
+    route, confidence = router.classify("q", [0.1, 1, 0])
+    assert route == "Retrieve_Device" and router.is_confident(confidence)
+    assert router.classify("q", [0, 0, -1])[0] == "Web_Search"  # no stored vector is close
+    assert [call for call in qna.calls + device.calls if call != ("query", 1, None)] == []
+
+    decisions = router.classify_many([[1, 0.1, 0], [0.1, 1, 0]])
+    assert [route for route, _ in decisions] == ["Retrieve_QnA", "Retrieve_Device"]
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+
+from benchmarks import serper_stub
+from search_cache import CachedSearch, SearchCache, SerperSearch
+
+
+def _searches():
+    return serper_stub.StubHandler.searches
+
+
+def _cached_search(url, tmp_path, **cache_options):
+    return CachedSearch(SerperSearch("test", base_url=url), SearchCache(tmp_path / "search.sqlite3", **cache_options))
+
+
+def test_fresh_entry_is_served_from_the_cache(serper_stub_url, tmp_path):
+    search = _cached_search(serper_stub_url, tmp_path, ttl_seconds=60)
+    first = search.run("pacemaker battery life")
+    assert "pacemaker battery life" in first
+    # Same query after normalization.
+    assert search.run("  Pacemaker battery LIFE ") == first
+    assert _searches() == 1
+    assert search.stats()["hits"] == 1
+
+
+def test_stale_entry_is_served_while_it_is_refreshed(serper_stub_url, tmp_path):
+    search = _cached_search(serper_stub_url, tmp_path, ttl_seconds=0.3, stale_seconds=60)
+    first = search.run("insulin pump recall")
+    time.sleep(0.4)
+    started = time.monotonic()
+    assert search.run("insulin pump recall") == first
+    assert time.monotonic() - started < 0.1  # not waiting for the stub's 100 ms
+    assert search.stats()["stale_hits"] == 1
+    # The background refresh replaces the entry with a fresh one.
+    deadline = time.monotonic() + 2
+    while not search.cache.get("insulin pump recall")["fresh"] and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert search.cache.get("insulin pump recall")["fresh"]
+    assert _searches() == 2
+
+
+def test_expired_entry_is_fetched_again(serper_stub_url, tmp_path):
+    search = _cached_search(serper_stub_url, tmp_path, ttl_seconds=0.05, stale_seconds=0.05)
+    search.run("stent sizes")
+    time.sleep(0.15)
+    search.run("stent sizes")
+    assert _searches() == 2
+    assert search.stats()["misses"] == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SearchCache(tmp_path / "search.sqlite3", max_entries=2)
+    cache.put("a", "result a")
+    time.sleep(0.01)
+    cache.put("b", "result b")
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", "result c")
+    assert cache.count() == 2
+    assert cache.get("b") is None
+    assert cache.get("a")["result"] == "result a"
+    assert cache.get("c")["result"] == "result c"
+
+
+def test_concurrent_sync_queries_make_one_search(serper_stub_url, tmp_path):
+    search = _cached_search(serper_stub_url, tmp_path)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(search.run("mri safety"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(results)) == 1 and len(results) == 8
+    assert _searches() == 1
+
+
+def test_concurrent_async_queries_make_one_search(serper_stub_url, tmp_path):
+    search = _cached_search(serper_stub_url, tmp_path)
+
+    async def main():
+        return await asyncio.gather(*(search.arun("mri safety") for _ in range(8)))
+
+    assert len(set(asyncio.run(main()))) == 1
+    assert _searches() == 1
+
+
+def test_sync_and_async_queries_share_one_search(serper_stub_url, tmp_path):
+    search = _cached_search(serper_stub_url, tmp_path)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(search.run("ventilator alarms")))
+    thread.start()
+
+    async def main():
+        await asyncio.sleep(0.02)
+        return await asyncio.gather(*(search.arun("Ventilator alarms") for _ in range(4)))
+
+    results.extend(asyncio.run(main()))
+    thread.join()
+    assert len(set(results)) == 1 and len(results) == 5
+    assert _searches() == 1
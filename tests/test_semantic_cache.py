@@ -0,0 +1,64 @@
+import time
+
+from semantic_cache import SemanticCache, normalize_query
+
+QUERIES = (
+    "What are the treatments for Kawasaki disease?",
+    "Which sterilization method does the Medtronic insulin pump use?",
+    "How long does a pacemaker battery last?",
+)
+
+
+def _answer(query):
+    return f"answer to {query}"
+
+
+def test_normalize_query():
+    assert normalize_query("  What is   Ebola?? ") == "what is ebola"
+
+
+def test_lookup_hits_the_same_question_after_normalization(tmp_path):
+    cache = SemanticCache(tmp_path, ttl_seconds=60)
+    cache.store(QUERIES[0], response=_answer(QUERIES[0]), source="Retrieve_QnA", route="Retrieve_QnA")
+    entry = cache.lookup("what are the treatments for kawasaki disease")
+    assert entry["response"] == _answer(QUERIES[0])
+    assert entry["route"] == "Retrieve_QnA"
+    assert cache.lookup(QUERIES[1]) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_expired_entries_miss_and_are_deleted(tmp_path):
+    cache = SemanticCache(tmp_path, ttl_seconds=0.2)
+    cache.store(QUERIES[0], response=_answer(QUERIES[0]))
+    assert cache.lookup(QUERIES[0]) is not None
+    time.sleep(0.3)
+    assert cache.lookup(QUERIES[0]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = SemanticCache(tmp_path, ttl_seconds=60, max_entries=2)
+    cache.store(QUERIES[0], response=_answer(QUERIES[0]))
+    time.sleep(0.01)
+    cache.store(QUERIES[1], response=_answer(QUERIES[1]))
+    time.sleep(0.01)
+    assert cache.lookup(QUERIES[0]) is not None  # now more recently used than QUERIES[1]
+    time.sleep(0.01)
+    cache.store(QUERIES[2], response=_answer(QUERIES[2]))
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup(QUERIES[1]) is None
+    assert cache.lookup(QUERIES[0])["response"] == _answer(QUERIES[0])
+    assert cache.lookup(QUERIES[2])["response"] == _answer(QUERIES[2])
+
+
+def test_expired_entries_are_evicted_before_recent_ones(tmp_path):
+    cache = SemanticCache(tmp_path, ttl_seconds=0.3, max_entries=2)
+    cache.store(QUERIES[0], response=_answer(QUERIES[0]))
+    time.sleep(0.2)
+    cache.store(QUERIES[1], response=_answer(QUERIES[1]))
+    assert cache.lookup(QUERIES[0]) is not None  # most recently used, but the older entry
+    time.sleep(0.15)
+    cache.store(QUERIES[2], response=_answer(QUERIES[2]))
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup(QUERIES[1]) is not None
+    assert cache.lookup(QUERIES[2]) is not None